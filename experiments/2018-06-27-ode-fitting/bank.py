@@ -0,0 +1,173 @@
+""" Bank of fitted parameters, used to warm-start the fits of new stories. """
+
+import os
+import pickle
+import logging
+import warnings
+import argparse
+import numpy
+from contextlib import closing
+
+logger = logging.getLogger()
+
+
+class ParameterBank(object):
+    """
+    The best fitted values of theta and y0 per (model, fity0, story). The
+    bank is filled from fitted models or from the result pickles of `fit.py`,
+    and offers the solutions whose curves are closest in shape to new data as
+    initial guesses for new fits (see `candidates`).
+    """
+
+    def __init__(self):
+        # (modelcls, fity0, story) -> dict with theta, y0, cost, source
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, modelcls, fity0, story, model, source=None):
+        """
+        Store the fitted values of model, unless the bank already has a
+        solution with lower cost for the same key. Return True if stored.
+        """
+        cost = getattr(model, 'cost_', None)
+        if cost is None or not numpy.isfinite(cost):
+            # not fitted
+            return False
+        key = (modelcls, fity0, story)
+        old = self.entries.get(key)
+        if old is not None and old['cost'] <= cost:
+            return False
+        self.entries[key] = {
+            'theta': numpy.array(model.theta),
+            'y0': numpy.array(model.y0),
+            'cost': cost,
+            'source': source,
+        }
+        return True
+
+    def update(self, path):
+        """
+        Add the models of a result pickle of `fit.py`. Return the number of
+        entries stored.
+        """
+        with closing(open(path, 'rb')) as f:
+            obj = pickle.load(f)
+        n = 0
+        for story, model in obj['models'].items():
+            n += self.add(obj['modelcls'], obj['fity0'], story, model,
+                          source=path)
+        return n
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a bank from disk. If path does not exist, the bank is empty.
+        """
+        bank = cls()
+        if os.path.exists(path):
+            with closing(open(path, 'rb')) as f:
+                bank.entries = pickle.load(f)
+        return bank
+
+    def save(self, path):
+        with closing(open(path, 'wb')) as f:
+            pickle.dump(self.entries, f)
+
+    def nearest(self, model, data, times=None, k=3, exclude=()):
+        """
+        Find the k solutions for the class of model whose curves are most
+        similar in shape to the data.
+
+        Parameters
+        ==========
+        model : ODEModel
+            The model to fit.
+
+        data : ndarray
+            An (M, N) array of observations, as in `ODEModel.fit`.
+
+        times : ndarray
+            Optional. The (M,) time points of the data.
+
+        k : int
+            The number of solutions.
+
+        exclude : sequence
+            Stories to leave out.
+
+        Returns
+        =======
+        nearest : list
+            A list of (distance, key, theta, y0), sorted by distance.
+
+        Notes
+        =====
+        All models in this package are frequency-dependent (rates depend on
+        fractions of the population), so scaling y0 scales the whole
+        trajectory. Each stored curve is thus compared with the data after a
+        least-squares fit of its scale, and y0 is rescaled accordingly. The
+        distance is the relative RMS error of the rescaled curve. The stored
+        solutions are simulated together with `ODEModel.simulate_many`.
+        """
+        if times is None:
+            times = numpy.arange(len(data))
+        keys = [key for key in self.entries
+                if key[0] == type(model).__name__ and key[2] not in exclude]
+        if not keys or k <= 0:
+            return []
+        thetas = numpy.array([self.entries[key]['theta'] for key in keys])
+        y0s = numpy.array([self.entries[key]['y0'] for key in keys])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            y = model.simulate_many(thetas, y0s, times)
+        scale = (y * data).sum(axis=(1, 2)) / (y * y).sum(axis=(1, 2))
+        scale = numpy.where(numpy.isfinite(scale) & (scale > 0), scale, 1.0)
+        dist = numpy.sqrt(((scale[:, None, None] * y - data) ** 2).sum(
+            axis=(1, 2)) / (data ** 2).sum())
+        dist = numpy.where(numpy.isfinite(dist), dist, numpy.inf)
+        idx = numpy.argsort(dist, kind='stable')[:k]
+        return [(dist[i], keys[i], thetas[i], scale[i] * y0s[i]) for i in idx]
+
+    def candidates(self, model, data, times=None, k=3, exclude=()):
+        """
+        Initial guesses for the unknowns of model from the k nearest
+        solutions (see `nearest`), as a (k, M) array, for the `candidates`
+        argument of `ODEModel.fit`.
+        """
+        unknown = model._unknowns()
+        nearest = self.nearest(model, data, times=times, k=k, exclude=exclude)
+        x = [numpy.r_[theta, y0][unknown] for _, _, theta, y0 in nearest]
+        return numpy.reshape(x, (len(x), len(unknown)))
+
+
+def hit(model, ncand):
+    """
+    Whether the best repetition of the last fit of model started from one
+    of the first ncand initial guesses, i.e. from a bank candidate.
+    """
+    if not ncand or not hasattr(model, 'trace_'):
+        return False
+    last = numpy.array([t[-1] for t in model.trace_], dtype=float)
+    if numpy.isnan(last).all():
+        return False
+    return bool(numpy.nanargmin(last) < ncand)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('bank', help='path to the bank (created if missing)')
+    parser.add_argument('pickles', nargs='*', metavar='pickle',
+                        help='result pickle(s) of fit.py to add')
+    args = parser.parse_args()
+    bank = ParameterBank.load(args.bank)
+    for path in args.pickles:
+        n = bank.update(path)
+        print("{}: {} entries stored".format(path, n))
+    if args.pickles:
+        bank.save(args.bank)
+    row = "{:>14}  {:>8}  {:>6}  {:>12}"
+    print(row.format("MODEL", "FIT-Y0", "STORY", "COST"))
+    for key in sorted(bank.entries, key=str):
+        print(row.format(*key, "{:.6g}".format(bank.entries[key]['cost'])))
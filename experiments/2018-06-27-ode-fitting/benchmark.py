@@ -0,0 +1,974 @@
+""" Performance benchmarks for the O.D.E. models. """
+
+import os
+import time
+import warnings
+import argparse
+import configparser
+import numpy
+import scipy.integrate
+
+import models
+
+# Models to benchmark and their reference parameters / initial conditions.
+# Compartments that are not listed are set to zero.
+CONF_PATH = 'test_fitting.conf'
+BENCH_MODELS = ['HoaxModel', 'SegHoaxModel', 'SIR', 'DoubleSIR', 'SEIZ']
+
+# Reference values for models that are not listed in the config file
+DEFAULTS = {
+    'SIR': {'beta': 1.0, 'mu': 0.5, 'S': 9000, 'I': 1000},
+    'DoubleSIR': {'beta1': 1.0, 'mu1': 2.0, 'beta2': 1.0, 'mu2': 0.5,
+                  'S1': 9000, 'I1': 1000, 'S2': 9000, 'I2': 1000},
+}
+
+
+def refmodel(modelcls, config_path=CONF_PATH):
+    """
+    Instantiate a model with the reference values from the config file used
+    by `test_fitting.py`.
+    """
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser.read(config_path)
+    M = getattr(models, modelcls)
+    m = M()
+    m.y0 = numpy.zeros(len(m._y0))
+    if modelcls in DEFAULTS:
+        values = DEFAULTS[modelcls]
+    else:
+        values = {k: parser[modelcls].getfloat(k) for k in parser[modelcls]}
+    for k, val in values.items():
+        setattr(m, k, val)
+    return m
+
+
+def randtheta(model, nrep):
+    """
+    Draw `nrep` parameter vectors by perturbing the reference values of the
+    model by up to +/- 50%, clipped to bounds.
+    """
+    theta = model.theta * numpy.random.uniform(0.5, 1.5,
+                                               (nrep, len(model.theta)))
+    bounds = [(getattr(type(model), name).lower,
+               getattr(type(model), name).upper) for name in model._theta]
+    lower, upper = zip(*bounds)
+    lower = [-numpy.inf if b is None else b for b in lower]
+    upper = [numpy.inf if b is None else b for b in upper]
+    return numpy.clip(theta, lower, upper)
+
+
+def timeit(func, *args, **kwargs):
+    tic = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - tic
+
+
+def bench_simulate_many(args):
+    """
+    Compare `ODEModel.simulate_many` with a loop over `ODEModel.simulate`.
+    """
+    times = numpy.arange(args.tmax)
+    row = "{:>14}  {:>6}  {:>10}  {:>10}  {:>8}"
+    print(row.format("MODEL", "R", "LOOP (s)", "BATCH (s)", "SPEEDUP"))
+    for modelcls in args.models:
+        m = refmodel(modelcls)
+        for R in args.nrep:
+            thetas = randtheta(m, R)
+
+            def loop():
+                for theta in thetas:
+                    m.theta = theta
+                    m.simulate(times)
+
+            t_loop = timeit(loop)
+            t_batch = timeit(m.simulate_many, thetas, m.y0, times)
+            print(row.format(modelcls, R, "{:.3f}".format(t_loop),
+                             "{:.3f}".format(t_batch),
+                             "{:.1f}x".format(t_loop / t_batch)))
+
+
+def bench_jac(args):
+    """
+    Compare integration with the analytic Jacobian to integration with the
+    Jacobian estimated by the solver with finite differences.
+    """
+    times = numpy.arange(args.tmax)
+    row = "{:>14}  {:>8}  {:>7}  {:>7}  {:>7}  {:>10}"
+    print(row.format("MODEL", "JACOBIAN", "NSTEP", "NFE", "NJE", "TIME (ms)"))
+    for modelcls in args.models:
+        m = refmodel(modelcls)
+        for label, Dfun in [("numeric", None), ("analytic", m.jac)]:
+            def run():
+                return scipy.integrate.odeint(m, m.y0, times, Dfun=Dfun,
+                                              mxstep=m._mxstep,
+                                              full_output=True)
+            t = min(timeit(run) for i in range(args.repeat))
+            _, info = run()
+            print(row.format(modelcls, label, info['nst'][-1],
+                             info['nfe'][-1], info['nje'][-1],
+                             "{:.2f}".format(1e3 * t)))
+
+
+def bench_solvers(args):
+    """
+    Benchmark matrix of solver backend x model x story length: time per
+    simulation and relative error against an accurate LSODA solution.
+    """
+    row = "{:>14}  {:>6}  {:>6}  {:>10}  {:>9}  {:>6}"
+    print(row.format("MODEL", "T", "SOLVER", "TIME (ms)", "REL. ERR",
+                     "STABLE"))
+    for modelcls in args.models:
+        m = refmodel(modelcls)
+        for tmax in args.tmax:
+            times = numpy.arange(tmax)
+            ref = m.simulate(times, solver='lsoda', tol='accurate',
+                             cache=False)
+            for solver in args.solvers:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    t = min(timeit(m.simulate, times, solver=solver,
+                                   tol=args.tol, cache=False)
+                            for i in range(args.repeat))
+                    y = m.simulate(times, solver=solver, tol=args.tol,
+                                   cache=False)
+                err = numpy.abs(y - ref).max() / numpy.abs(ref).max()
+                stable = numpy.isfinite(err) and err < args.max_err
+                print(row.format(modelcls, tmax, solver,
+                                 "{:.2f}".format(1e3 * t),
+                                 "{:.1e}".format(err),
+                                 "yes" if stable else "NO"))
+
+
+def gendata(model, tmax=168, sigma=50):
+    """
+    Synthetic data: simulate the model and add Gaussian noise (see also
+    `test_fitting.gendata`).
+    """
+    y = model.simulate(numpy.arange(tmax))
+    y = y + numpy.random.normal(scale=sigma, size=y.shape)
+    return y.clip(min=0)
+
+
+def iterdata(args):
+    """
+    Yield (story, data) pairs, either read from the data file of `fit.py`,
+    or synthetic.
+    """
+    if args.path is not None:
+        from fit import readdata
+        for story, df in readdata(args.path, stories=args.stories):
+            yield story, numpy.c_[df['fake'], df['fact']]
+    else:
+        yield 0, gendata(refmodel(args.model))
+
+
+def bench_fit_jac(args):
+    """
+    Compare fits with the finite differences and with the sensitivity
+    Jacobian of the residuals.
+    """
+    row = "{:>6}  {:>11}  {:>6}  {:>6}  {:>7}  {:>10}  {:>9}"
+    print(row.format("STORY", "JAC", "NFEV", "NJEV", "NINTEG", "COST",
+                     "TIME (s)"))
+    M = getattr(models, args.model)
+    for story, data in iterdata(args):
+        for jac in ['2-point', 'sensitivity']:
+            numpy.random.seed(args.seed)
+            m = M()
+            m.inity0(args.fity0, data[0, 0], data[0, 1])
+            nunk = len(m._getbounds())
+            t = timeit(m.fit, data, nrep=args.nrep, jac=jac)
+            # numerical Jacobians take one integration per unknown
+            ninteg = m.nfev_ + m.njev_ * (nunk if jac == '2-point' else 1)
+            print(row.format(story, jac, m.nfev_, m.njev_, ninteg,
+                             "{:.4g}".format(m.cost_), "{:.2f}".format(t)))
+
+
+def bench_transform(args):
+    """
+    Compare fits of the raw variables with fits of the unconstrained,
+    transformed variables (see `models.transforms`).
+    """
+    row = "{:>12}  {:>6}  {:>9}  {:>6}  {:>6}  {:>10}  {:>9}"
+    print(row.format("MODEL", "STORY", "TRANSFORM", "NFEV", "NJEV", "COST",
+                     "TIME (s)"))
+    for name in args.models:
+        M = getattr(models, name)
+        for story, data in iterdata(argparse.Namespace(model=name,
+                                                       **vars(args))):
+            for transform in [None, 'auto']:
+                numpy.random.seed(args.seed)
+                m = M()
+                m.inity0(args.fity0, data[0, 0], data[0, 1])
+                m.transform = transform
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    t = timeit(m.fit, data, nrep=args.nrep, jac=args.jac)
+                if not hasattr(m, 'cost_'):
+                    # all repetitions failed
+                    print(row.format(name, story, transform or "none", "-",
+                                     "-", "failed", "{:.2f}".format(t)))
+                    continue
+                print(row.format(name, story, transform or "none", m.nfev_,
+                                 m.njev_, "{:.4g}".format(m.cost_),
+                                 "{:.2f}".format(t)))
+
+
+def bench_fit_jobs(args):
+    """
+    Compare serial fits with fits whose repetitions run on a process pool.
+    """
+    row = "{:>6}  {:>6}  {:>10}  {:>9}  {:>8}  {:>9}"
+    print(row.format("NREP", "N_JOBS", "COST", "TIME (s)", "SPEEDUP",
+                     "IDENTICAL"))
+    M = getattr(models, args.model)
+    data = gendata(refmodel(args.model))
+    for nrep in args.nrep:
+        results = []
+        for n_jobs in [None, args.jobs]:
+            numpy.random.seed(args.seed)
+            m = M()
+            m.inity0(args.fity0, data[0, 0], data[0, 1])
+            t = timeit(m.fit, data, nrep=nrep, n_jobs=n_jobs)
+            results.append((t, m))
+        (t1, m1), (tn, mn) = results
+        same = (numpy.array_equal(m1.theta, mn.theta) and
+                numpy.array_equal(m1.y0, mn.y0) and m1.cost_ == mn.cost_)
+        for n_jobs, (t, m) in zip([1, args.jobs], results):
+            print(row.format(nrep, n_jobs, "{:.6g}".format(m.cost_),
+                             "{:.2f}".format(t), "{:.1f}x".format(t1 / t),
+                             "yes" if same else "NO"))
+
+
+def bench_race(args):
+    """
+    Compare fits that run all repetitions to convergence with fits that race
+    them (successive halving).
+    """
+    row = "{:>6}  {:>14}  {:>12}  {:>6}  {:>6}  {:>9}  {:>9}"
+    print(row.format("STORY", "SCHEDULE", "COST", "NFEV", "NJEV", "RHS EVALS",
+                     "TIME (s)"))
+    M = getattr(models, args.model)
+    for story, data in iterdata(args):
+        for race in [None, args.race]:
+            numpy.random.seed(args.seed)
+            m = M()
+            m.inity0(args.fity0, data[0, 0], data[0, 1])
+            # count derivative evaluations
+            m.diagnostics = 'sampled'
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                t = timeit(m.fit, data, nrep=args.nrep, race=race,
+                           eta=args.eta)
+            label = "full" if race is None else ",".join(map(str, race))
+            print(row.format(story, label, "{:.6g}".format(m.cost_), m.nfev_,
+                             m.njev_, m.diagnostics_.rhs_calls,
+                             "{:.2f}".format(t)))
+
+
+def bench_design(args):
+    """
+    Parameter recovery on the synthetic data of `test_fitting.py`: number of
+    repetitions each start design needs to reach the target cost.
+    """
+    import test_fitting
+    ref = refmodel(args.model)
+    M = getattr(models, args.model)
+    designs = [None] + args.designs
+    needed = {design: [] for design in designs}
+    theta_err = {design: [] for design in designs}
+    for trial in range(args.trials):
+        _, data = test_fitting.gendata(ref)
+        seed = numpy.random.randint(2 ** 31)
+        costs = {}
+        for design in designs:
+            for nrep in args.nrep:
+                numpy.random.seed(seed)
+                m = M()
+                m.inity0(args.fity0, data[0, 0], data[0, 1])
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    m.fit(data, nrep=nrep, design=design)
+                costs[design, nrep] = getattr(m, 'cost_', numpy.inf)
+            err = numpy.abs(m.theta - ref.theta).max()
+            theta_err[design].append(err / numpy.abs(ref.theta).max())
+        # target: best cost of the trial, up to a relative tolerance
+        target = min(costs.values()) * (1 + args.rtol)
+        for design in designs:
+            n = [nrep for nrep in args.nrep if costs[design, nrep] <= target]
+            needed[design].append(n[0] if n else None)
+    row = "{:>8}  {:>8}  {:>{width}}  {:>14}"
+    width = 4 * args.trials
+    print(row.format("DESIGN", "REACHED", "NREP NEEDED", "THETA ERR (MED)",
+                     width=width))
+    for design in designs:
+        reached = sum(n is not None for n in needed[design])
+        print(row.format(design or "default",
+                         "{}/{}".format(reached, args.trials),
+                         " ".join("{:>3}".format(n or "-")
+                                  for n in needed[design]),
+                         "{:.2e}".format(numpy.median(theta_err[design])),
+                         width=width))
+
+
+def bench_de(args):
+    """
+    Compare fits with multiple restarts of least squares with fits by
+    differential evolution (population integrated as a batch) and polish.
+    """
+    row = "{:>6}  {:>14}  {:>12}  {:>6}  {:>9}"
+    print(row.format("STORY", "METHOD", "COST", "NFEV", "TIME (s)"))
+    M = getattr(models, args.model)
+    for story, data in iterdata(args):
+        for method in ['restarts', 'de']:
+            numpy.random.seed(args.seed)
+            m = M()
+            m.inity0(args.fity0, data[0, 0], data[0, 1])
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                if method == 'de':
+                    t = timeit(m.fit, data, method='de',
+                               de_options=dict(maxiter=args.maxiter))
+                    label = "de ({} gen.)".format(m.de_.nit)
+                else:
+                    t = timeit(m.fit, data, nrep=args.nrep)
+                    label = "{} restarts".format(args.nrep)
+            print(row.format(story, label,
+                             "{:.6g}".format(getattr(m, 'cost_', numpy.nan)),
+                             getattr(m, 'nfev_', 0), "{:.2f}".format(t)))
+
+
+def bench_bank(args):
+    """
+    Warm starts from a parameter bank (see `bank.py`): hit rate and time to
+    convergence. The bank is filled with the cold fits of the other stories
+    (leave-one-out) and, optionally, with result pickles of `fit.py`.
+    """
+    from bank import ParameterBank, hit
+    M = getattr(models, args.model)
+    bank = ParameterBank()
+    for path in args.pickles:
+        bank.update(path)
+    stories = list(iterdata(args))
+    cold = {}
+    for story, data in stories:
+        numpy.random.seed(args.seed)
+        m = M()
+        m.inity0(args.fity0, data[0, 0], data[0, 1])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            t = timeit(m.fit, data, nrep=args.nrep)
+        cold[story] = (m, t)
+        bank.add(args.model, args.fity0, story, m)
+    row = "{:>6}  {:>12}  {:>9}  {:>12}  {:>9}  {:>4}  {:>9}"
+    print(row.format("STORY", "COLD COST", "TIME (s)", "WARM COST",
+                     "TIME (s)", "HIT", "CONVERGED"))
+    hits = converged = 0
+    t_cold = t_warm = 0.0
+    for story, data in stories:
+        numpy.random.seed(args.seed)
+        m = M()
+        m.inity0(args.fity0, data[0, 0], data[0, 1])
+        tic = time.perf_counter()
+        candidates = bank.candidates(m, data, k=args.k, exclude=[story])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            m.fit(data, nrep=args.warm_nrep, candidates=candidates)
+        t = time.perf_counter() - tic
+        mc, tc = cold[story]
+        ok = m.cost_ <= mc.cost_ * (1 + args.rtol)
+        hits += hit(m, len(candidates))
+        converged += ok
+        t_cold += tc
+        t_warm += t
+        print(row.format(story, "{:.6g}".format(mc.cost_), "{:.2f}".format(tc),
+                         "{:.6g}".format(m.cost_), "{:.2f}".format(t),
+                         "yes" if hit(m, len(candidates)) else "no",
+                         "yes" if ok else "no"))
+    print("Hit rate: {}/{}. Converged: {}/{}. Total time: cold {:.2f} s, "
+          "warm {:.2f} s.".format(hits, len(stories), converged, len(stories),
+                                  t_cold, t_warm))
+
+
+def bench_mcmc(args):
+    """
+    Ensemble posterior sampling: cost of the vectorized likelihood of a half
+    ensemble against a loop over walkers, then autocorrelation time and
+    effective samples per second of a run started at the fit.
+    """
+    M = getattr(models, args.model)
+    data = gendata(refmodel(args.model))
+    numpy.random.seed(args.seed)
+    m = M()
+    m.inity0(args.fity0, data[0, 0], data[0, 1])
+    unknown = m._unknowns()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fitted = M()
+        fitted.inity0(args.fity0, data[0, 0], data[0, 1])
+        fitted.fit(data, nrep=3)
+    x0 = fitted._x[unknown]
+    # likelihood of half an ensemble, around the fit
+    X = x0 * numpy.random.uniform(0.9, 1.1, (args.nwalkers // 2, len(x0)))
+    m.data = data
+    m.times = numpy.arange(len(data))
+    m._fitidx = unknown
+    t_loop = min(timeit(lambda: [m._residuals(x) for x in X])
+                 for i in range(3))
+    t_batch = min(timeit(m._batchcost, X) for i in range(3))
+    del m.data, m.times, m._fitidx
+    print("Likelihood of {} walkers: loop {:.2f} ms, batch {:.2f} ms "
+          "({:.1f}x)".format(len(X), 1e3 * t_loop, 1e3 * t_batch,
+                             t_loop / t_batch))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        t = timeit(m.sample_posterior, data, nwalkers=args.nwalkers,
+                   nsteps=args.nsteps, x0=x0, burn=args.nsteps // 4,
+                   n_jobs=args.jobs, path=args.output)
+    row = "{:>12}  {:>12}  {:>12}"
+    print(row.format("UNKNOWN", "MEDIAN", "TAU (STEPS)"))
+    flat = m.chain_[args.nsteps // 4:].reshape(-1, len(x0))
+    for name, med, tau in zip(m.sampled_, numpy.median(flat, axis=0),
+                              m.tau_):
+        print(row.format(name, "{:.4g}".format(med), "{:.1f}".format(tau)))
+    print("{} walkers x {} steps: {:.2f} s, acceptance {:.2f}, ESS {:.0f}, "
+          "{:.1f} effective samples/s".format(
+              args.nwalkers, args.nsteps, t, m.acceptance_.mean(), m.ess_,
+              m.ess_per_sec_))
+
+
+def bench_profile(args):
+    """
+    Profile likelihood confidence intervals of a fit on synthetic data,
+    computed serially and on a process pool.
+    """
+    M = getattr(models, args.model)
+    ref = refmodel(args.model)
+    data = gendata(ref)
+    m = M()
+    m.inity0(args.fity0, data[0, 0], data[0, 1])
+    # start one repetition from the true values, so that the profiles are
+    # centered on the global minimum
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        m.fit(data, nrep=args.nrep, candidates=ref._x[None, m._unknowns()])
+    results = []
+    for n_jobs in [None, args.jobs]:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            t = timeit(m.profile, data, name=args.params,
+                       npoints=args.npoints, n_jobs=n_jobs)
+        results.append((t, dict(m.ci_)))
+    (t1, ci1), (tn, cin) = results
+    row = "{:>8}  {:>10}  {:>10}  {:>10}"
+    print(row.format("NAME", "VALUE", "LOWER", "UPPER"))
+    for name in ci1:
+        lo, hi = ci1[name]
+        print(row.format(name, "{:.4g}".format(getattr(m, name)),
+                         "{:.4g}".format(lo), "{:.4g}".format(hi)))
+    print("{} points per profile: serial {:.2f} s, {} jobs {:.2f} s ({:.1f}x)"
+          ", identical: {}".format(args.npoints, t1, args.jobs, tn, t1 / tn,
+                                   "yes" if ci1 == cin else "NO"))
+
+
+def bench_bootstrap(args):
+    """
+    Bootstrap confidence intervals of a fit on synthetic data: serial
+    against a process pool, and with early stopping.
+    """
+    M = getattr(models, args.model)
+    ref = refmodel(args.model)
+    data = gendata(ref)
+    m = M()
+    m.inity0(args.fity0, data[0, 0], data[0, 1])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        m.fit(data, nrep=args.nrep, candidates=ref._x[None, m._unknowns()])
+    row = "{:>6}  {:>6}  {:>10}  {:>9}  {:>9}"
+    print(row.format("N_JOBS", "TOL", "REPLICATES", "TIME (s)", "IDENTICAL"))
+    ref_ci = None
+    for n_jobs, tol in [(None, None), (args.jobs, None), (None, args.tol)]:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            t = timeit(m.bootstrap, data, nboot=args.nboot,
+                       method=args.method, seed=args.seed, tol=tol,
+                       check=args.check, n_jobs=n_jobs)
+        ci = m.bootstrap_['ci']
+        if ref_ci is None:
+            ref_ci = ci
+        print(row.format(n_jobs or 1, tol or "-", len(m.bootstrap_['x']),
+                         "{:.2f}".format(t), "yes" if ci == ref_ci else "NO"))
+    row = "{:>8}  {:>10}  {:>10}  {:>10}  {:>10}"
+    print(row.format("NAME", "TRUE", "VALUE", "LOWER", "UPPER"))
+    for name, (lo, hi) in ref_ci.items():
+        print(row.format(name, "{:.4g}".format(getattr(ref, name)),
+                         "{:.4g}".format(getattr(m, name)),
+                         "{:.4g}".format(lo), "{:.4g}".format(hi)))
+
+
+def _legacy(name, path):
+    """ Import a module of the legacy fitting code from its path. """
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                        path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_discrete(args):
+    """
+    Compare the legacy mean-field maps, which step one system in a Python
+    loop, with the discrete-time models, one system at a time and as a
+    batch.
+    """
+    # mf_noseg of 2017-03_def_fitting fails its own check of the number of
+    # agents as soon as FA > 0; mf_noseg_FI of 2016 is the same map.
+    mf2016 = _legacy('models_functions',
+                     '2016-11-18-fit-with-baselines/models_functions.py')
+    mf2017 = _legacy('mod_func', '2017-03_def_fitting/mod_func.py')
+    T = numpy.arange(args.tmax)
+    R = args.nsys
+    N = 10000.0
+    ba, bi = 0.01, 0.02
+    # parameters of each system, within [0.05, 0.95]
+    U = numpy.random.uniform(0.05, 0.95, (R, 6))
+    cases = []
+    # (alpha, pv, tau)
+    noseg = models.ProbHoaxModel()
+    y0 = N * numpy.array([ba, 0, bi, 0, 1 - ba - bi])
+    cases.append((
+        'ProbHoaxModel', noseg, U[:, [1, 2, 0]], y0,
+        lambda u: mf2016.mf_noseg_FI(T, u[0], 1 / N, ba, bi, 0, 0, u[1],
+                                     u[2])))
+    # (alpha, pvgu, pvsk, tau, gamma, seg)
+    seg = models.ProbSegHoaxModel()
+    gamma = 0.5
+    y0 = N * numpy.array([gamma * ba, 0, gamma * bi, 0,
+                          gamma * (1 - ba - bi), (1 - gamma) * ba, 0,
+                          (1 - gamma) * bi, 0, (1 - gamma) * (1 - ba - bi)])
+    U[:, 4] = gamma
+    cases.append((
+        'ProbSegHoaxModel', seg, U[:, [1, 2, 3, 0, 5, 4]], y0,
+        lambda u: mf2017.mf_seg(T, u[0], 1 / N, ba, bi, 0, 0, u[1], u[2],
+                                u[3], u[4], u[5])))
+    row = "{:>16}  {:>11}  {:>11}  {:>11}  {:>8}  {:>9}"
+    print(row.format("MODEL", "LEGACY (s)", "SINGLE (s)", "BATCH (s)",
+                     "SPEEDUP", "MAX. DIFF"))
+    for name, m, thetas, y0, legacy in cases:
+        t_legacy = timeit(lambda: [legacy(u) for u in U])
+        ref = numpy.array([numpy.stack(legacy(u), axis=1) for u in U])
+
+        def single():
+            out = []
+            for theta in thetas:
+                m.theta = theta
+                m.y0 = y0
+                out.append(m.simulate(T, cache=False))
+            return out
+
+        t_single = timeit(single)
+        t_batch = timeit(m.simulate_many, thetas, y0, T)
+        y = m.simulate_many(thetas, y0, T)
+        # the legacy code returns cumulative counts
+        diff = numpy.abs(numpy.cumsum(y, axis=1) - ref).max() / ref.max()
+        print(row.format(name, "{:.3f}".format(t_legacy),
+                         "{:.3f}".format(t_single), "{:.3f}".format(t_batch),
+                         "{:.0f}x".format(t_legacy / t_batch),
+                         "{:.1e}".format(diff)))
+    # simprobmodel: generic loop against the vectorized fast path
+    y0 = numpy.array([100.0, 0, 200, 0, 9700])
+    p = (0.05, 0.1, 0.6)
+
+    def loop():
+        return models.simprobmodel(args.tmax, lambda y, t, *a:
+                                   models.probmodel(y, t, *a), y0, *p)
+
+    t_loop = timeit(loop)
+    t_fast = timeit(models.simprobmodel, args.tmax, models.probmodel, y0, *p)
+    print("simprobmodel, {} steps: loop {:.2f} ms, iterate {:.2f} ms "
+          "({:.0f}x)".format(args.tmax, 1e3 * t_loop, 1e3 * t_fast,
+                             t_loop / t_fast))
+
+
+def bench_compile(args):
+    """
+    Compare the models compiled from their specifications (see
+    `models.specs`) with the hand-written ones: time per call of the
+    derivatives and the Jacobian, time per simulation, and difference of the
+    trajectories.
+    """
+    from models.specs import COMPILED
+    times = numpy.arange(args.tmax)
+    row = "{:>14}  {:>8}  {:>9}  {:>9}  {:>9}  {:>9}  {:>9}"
+    print(row.format("MODEL", "VERSION", "RHS (us)", "JAC (us)",
+                     "SIM (ms)", "BATCH (ms)", "MAX. DIFF"))
+    for modelcls in args.models:
+        m = refmodel(modelcls)
+        c = COMPILED[modelcls]()
+        c.theta = m.theta
+        c.y0 = m.y0
+        thetas = randtheta(m, args.nrep)
+        ref = m.simulate(times, cache=False)
+        for label, model in [("hand", m), ("compiled", c)]:
+            y = model.y0
+            theta = model.theta
+            t_rhs = min(timeit(model.rhs, y, 0.0, theta)
+                        for i in range(args.repeat))
+            t_jac = min(timeit(model.rhs_jac, y, 0.0, theta)
+                        for i in range(args.repeat))
+            t_sim = min(timeit(model.simulate, times, cache=False)
+                        for i in range(args.repeat))
+            t_batch = timeit(model.simulate_many, thetas, y, times)
+            diff = numpy.abs(model.simulate(times, cache=False) - ref).max() \
+                / numpy.abs(ref).max()
+            print(row.format(modelcls, label, "{:.1f}".format(1e6 * t_rhs),
+                             "{:.1f}".format(1e6 * t_jac),
+                             "{:.2f}".format(1e3 * t_sim),
+                             "{:.1f}".format(1e3 * t_batch),
+                             "{:.1e}".format(diff)))
+
+
+def bench_reduce(args):
+    """
+    Compare integration of the full state with integration of the state
+    reduced by the conservation laws of the model: size of the Jacobian,
+    derivative evaluations, time per simulation (one system and a batch),
+    and difference of the trajectories.
+    """
+    times = numpy.arange(args.tmax)
+    row = "{:>14}  {:>7}  {:>4}  {:>9}  {:>6}  {:>9}  {:>10}  {:>9}"
+    print(row.format("MODEL", "STATE", "N", "JAC SIZE", "NFE", "SIM (ms)",
+                     "BATCH (ms)", "MAX. DIFF"))
+    for modelcls in args.models:
+        m = refmodel(modelcls)
+        thetas = randtheta(m, args.nrep)
+        ref = m.simulate_many(thetas, m.y0, times, full=True)
+        for reduced in (False, True):
+            m.reduced = reduced
+            n = len(m._y0) - (len(m._conserved) if reduced else 0)
+            # count the evaluations of the derivative of one simulation
+            m.diagnostics = 'full'
+            m.diagnostics_ = models.diagnostics.Diagnostics()
+            m.simulate(times, cache=False)
+            nfe = m.diagnostics_.rhs_calls
+            m.diagnostics = 'off'
+            t_sim = min(timeit(m.simulate, times, cache=False)
+                        for i in range(args.repeat))
+            t_batch = min(timeit(m.simulate_many, thetas, m.y0, times)
+                          for i in range(max(1, args.repeat // 10)))
+            y = m.simulate_many(thetas, m.y0, times, full=True)
+            diff = numpy.abs(y - ref).max() / numpy.abs(ref).max()
+            print(row.format(modelcls, "reduced" if reduced else "full", n,
+                             n * n, nfe, "{:.2f}".format(1e3 * t_sim),
+                             "{:.1f}".format(1e3 * t_batch),
+                             "{:.1e}".format(diff)))
+
+
+# Scenarios of `bench_import`, name -> code. PICKLE is the path of a pickled
+# model.
+IMPORT_SCENARIOS = {
+    'import models': "import models",
+    'import models.hoaxmodel': "import models.hoaxmodel",
+    'import fit': "import fit",
+    'fit.py --help': "import sys, runpy; sys.argv = ['fit.py', '--help']\n"
+                     "try: runpy.run_path('fit.py', run_name='__main__')\n"
+                     "except SystemExit: pass",
+    'load + simulate (rk4)': "import pickle, numpy\n"
+                             "m = pickle.load(open(PICKLE, 'rb'))\n"
+                             "m.simulate(numpy.arange(168), solver='rk4')",
+    'load + simulate (lsoda)': "import pickle, numpy\n"
+                               "m = pickle.load(open(PICKLE, 'rb'))\n"
+                               "m.simulate(numpy.arange(168))",
+}
+
+# Modules reported by `bench_import`
+HEAVY_MODULES = ['scipy.integrate', 'scipy.optimize', 'scipy.stats', 'pandas',
+                 'matplotlib']
+
+
+def bench_import(args):
+    """
+    Startup time of the scripts and of the models package, and of loading
+    and simulating a fitted model, each in a fresh interpreter, with the
+    heavy modules they import.
+    """
+    import sys
+    import pickle
+    import tempfile
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    m = refmodel('HoaxModel')
+    with tempfile.NamedTemporaryFile(suffix='.pickle', delete=False) as f:
+        pickle.dump(m, f)
+    row = "{:>24}  {:>9}  {}"
+    print(row.format("SCENARIO", "TIME (s)", "HEAVY MODULES"))
+    try:
+        for name, code in IMPORT_SCENARIOS.items():
+            code = "PICKLE = {!r}\n{}\nimport sys as _s\nprint('HEAVY:', " \
+                "*[x for x in {!r} if x in _s.modules])".format(
+                    f.name, code, HEAVY_MODULES)
+            times = []
+            for i in range(args.repeat):
+                tic = time.perf_counter()
+                out = subprocess.run([sys.executable, '-c', code], cwd=here,
+                                     stdout=subprocess.PIPE, check=True,
+                                     universal_newlines=True).stdout
+                times.append(time.perf_counter() - tic)
+            heavy = out.rsplit('HEAVY:', 1)[-1].strip()
+            print(row.format(name, "{:.3f}".format(min(times)),
+                             heavy or "-"))
+    finally:
+        os.remove(f.name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-S', '--seed', type=int, help='PRNG seed')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('simulate-many',
+                              help=bench_simulate_many.__doc__.strip())
+    p.add_argument('-m', '--models', nargs='+', default=BENCH_MODELS,
+                   choices=BENCH_MODELS, metavar='NAME')
+    p.add_argument('-R', '--nrep', nargs='+', type=int,
+                   default=[10, 100, 10_000], metavar='R',
+                   help='batch sizes (default: %(default)s)')
+    p.add_argument('-T', '--tmax', type=int, default=168,
+                   help='number of time steps (default: %(default)s)')
+    p.set_defaults(func=bench_simulate_many)
+
+    p = subparsers.add_parser('jac', help=bench_jac.__doc__.strip())
+    p.add_argument('-m', '--models', nargs='+', choices=BENCH_MODELS,
+                   default=['HoaxModel', 'SegHoaxModel', 'DoubleSIR', 'SEIZ'],
+                   metavar='NAME')
+    p.add_argument('-T', '--tmax', type=int, default=168,
+                   help='number of time steps (default: %(default)s)')
+    p.add_argument('-r', '--repeat', type=int, default=10,
+                   help='take best of %(metavar)s runs (default: %(default)s)',
+                   metavar='N')
+    p.set_defaults(func=bench_jac)
+
+    p = subparsers.add_parser('fit-jac', help=bench_fit_jac.__doc__.strip())
+    p.add_argument('path', nargs='?', help='data file (default: synthetic)')
+    p.add_argument('-s', '--story', type=int, metavar='ID', nargs='+',
+                   dest='stories', help='only stories with these ID(s)')
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-n', '--nrep', type=int, default=3,
+                   help='fit repetitions (default: %(default)s)')
+    p.set_defaults(func=bench_fit_jac)
+
+    p = subparsers.add_parser('transform',
+                              help=bench_transform.__doc__.strip())
+    p.add_argument('path', nargs='?', help='data file (default: synthetic)')
+    p.add_argument('-s', '--story', type=int, metavar='ID', nargs='+',
+                   dest='stories', help='only stories with these ID(s)')
+    p.add_argument('-m', '--models', nargs='+', default=BENCH_MODELS,
+                   choices=BENCH_MODELS, metavar='NAME')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-n', '--nrep', type=int, default=10,
+                   help='fit repetitions (default: %(default)s)')
+    p.add_argument('--jac', default='2-point',
+                   choices=['2-point', 'sensitivity'])
+    p.set_defaults(func=bench_transform)
+
+    p = subparsers.add_parser('fit-jobs', help=bench_fit_jobs.__doc__.strip())
+    p.add_argument('-m', '--model', default='SegHoaxModel',
+                   choices=BENCH_MODELS, metavar='NAME',
+                   help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-n', '--nrep', type=int, nargs='+', default=[10, 50, 200],
+                   help='fit repetitions (default: %(default)s)')
+    p.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                   help='worker processes (default: %(default)s)')
+    p.set_defaults(func=bench_fit_jobs)
+
+    p = subparsers.add_parser('race', help=bench_race.__doc__.strip())
+    p.add_argument('path', nargs='?', help='data file (default: synthetic)')
+    p.add_argument('-s', '--story', type=int, metavar='ID', nargs='+',
+                   dest='stories', help='only stories with these ID(s)')
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-n', '--nrep', type=int, default=50,
+                   help='fit repetitions (default: %(default)s)')
+    p.add_argument('--race', type=int, nargs='+', default=[5, 15, 45],
+                   metavar='NFEV', help='evaluations per round (default: '
+                   '%(default)s)')
+    p.add_argument('--eta', type=float, default=3,
+                   help='reduction factor (default: %(default)s)')
+    p.set_defaults(func=bench_race)
+
+    p = subparsers.add_parser('design', help=bench_design.__doc__.strip())
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-d', '--designs', nargs='+', default=['uniform', 'lhs',
+                                                          'sobol'],
+                   choices=sorted(models.DESIGNS), metavar='NAME')
+    p.add_argument('-n', '--nrep', type=int, nargs='+',
+                   default=[1, 2, 4, 8, 16],
+                   help='fit repetitions (default: %(default)s)')
+    p.add_argument('-t', '--trials', type=int, default=5,
+                   help='synthetic data sets (default: %(default)s)')
+    p.add_argument('--rtol', type=float, default=1e-3,
+                   help='relative tolerance on the target cost (default: '
+                   '%(default)s)')
+    p.set_defaults(func=bench_design)
+
+    p = subparsers.add_parser('de', help=bench_de.__doc__.strip())
+    p.add_argument('path', nargs='?', help='data file (default: synthetic)')
+    p.add_argument('-s', '--story', type=int, metavar='ID', nargs='+',
+                   dest='stories', help='only stories with these ID(s)')
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-n', '--nrep', type=int, default=10,
+                   help='fit repetitions (default: %(default)s)')
+    p.add_argument('--maxiter', type=int, default=100,
+                   help='max. generations (default: %(default)s)')
+    p.set_defaults(func=bench_de)
+
+    p = subparsers.add_parser('bank', help=bench_bank.__doc__.strip())
+    p.add_argument('path', nargs='?', help='data file (default: synthetic)')
+    p.add_argument('-s', '--story', type=int, metavar='ID', nargs='+',
+                   dest='stories', help='only stories with these ID(s)')
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-n', '--nrep', type=int, default=10,
+                   help='repetitions of cold fits (default: %(default)s)')
+    p.add_argument('-k', type=int, default=3,
+                   help='bank candidates (default: %(default)s)')
+    p.add_argument('--warm-nrep', type=int, default=1,
+                   help='random repetitions of warm fits, in addition to '
+                   'the candidates (default: %(default)s)')
+    p.add_argument('--pickles', nargs='+', default=[], metavar='PATH',
+                   help='result pickles of fit.py to add to the bank')
+    p.add_argument('--rtol', type=float, default=1e-3,
+                   help='relative tolerance on the cold cost (default: '
+                   '%(default)s)')
+    p.set_defaults(func=bench_bank)
+
+    p = subparsers.add_parser('mcmc', help=bench_mcmc.__doc__.strip())
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-w', '--nwalkers', type=int, default=32,
+                   help='walkers (default: %(default)s)')
+    p.add_argument('-n', '--nsteps', type=int, default=1000,
+                   help='steps (default: %(default)s)')
+    p.add_argument('-j', '--jobs', type=int, default=None,
+                   help='worker processes (default: none)')
+    p.add_argument('-o', '--output', help='stream the chain to this .npy file')
+    p.set_defaults(func=bench_mcmc)
+
+    p = subparsers.add_parser('profile', help=bench_profile.__doc__.strip())
+    p.add_argument('-m', '--model', default='SegHoaxModel',
+                   choices=BENCH_MODELS, metavar='NAME',
+                   help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('--params', nargs='+',
+                   default=['seg', 'gamma', 'pvgu', 'pvsk'],
+                   help='variables to profile (default: %(default)s)')
+    p.add_argument('-R', '--nrep', type=int, default=3,
+                   help='repetitions of the fit (default: %(default)s)')
+    p.add_argument('-p', '--npoints', type=int, default=21,
+                   help='points per profile (default: %(default)s)')
+    p.add_argument('-j', '--jobs', type=int, default=2,
+                   help='worker processes (default: %(default)s)')
+    p.set_defaults(func=bench_profile)
+
+    p = subparsers.add_parser('bootstrap',
+                              help=bench_bootstrap.__doc__.strip())
+    p.add_argument('-m', '--model', default='HoaxModel', choices=BENCH_MODELS,
+                   metavar='NAME', help='model (default: %(default)s)')
+    p.add_argument('-f', '--fit-y0', default='non-obs', dest='fity0',
+                   choices=['all', 'none', 'non-obs'])
+    p.add_argument('-R', '--nrep', type=int, default=3,
+                   help='repetitions of the fit (default: %(default)s)')
+    p.add_argument('-B', '--nboot', type=int, default=100,
+                   help='replicates (default: %(default)s)')
+    p.add_argument('--method', default='residual',
+                   choices=['residual', 'parametric'])
+    p.add_argument('--tol', type=float, default=0.1,
+                   help='early stopping tolerance (default: %(default)s)')
+    p.add_argument('--check', type=int, default=20,
+                   help='replicates between checks (default: %(default)s)')
+    p.add_argument('-j', '--jobs', type=int, default=2,
+                   help='worker processes (default: %(default)s)')
+    p.set_defaults(func=bench_bootstrap)
+
+    p = subparsers.add_parser('discrete',
+                              help=bench_discrete.__doc__.strip())
+    p.add_argument('-R', '--nsys', type=int, default=100,
+                   help='number of systems (default: %(default)s)')
+    p.add_argument('-T', '--tmax', type=int, default=168,
+                   help='number of steps (default: %(default)s)')
+    p.set_defaults(func=bench_discrete)
+
+    p = subparsers.add_parser('compile', help=bench_compile.__doc__.strip())
+    p.add_argument('-m', '--models', nargs='+', default=BENCH_MODELS,
+                   choices=BENCH_MODELS, metavar='NAME')
+    p.add_argument('-R', '--nrep', type=int, default=100,
+                   help='batch size (default: %(default)s)')
+    p.add_argument('-T', '--tmax', type=int, default=168,
+                   help='number of time steps (default: %(default)s)')
+    p.add_argument('-r', '--repeat', type=int, default=20,
+                   help='take best of %(metavar)s runs (default: %(default)s)',
+                   metavar='N')
+    p.set_defaults(func=bench_compile)
+
+    p = subparsers.add_parser('reduce', help=bench_reduce.__doc__.strip())
+    p.add_argument('-m', '--models', nargs='+', choices=BENCH_MODELS,
+                   default=['HoaxModel', 'SegHoaxModel'], metavar='NAME')
+    p.add_argument('-R', '--nrep', type=int, default=100,
+                   help='batch size (default: %(default)s)')
+    p.add_argument('-T', '--tmax', type=int, default=168,
+                   help='number of time steps (default: %(default)s)')
+    p.add_argument('-r', '--repeat', type=int, default=20,
+                   help='take best of %(metavar)s runs (default: %(default)s)',
+                   metavar='N')
+    p.set_defaults(func=bench_reduce)
+
+    p = subparsers.add_parser('import', help=bench_import.__doc__.strip())
+    p.add_argument('-r', '--repeat', type=int, default=5,
+                   help='take best of %(metavar)s runs (default: %(default)s)',
+                   metavar='N')
+    p.set_defaults(func=bench_import)
+
+    p = subparsers.add_parser('solvers', help=bench_solvers.__doc__.strip())
+    p.add_argument('-m', '--models', nargs='+', default=BENCH_MODELS,
+                   choices=BENCH_MODELS, metavar='NAME')
+    p.add_argument('--solvers', nargs='+', default=sorted(models.SOLVERS),
+                   choices=sorted(models.SOLVERS), metavar='NAME')
+    p.add_argument('--tol', default='default', choices=['fast', 'default',
+                                                        'accurate'],
+                   help='tolerance preset (default: %(default)s)')
+    p.add_argument('-T', '--tmax', type=int, nargs='+',
+                   default=[24, 168, 720],
+                   help='story lengths (default: %(default)s)')
+    p.add_argument('-r', '--repeat', type=int, default=3,
+                   help='take best of %(metavar)s runs (default: %(default)s)',
+                   metavar='N')
+    p.add_argument('--max-err', type=float, default=1e-3,
+                   help='max. relative error of a stable solver (default: '
+                   '%(default)s)')
+    p.set_defaults(func=bench_solvers)
+
+    args = parser.parse_args()
+    numpy.random.seed(args.seed)
+    args.func(args)
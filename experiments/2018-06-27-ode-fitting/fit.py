@@ -3,17 +3,22 @@
 import os
 import sys
 import re
+import json
 import pickle
+import time
+import shutil
 import datetime
 import numpy
-import pandas
-import matplotlib
-import matplotlib.pyplot as plt
 import argparse
 import logging
+import collections
 from contextlib import closing
 
 import models
+from bank import ParameterBank, hit
+import scheduler
+import pipeline
+from fitcache import FitCache, fitkey, filedigest
 
 # FIXME: do not use root logger, since it is used by other packages (e.g.
 # matplotlib). Create your own logger instance(s).
@@ -21,33 +26,79 @@ logger = logging.getLogger()
 
 # Path template
 OPATH_LOG = '{model}-{timestamp}.log'
+OPATH_STATS = '{model}-{timestamp}.jsonl'
 OPATH_MOD = 'models-{model}-{timestamp}.pickle'
 OPATH_FIG = 'fig-{model}-{timestamp}-{story:02d}.pdf'
+OPATH_RES = 'results-{model}-{timestamp}.csv'
+
+# Path templates of the fits of a grid run (several models or fity0)
+OPATH_MOD_GRID = 'models-{model}-{fity0}-{timestamp}.pickle'
+OPATH_FIG_GRID = 'fig-{model}-{fity0}-{timestamp}-{story:02d}.pdf'
+
+# Scores of the fits in the results table (see `ODEModel.error`). Fits are
+# ranked by the first.
+SCORES = ['aic', 'bic', 'mape', 'smape', 'logaccratio', 'rmse']
+
+# Stories read ahead of the fits, and fits waiting to be reported and plotted
+PREFETCH = 2
+RENDER_QUEUE = 4
+
+# Modules imported once for all the processes of the workers and of the render
+# stage (see `scheduler.preload`), besides this one
+PRELOAD = ['pandas', 'models.base', 'scipy.integrate', 'scipy.optimize']
 
 # Used in path template
 NOW = datetime.datetime.now().replace(microsecond=0)
 
-# Used by cmd line parser
-AVAIL_MODELS = [v.__name__ for v in models.__dict__.values()
-                if isinstance(v, type) and issubclass(v, models.ODEModel)]
-# The base class -- cannot be chosen
-AVAIL_MODELS.remove('ODEModel')
-
-# Find out terminal size
-py_vers = sys.version_info
-if py_vers.major >= 3 and py_vers.minor >= 3:
-    import shutil
-    # on Python 3.3+ use os.get_terminal_size
-    TERM_COLS = shutil.get_terminal_size().columns
-elif os.name == "posix":
-    # if that's not available ...
-    # ... on Linux/Unix use stty to get terminal size
-    import subprocess
-    result = subprocess.getoutput("stty size")
-    _, TERM_COLS = map(int, result.split())
-else:
-    # ... on Windows assume default of 80 columns
-    TERM_COLS = 80
+# Used by cmd line parser (models are imported only when chosen)
+AVAIL_MODELS = list(models.MODELS)
+
+# Headless mode (e.g. on a batch node): the terminal is not probed, and plots
+# use the non-interactive Agg backend. Set by `main`.
+HEADLESS = False
+
+# Terminal size, found on first use (see `termcols`)
+TERM_COLS = None
+
+
+def termcols():
+    """ Width of the terminal (80 columns in headless mode). """
+    global TERM_COLS
+    if TERM_COLS is None:
+        TERM_COLS = 80 if HEADLESS else shutil.get_terminal_size().columns
+    return TERM_COLS
+
+
+class Cell(collections.namedtuple('Cell', ['story', 'modelcls', 'fity0'])):
+    """ A fit of a run: a story, a model, and how y0 is fit. """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return "{} ({}, {})".format(*self)
+
+
+def pyplot():
+    """
+    Import matplotlib.pyplot on first use: pandas and matplotlib are only
+    needed to read the data and to plot.
+    """
+    import matplotlib
+    if HEADLESS:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def interactive():
+    """
+    Whether the figures are shown at the end of the run: matplotlib is in
+    interactive mode, and the run is not headless.
+    """
+    if HEADLESS:
+        return False
+    import matplotlib
+    return matplotlib.is_interactive()
 
 
 def _iscsv(path):
@@ -63,6 +114,7 @@ def _ishdf(path):
 
 
 def readdata(path, stories=None):
+    import pandas
     if _ishdf(path):
         # HDFStore where each story is a separate data frame, keyed as
         #
@@ -89,16 +141,83 @@ def readdata(path, stories=None):
             yield (story, df)
 
 
-def fit(df, modelcls='HoaxModel', fity0="non-obs"):
+def makegrid(modelcls, fity0):
+    """
+    The lists of models and of ways to fit y0 of a run, each given as a
+    name or a list of names, and the grid of their pairs.
+    """
+    if isinstance(modelcls, str):
+        modelcls = [modelcls]
+    if isinstance(fity0, str):
+        fity0 = [fity0]
+    return modelcls, fity0, [(m, f) for m in modelcls for f in fity0]
+
+
+def checkgrid(grid):
+    """
+    Check a grid of (model, fity0) before fitting it: each model must support
+    its way to fit y0 (see `ODEModel.inity0_options`), and have one
+    observable per column of the data (fake and fact). Returns the list of
+    problems found.
+    """
+    problems = []
+    for modelcls in collections.OrderedDict.fromkeys(m for m, _ in grid):
+        M = getattr(models, modelcls)
+        y = numpy.ones((1, len(M._y0)))
+        if M.obs is not models.ODEModel.obs:
+            y = M.obs(y)
+        if y.shape[-1] != 2:
+            problems.append("{} has {} observables, not 2 (fake and "
+                            "fact)".format(modelcls, y.shape[-1]))
+    for modelcls, fity0 in grid:
+        options = getattr(models, modelcls).inity0_options()
+        if fity0 not in options:
+            problems.append("{} cannot fit y0 with {} (supported: {})".format(
+                modelcls, fity0, ", ".join(options)))
+    return problems
+
+
+def fit(df, modelcls='HoaxModel', fity0="non-obs", diagnostics="off",
+        solver="lsoda", design=None, bank=None, bank_k=3, profile=None,
+        profile_points=21, nboot=None, boot_method="residual",
+        transform=None, reduced=False):
     t0 = df.index[0]
     BA0 = df.loc[t0]['fake']
     FA0 = df.loc[t0]['fact']
     M = getattr(models, modelcls)
     m = M()
+    logger.info("Model: {}".format(modelcls))
+    m.diagnostics = diagnostics
+    m.solver = solver
+    logger.info("Solver: {}".format(solver))
+    m.transform = transform
+    if transform is not None:
+        logger.info("Transform: {}".format(transform))
+    m.reduced = reduced
+    if reduced:
+        logger.info("Reduced state: {}".format(m._conserved))
     m.inity0(fity0, BA0, FA0)
     logger.info("Fit y0: {}".format(fity0))
     data = numpy.c_[df['fake'], df['fact']]
-    m.fit(data)
+    if design is not None:
+        logger.info("Start design: {}".format(design))
+    candidates = None
+    if bank is not None:
+        candidates = bank.candidates(m, data, k=bank_k)
+        logger.info("Bank: {} candidate(s)".format(len(candidates)))
+    m.fit(data, design=design, candidates=candidates)
+    if hasattr(m, 'nfev_'):
+        logger.info("Evaluations: {} residual, {} Jacobian".format(m.nfev_,
+                                                                  m.njev_))
+    logger.info("Work: {}".format(m.fitstats_))
+    if bank is not None:
+        logger.info("Bank: best fit from {} start".format(
+            "bank" if hit(m, len(candidates)) else "random"))
+    if profile is not None:
+        # empty list: all fitted variables
+        m.profile(data, name=profile or None, npoints=profile_points)
+    if nboot:
+        m.bootstrap(data, nboot=nboot, method=boot_method)
     return m
 
 
@@ -113,14 +232,116 @@ def report(df, m):
     }
     width = max(map(len, metrics.values()))
     s = "{metric:>{width}}: {err: 6.2f}%"
+    errors = m.error(data, metric=list(metrics))
     for metric in metrics:
-        err = m.error(data, metric=metric)
+        err = errors[metric]
         logger.info(s.format(metric=metrics[metric], width=width, err=err))
 
 
-def plotone(ax, data_df, fit_df, title):
+def score(df, model):
+    """
+    Information criteria and error metrics of a fitted model (see `SCORES`),
+    from a single simulation.
+    """
+    data = numpy.c_[df['fake'], df['fact']]
+    return model.error(data, metric=SCORES)
+
+
+def fitstats(model):
+    """
+    The work done by the fit of a model, without the simulations done after
+    it (see `models.FitStats`), or None.
+    """
+    stats = getattr(model, 'fitstats_', None)
+    if stats is None:
+        # fits cached before fitstats_ existed
+        stats = getattr(model, 'stats_', None)
+    return stats
+
+
+def writestats(f, cell, model, cached=False):
+    """
+    Append the work done by a fit (see `fitstats`) to the file f, as a line
+    of JSON.
+    """
+    obj = {
+        "story": int(cell.story),
+        "modelcls": cell.modelcls,
+        "fity0": cell.fity0,
+        "cached": cached,
+        "cost": float(getattr(model, 'cost_', numpy.nan)),
+    }
+    stats = fitstats(model)
+    if stats is not None:
+        obj.update(stats.todict())
+    f.write(json.dumps(obj) + "\n")
+    f.flush()
+
+
+def statstable(fitted, cached=()):
+    """
+    Log a table of the work done by each fit, from a dict label -> model
+    (see `fitstats`). Fits found in the cache are marked.
+    """
+    headers = ["STORY", "RESTARTS", "NFEV", "NJEV", "INTEGR.", "RHS EVALS",
+               "FAILED", "FIT TIME [s]"]
+    rows = []
+    for story, model in fitted.items():
+        stats = fitstats(model)
+        if stats is None:
+            continue
+        obj = stats.todict()
+        rows.append(["{}{}".format(story, "*" if story in cached else ""),
+                     len(obj["restarts"]), obj["nfev"], obj["njev"],
+                     obj["integrations"], obj["rhs_calls"], obj["failures"],
+                     "{:.2f}".format(obj["fit_time"])])
+    if not rows:
+        return
+    total = ["TOTAL"] + [sum(row[i] for row in rows) for i in range(1, 7)]
+    total.append("{:.2f}".format(sum(float(row[7]) for row in rows)))
+    rows.append(total)
+    widths = [max(len(str(row[i])) for row in rows + [headers])
+              for i in range(len(headers))]
+    template = "  ".join("{{:>{}}}".format(w) for w in widths)
+    logger.info(template.format(*headers))
+    for row in rows:
+        logger.info(template.format(*row))
+    if cached:
+        logger.info("(*) fit found in the cache")
+
+
+def resultstable(scores, cached, path):
+    """
+    Write the scores of the fits, a dict cell -> scores (see `score`), as a
+    CSV table with one row per fit. Within each story, fits are ranked by
+    the first score (see `SCORES`; lower is better). The table is logged
+    too.
+    """
+    import pandas
+    rows = []
+    for cell, values in scores.items():
+        row = cell._asdict()
+        row.update(values)
+        row["cached"] = cell in cached
+        rows.append(row)
+    table = pandas.DataFrame(rows)
+    table.insert(3, "rank", table.groupby("story")[SCORES[0]].rank(
+        method="min").astype(int))
+    table = table.sort_values(["story", "rank"], kind="stable")
+    table.to_csv(path, index=False)
+    text = table.drop(columns="cached").to_string(
+        index=False, float_format="{:.2f}".format)
+    for line in text.splitlines():
+        logger.info(line)
+    logger.info("Written: {}".format(path))
+
+
+def plotone(ax, data_df, fit_df, title, band=None):
     data_df.plot(color='k', ls='', marker='o', ax=ax)
     fit_df.plot(color='r', ls='-', ax=ax)
+    if band is not None:
+        # bootstrap confidence band of the fit
+        ax.fill_between(fit_df.index, *band, color='r', alpha=0.2, lw=0)
     ax.legend(["Data", "Fit"], loc='best')
     ax.set_title(title)
     ax.set_yscale('symlog')
@@ -131,7 +352,9 @@ def plotone(ax, data_df, fit_df, title):
     return ax.lines
 
 
-def plot(model, df, story):
+def plot(model, df, story, output_path=None):
+    import pandas
+    plt = pyplot()
     t = numpy.arange(len(df))
     fit_data = model.simulate(t)
     fit_df = pandas.DataFrame(fit_data, columns=["fake", "fact"])
@@ -139,28 +362,45 @@ def plot(model, df, story):
     fig, (ax1, ax2) = plt.subplots(1, 2)
     title = r"story {}: $t_0$ = {}".format(story, t0)
     fig.suptitle(title)
-    plotone(ax1, df['fake'], fit_df['fake'], "fake")
-    plotone(ax2, df['fact'], fit_df['fact'], "fact-check")
+    band = [None, None]
+    if hasattr(model, 'bootstrap_'):
+        lo, hi = model.bootstrap_['band']
+        band = [(lo[:, 0], hi[:, 0]), (lo[:, 1], hi[:, 1])]
+    plotone(ax1, df['fake'], fit_df['fake'], "fake", band=band[0])
+    plotone(ax2, df['fact'], fit_df['fact'], "fact-check", band=band[1])
     plt.tight_layout()
     plt.subplots_adjust(top=0.88)
     plt.draw()
-    classname = model.__class__.__name__
-    output_path = OPATH_FIG.format(story=story, model=classname,
-                                   timestamp=NOW.isoformat())
+    if output_path is None:
+        classname = model.__class__.__name__
+        output_path = OPATH_FIG.format(story=story, model=classname,
+                                       timestamp=NOW.isoformat())
     plt.savefig(output_path)
     logger.info("Written: {}".format(output_path))
     return fig
 
 
-def mainone(story, df, modelcls='HoaxModel', fity0="non-obs"):
-    logger.info("-" * TERM_COLS)
+def mainone(story, df, modelcls='HoaxModel', fity0="non-obs",
+            diagnostics="off", solver="lsoda", design=None, bank=None,
+            bank_k=3, profile=None, profile_points=21, nboot=None,
+            boot_method="residual", transform=None, reduced=False,
+            render=True, plots=True):
+    logger.info("-" * termcols())
     logger.info("Story: {}".format(story))
     tic = datetime.datetime.now()
     logger.info("Fit started: {}".format(tic))
-    fitted_model = fit(df, modelcls=modelcls, fity0=fity0)
+    fitted_model = fit(df, modelcls=modelcls, fity0=fity0,
+                       diagnostics=diagnostics, solver=solver, design=design,
+                       bank=bank, bank_k=bank_k, profile=profile,
+                       profile_points=profile_points, nboot=nboot,
+                       boot_method=boot_method, transform=transform,
+                       reduced=reduced)
     try:
-        report(df, fitted_model)
-        plot(fitted_model, df, story)
+        # otherwise, done by the render stage (see `_render`)
+        if render:
+            report(df, fitted_model)
+            if plots:
+                plot(fitted_model, df, story)
         return fitted_model
     except Exception:
         logger.exception("Caught exception while reporting/plotting:")
@@ -168,12 +408,67 @@ def mainone(story, df, modelcls='HoaxModel', fity0="non-obs"):
         # return fitted model no matter what
         toc = datetime.datetime.now()
         logger.info("Fit ended: {}. Elapsed: {}.".format(toc, toc - tic))
-        logger.info("-" * TERM_COLS)
+        logger.info("-" * termcols())
         return fitted_model
 
 
-def main(path, stories=None, modelcls='HoaxModel', fity0="non-obs", seed=None):
-    log_path = OPATH_LOG.format(model=modelcls, timestamp=NOW.isoformat())
+def _fittask(story, df, kwargs):
+    """ Fit a story in a worker process of `scheduler.run`. """
+    global HEADLESS
+    # workers have no display
+    HEADLESS = True
+    return mainone(story, df, **kwargs)
+
+
+def _render(cell, df, model, output_path):
+    """ Report and plot a fit in the render process of `main`. """
+    global HEADLESS
+    HEADLESS = True
+    report(df, model)
+    fig = plot(model, df, cell.story, output_path=output_path)
+    pyplot().close(fig)
+
+
+def _fitserial(tasks, seed=None):
+    """
+    Do the fits one after the other, in this process. With a seed, each
+    story has a seed of its own, as in `scheduler.run`. Yield None for the
+    fits that failed.
+    """
+    for cell, (story, df, kwargs) in tasks:
+        if seed is not None:
+            numpy.random.seed(scheduler.taskseed(seed, story, 0))
+        try:
+            yield cell, mainone(story, df, **kwargs)
+        except Exception:
+            logger.exception("Exception on story {}:".format(cell))
+            yield cell, None
+
+
+def _seedkey(cell):
+    """ All fits of a story use the same seeds (see `scheduler.taskseed`). """
+    return cell.story
+
+
+def main(path, stories=None, modelcls='HoaxModel', fity0="non-obs", seed=None,
+         diagnostics="off", solver="lsoda", design=None, bank_path=None,
+         bank_k=3, profile=None, profile_points=21, nboot=None,
+         boot_method="residual", transform=None, reduced=False,
+         headless=False, jobs=None, timeout=None, retries=1,
+         cache_dir=None, force=False, no_plots=False):
+    global HEADLESS
+    HEADLESS = headless
+    # Grid of models and ways to fit y0. Each story is read once and fit
+    # with all of them.
+    modelcls, fity0, grid = makegrid(modelcls, fity0)
+    problems = checkgrid(grid)
+    if problems:
+        raise ValueError("; ".join(problems))
+    if timeout is not None and jobs is None:
+        raise ValueError("A timeout needs worker processes (jobs)")
+    isgrid = len(grid) > 1
+    name = 'grid' if isgrid else modelcls[0]
+    log_path = OPATH_LOG.format(model=name, timestamp=NOW.isoformat())
     logging.basicConfig(filename=log_path, level=logging.INFO,
                         format='%(asctime)s: %(message)s')
     logging.captureWarnings(True)
@@ -183,35 +478,211 @@ def main(path, stories=None, modelcls='HoaxModel', fity0="non-obs", seed=None):
     console.setFormatter(formatter)
     logging.getLogger().addHandler(console)
     logger.info("Logging to: {}".format(log_path))
+    stats_path = OPATH_STATS.format(model=name, timestamp=NOW.isoformat())
+    results_path = OPATH_RES.format(model=name, timestamp=NOW.isoformat())
     if seed is not None:
         numpy.random.seed(seed)
         logger.info("PRNG Seed: {}".format(seed))
     tic = datetime.datetime.now()
-    plt.close("all")
+    if 'matplotlib.pyplot' in sys.modules:
+        # figures of a previous run in the same session
+        pyplot().close("all")
     logger.info("Data: {}".format(path))
-    tmp = {
-        "seed": seed,
-        "fity0": fity0,
-        # relative path from user folder. FIXME Define data folder for package.
-        "path": os.path.relpath(path, start=os.path.expanduser('~')),
-        "modelcls": modelcls,
-        "created": NOW.isoformat(),
-        "models": {}
-    }
-    for story, df in readdata(path, stories=stories):
+    if isgrid:
+        logger.info("Grid: {} models x {} fit y0 ({})".format(
+            len(modelcls), len(fity0), ", ".join(
+                "{}/{}".format(m, f) for m, f in grid)))
+    # one pickle per model and fity0, as in a run of a single model
+    tmps = {}
+    output_paths = {}
+    for m, f in grid:
+        tmps[m, f] = {
+            "seed": seed,
+            "fity0": f,
+            # relative path from user folder. FIXME Define data folder for
+            # package.
+            "path": os.path.relpath(path, start=os.path.expanduser('~')),
+            "modelcls": m,
+            "solver": solver,
+            "design": design,
+            "transform": transform,
+            "reduced": reduced,
+            "bootstrap": (nboot, boot_method) if nboot else None,
+            "created": NOW.isoformat(),
+            "models": {}
+        }
+        if isgrid:
+            output_paths[m, f] = OPATH_MOD_GRID.format(
+                model=m, fity0=f, timestamp=NOW.isoformat())
+        else:
+            output_paths[m, f] = OPATH_MOD.format(model=m,
+                                                  timestamp=NOW.isoformat())
+    bank = None
+    if bank_path is not None:
+        bank = ParameterBank.load(bank_path)
+        logger.info("Bank: {} ({} entries)".format(bank_path, len(bank)))
+    kwargs = dict(diagnostics=diagnostics, solver=solver, design=design,
+                  bank=bank, bank_k=bank_k, profile=profile,
+                  profile_points=profile_points, nboot=nboot,
+                  boot_method=boot_method, transform=transform,
+                  reduced=reduced)
+    # The run is a pipeline: a reader thread prefetches the data of the next
+    # stories, the fits are done here or on workers, and the reports and
+    # plots are done in a separate process. Without plots, the fits are
+    # reported where they are done. In an interactive session, the fits are
+    # reported and plotted in this process, so that the figures can be
+    # shown at the end.
+    scheduler.preload([__name__] + PRELOAD)
+    show = not no_plots and interactive()
+    renderer = None
+    if not no_plots and not show:
+        renderer = pipeline.Consumer(_render, size=RENDER_QUEUE, name='story')
+    taskkw = dict(kwargs, render=no_plots, plots=False)
+    reader = pipeline.Prefetch(readdata(path, stories=stories),
+                               size=PREFETCH)
+    # Fits already in the cache are not done again, and each new fit is
+    # stored as soon as it is done, so that an interrupted run can be resumed.
+    # The cache is keyed by everything that determines the fit, including the
+    # content of the bank before this run.
+    cache = None
+    if cache_dir is not None:
+        cache = FitCache(cache_dir)
+        if seed is None:
+            logger.warning("Cache: no seed, fits found in the cache are "
+                           "reused instead of new random fits")
+        bank_digest = None
+        if bank_path is not None:
+            bank_digest = filedigest(bank_path)
+    keys = {}
+    fitted = {}
+    frames = {}
+    cached = set()
+    # scores of each fit, for the results table
+    scores = {}
+    # work done by each fit, as soon as it is done (see `writestats`)
+    stats_file = open(stats_path, 'a')
+
+    def scorefit(cell, df, model):
         try:
-            fitted_model = mainone(story, df, modelcls=modelcls, fity0=fity0)
-            tmp["models"][story] = fitted_model
+            scores[cell] = score(df, model)
         except Exception:
-            logger.exception("Exception on story {}:".format(story))
-    output_path = OPATH_MOD.format(model=modelcls, timestamp=NOW.isoformat())
-    with closing(open(output_path, 'wb')) as f:
-        pickle.dump(tmp, f)
-        logger.info("Written: {}".format(output_path))
+            logger.exception("Exception while scoring {}:".format(cell))
+
+    def todo():
+        for story, df in reader:
+            for m, f in grid:
+                cell = Cell(story, m, f)
+                fitted[cell] = None
+                if cache is not None:
+                    options = dict(kwargs, modelcls=m, fity0=f,
+                                   bank=bank_digest)
+                    keys[cell] = fitkey(df, story, m, f, seed, options)
+                    if not force:
+                        fitted[cell] = cache.get(keys[cell])
+                    if fitted[cell] is not None:
+                        logger.info("Story {}: fit found in cache".format(
+                            cell))
+                        cached.add(cell)
+                        writestats(stats_file, cell, fitted[cell],
+                                   cached=True)
+                        scorefit(cell, df, fitted[cell])
+                        continue
+                frames[cell] = df
+                yield cell, (story, df, dict(taskkw, modelcls=m, fity0=f))
+
+    fittic = time.perf_counter()
+    nfits = 0
+    try:
+        if jobs is None:
+            results = _fitserial(todo(), seed)
+        else:
+            # Each fit is done in a worker process, with the seed of its
+            # story, so that the results do not depend on the order of the
+            # fits. Workers see the bank as it is now, without the fits of
+            # this run.
+            logger.info("Workers: {}, timeout: {}, retries: {}".format(
+                jobs, timeout, retries))
+            results = scheduler.run(_fittask, todo(), jobs=jobs,
+                                    timeout=timeout, retries=retries,
+                                    seed=seed, name='story',
+                                    seedkey=_seedkey)
+        for cell, fitted_model in results:
+            df = frames.pop(cell)
+            if fitted_model is None:
+                # all attempts failed (see scheduler.run)
+                continue
+            nfits += 1
+            fitted[cell] = fitted_model
+            try:
+                writestats(stats_file, cell, fitted_model)
+                if cache is not None:
+                    cache.put(keys[cell], fitted_model, story=cell.story,
+                              modelcls=cell.modelcls, fity0=cell.fity0,
+                              seed=seed)
+                if bank is not None:
+                    bank.add(cell.modelcls, cell.fity0, cell.story,
+                             fitted_model, source=output_paths[cell[1:]])
+            except Exception:
+                logger.exception("Exception on story {}:".format(cell))
+            scorefit(cell, df, fitted_model)
+            if no_plots:
+                continue
+            if isgrid:
+                fig_path = OPATH_FIG_GRID.format(
+                    story=cell.story, model=cell.modelcls,
+                    fity0=cell.fity0, timestamp=NOW.isoformat())
+            else:
+                fig_path = OPATH_FIG.format(story=cell.story,
+                                            model=cell.modelcls,
+                                            timestamp=NOW.isoformat())
+            if renderer is not None:
+                renderer.put(cell, df, fitted_model, fig_path)
+                continue
+            try:
+                report(df, fitted_model)
+                plot(fitted_model, df, cell.story, output_path=fig_path)
+            except Exception:
+                logger.exception("Caught exception while reporting/plotting "
+                                 "{}:".format(cell))
+    finally:
+        stats_file.close()
+        if renderer is not None:
+            renderer.close()
+    # time of the fit stage, without waiting for the other stages
+    fitbusy = time.perf_counter() - fittic - reader.waited
+    if renderer is not None:
+        fitbusy -= renderer.waited
+    # in the order of the data
+    for cell, fitted_model in fitted.items():
+        if fitted_model is not None:
+            tmps[cell[1:]]["models"][cell.story] = fitted_model
+    if cache is not None:
+        logger.info("Cache: {} ({} of {} fits reused, hit rate {:.0%})".format(
+            cache_dir, cache.hits, len(fitted), cache.hitrate()))
+    statstable(collections.OrderedDict(
+        (str(cell) if isgrid else cell.story, model)
+        for cell, model in fitted.items() if model is not None),
+        [str(cell) if isgrid else cell.story for cell in cached])
+    logger.info("Written: {}".format(stats_path))
+    if scores:
+        resultstable(scores, cached, results_path)
+    for key, tmp in tmps.items():
+        with closing(open(output_paths[key], 'wb')) as f:
+            pickle.dump(tmp, f)
+            logger.info("Written: {}".format(output_paths[key]))
+    if bank is not None:
+        bank.save(bank_path)
+        logger.info("Written: {}".format(bank_path))
     toc = datetime.datetime.now()
-    logger.info("All fits ended. Elapsed (Total): {}.".format(toc - tic))
-    if matplotlib.is_interactive():
-        plt.show()
+    stages = ["read: " + pipeline.throughput(reader.count, reader.busy),
+              "fit: " + pipeline.throughput(nfits, fitbusy)]
+    if renderer is not None:
+        stages.append("render: " + pipeline.throughput(renderer.count,
+                                                      renderer.busy))
+    logger.info("All fits ended. Elapsed (Total): {}. Stages: {}.".format(
+        toc - tic, "; ".join(stages)))
+    if show:
+        pyplot().show()
 
 
 epilog = """
@@ -227,13 +698,88 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--story', type=int, metavar='ID',
                         help='Fit only stories with these %(metavar)s(s)',
                         nargs='+', dest='stories')
-    parser.add_argument('-m', '--model', metavar='NAME', default='HoaxModel',
-                        help='Fit model %(metavar)s [default: %(default)s]',
-                        dest='modelcls', choices=AVAIL_MODELS)
+    parser.add_argument('-m', '--model', '--models', metavar='NAME',
+                        default='HoaxModel', nargs='+', dest='modelcls',
+                        choices=AVAIL_MODELS,
+                        help='Fit model(s) %(metavar)s [default: '
+                        '%(default)s]')
     parser.add_argument('-f', '--fit-y0', default="non-obs", dest='fity0',
-                        choices=["all", "none", "non-obs"],
+                        choices=["all", "none", "non-obs"], nargs='+',
                         help="How to fit the vector of initial conditions "
-                        "(default: %(default)s)")
+                        "(default: %(default)s). With several models or ways "
+                        "to fit y0, each story is fit with all of them, and "
+                        "the fits are ranked by AIC")
     parser.add_argument('-S', '--seed', type=int, help='PRNG seed')
+    parser.add_argument('-D', '--diagnostics', default='off',
+                        choices=models.diagnostics.LEVELS,
+                        help="Monitor mass conservation and non-negativity "
+                        "of the solutions (default: %(default)s)")
+    parser.add_argument('--solver', default='lsoda',
+                        choices=sorted(models.solvers.SOLVERS),
+                        help="O.D.E. solver backend (default: %(default)s)")
+    parser.add_argument('--transform', action='store_const', const='auto',
+                        help="Fit the logit of bounded variables and the log "
+                        "of variables with only a lower bound")
+    parser.add_argument('--headless', action='store_true',
+                        help="Do not probe the terminal, and plot without a "
+                        "display")
+    parser.add_argument('--no-plots', action='store_true',
+                        help="Do not plot the fits")
+    parser.add_argument('--reduced', action='store_true',
+                        help="Integrate the state without one compartment "
+                        "per conservation law of the model")
+    parser.add_argument('--design', choices=sorted(models.designs.DESIGNS),
+                        help="Design of the initial guesses of the fit "
+                        "(default: uniform within bounds)")
+    parser.add_argument('--bank', dest='bank_path', metavar='PATH',
+                        help="Warm-start fits from the parameter bank at "
+                        "%(metavar)s, and store the new fits in it (see "
+                        "bank.py)")
+    parser.add_argument('--bank-k', type=int, default=3, metavar='K',
+                        help="Number of bank candidates per fit (default: "
+                        "%(default)s)")
+    parser.add_argument('--profile', nargs='*', metavar='NAME',
+                        help="Compute profile likelihood confidence intervals "
+                        "of %(metavar)s(s) (default: all fitted variables)")
+    parser.add_argument('--profile-points', type=int, default=21, metavar='N',
+                        help="Points of each profile (default: %(default)s)")
+    parser.add_argument('--bootstrap', type=int, dest='nboot', metavar='B',
+                        help="Bootstrap confidence intervals and bands with "
+                        "%(metavar)s replicates")
+    parser.add_argument('--bootstrap-method', default='residual',
+                        dest='boot_method', choices=['residual', 'parametric'],
+                        help="How to generate the replicates (default: "
+                        "%(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help="Fit the stories on %(metavar)s worker processes "
+                        "(-1: one per CPU). Each story has a seed derived "
+                        "from --seed. Default: fit in this process")
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help="Wall-clock limit of each fit on a worker, "
+                        "with --jobs (default: none)")
+    parser.add_argument('--retries', type=int, default=1, metavar='K',
+                        help="New attempts, with a new seed, of a fit that "
+                        "timed out or whose worker died (default: "
+                        "%(default)s). Fits that raise an error are not "
+                        "retried")
+    parser.add_argument('--cache', dest='cache_dir', metavar='DIR',
+                        help="Store each fit in the cache at %(metavar)s as "
+                        "soon as it is done, and reuse the fits found in it "
+                        "(default: no cache). Fits are looked up by data, "
+                        "model, options, seed and content of the bank")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--resume', dest='force', action='store_false',
+                       default=False,
+                       help="With --cache, reuse the fits found in the cache, "
+                       "e.g. of an interrupted run with the same options "
+                       "(default)")
+    group.add_argument('--force', action='store_true',
+                       help="With --cache, fit all stories again, and replace "
+                       "their fits in the cache")
     args = parser.parse_args()
+    problems = checkgrid(makegrid(args.modelcls, args.fity0)[2])
+    if problems:
+        parser.error("; ".join(problems))
+    if args.timeout is not None and args.jobs is None:
+        parser.error("--timeout needs --jobs")
     main(**vars(args))
@@ -0,0 +1,93 @@
+""" On-disk cache of the fits of fit.py, addressed by the content of a fit. """
+
+import os
+import pickle
+import hashlib
+import logging
+import tempfile
+from contextlib import closing
+
+logger = logging.getLogger()
+
+
+def fitkey(df, story, modelcls, fity0, seed, options):
+    """
+    Key of a fit: a hash of the data of the story, the model class, how y0
+    is fit, the seed, and the options of the solver and of the optimizer
+    (a dict).
+    """
+    import pandas
+    h = hashlib.sha256()
+    h.update(pandas.util.hash_pandas_object(df, index=True).values.tobytes())
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr((story, modelcls, fity0, seed)).encode())
+    h.update(repr(sorted(options.items())).encode())
+    return h.hexdigest()
+
+
+def filedigest(path):
+    """
+    A hash of the content of the file at path (e.g. of the parameter bank of
+    a fit, to be passed in the options of `fitkey`), or None if there is no
+    such file.
+    """
+    h = hashlib.sha256()
+    try:
+        with closing(open(path, 'rb')) as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+class FitCache(object):
+    """
+    Fitted models stored one per file, under the key of the fit (see
+    `fitkey`), as soon as the fit is done. Writes are atomic, so that an
+    interrupted run leaves only complete entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.path, key[:2], key + '.pickle')
+
+    def get(self, key):
+        """ The model stored under key, or None. Counts hits and misses. """
+        try:
+            with closing(open(self._path(key), 'rb')) as f:
+                model = pickle.load(f)['model']
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            logger.exception("Unreadable cache entry {}:".format(key))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return model
+
+    def put(self, key, model, **info):
+        """ Store model under key, with optional information. """
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        obj = dict(info, key=key, model=model)
+        fd, tmppath = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(obj, f)
+            os.replace(tmppath, path)
+        except BaseException:
+            os.remove(tmppath)
+            raise
+        return path
+
+    def hitrate(self):
+        """ Fraction of the lookups that found a model. """
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.0
@@ -14,6 +14,13 @@ Contents
 
 5. SEIZ (Susceptible-Exposed-Infected-Skeptic) by Jin et al. (2013). See
 `seiz`.
+
+6. Discrete-time (mean-field map) versions of the Hoax models, and the
+"unifying" model by Moreno et al. (2016). See `discrete`, `probhoaxmodel` and
+`unified`.
+
+7. Compiler of declarative compartment models, and the specifications of the
+models above. See `compiler` and `specs`.
 """
 
 # TODO implement modules for the following:
@@ -25,9 +32,64 @@ Contents
 #  5. The "Higgs rumor" model by De Domenico et al. (2013).
 #  6. The "unified" spreading model by Ferraz de Arruda et al. (2016)
 
-from models.base import *
-from models.hoaxmodel import *
-from models.seghoaxmodel import *
-from models.sir import *
-from models.seiz import *
-from models.probhoaxmodel import *
+import importlib
+
+# Public names of the modules of the package. They are imported on first
+# access (see `__getattr__`), so that `import models`, or loading a fitted
+# model, does not import all models and the code to fit them.
+_EXPORTS = {
+    'base': ['Variable', 'ODEModel'],
+    'hoaxmodel': ['HoaxModel'],
+    'seghoaxmodel': ['SegHoaxModel'],
+    'sir': ['SIR', 'DoubleSIR'],
+    'seiz': ['SEIZ'],
+    'probhoaxmodel': ['probmodel', 'simprobmodel', 'ProbHoaxModel',
+                      'ProbSegHoaxModel'],
+    'discrete': ['DiscreteModel', 'iterate'],
+    'unified': ['UnifiedModel'],
+    'solvers': ['SOLVERS', 'PRESETS', 'SolverWarning', 'solve'],
+    'compiler': ['compile_model', 'conserved_groups'],
+    'cache': ['SimulationCache', 'CacheInfo'],
+    'instrument': ['FitStats'],
+    'designs': ['DESIGNS', 'sample', 'tobox'],
+    'transforms': ['TRANSFORMS', 'Reparametrization'],
+}
+
+# Registry of the models that can be fit, name -> module. UnifiedModel has
+# no observables and no way to set y0 from the data, so it cannot be fit; it
+# is still exported (see `_EXPORTS`).
+MODELS = {
+    'HoaxModel': 'hoaxmodel',
+    'SegHoaxModel': 'seghoaxmodel',
+    'SIR': 'sir',
+    'DoubleSIR': 'sir',
+    'SEIZ': 'seiz',
+    'ProbHoaxModel': 'probhoaxmodel',
+    'ProbSegHoaxModel': 'probhoaxmodel',
+}
+
+_MODULES = {name: module for module, names in _EXPORTS.items()
+            for name in names}
+
+__all__ = ['MODELS'] + list(_MODULES)
+
+
+def __getattr__(name):
+    # PEP 562: called only for names that are not (yet) in the namespace.
+    if name in _MODULES:
+        module = importlib.import_module('models.' + _MODULES[name])
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    # submodules, e.g. models.diagnostics
+    try:
+        return importlib.import_module('models.' + name)
+    except ModuleNotFoundError as e:
+        if e.name != 'models.' + name:
+            raise
+    raise AttributeError("module 'models' has no attribute "
+                         "'{}'".format(name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
@@ -1,17 +1,115 @@
-import copy
-import weakref
+import os
+import time
 import logging
+import warnings
+import concurrent.futures
 import numpy
-import scipy.stats
-import scipy.integrate
 
-from utils import pstderr, mape, smape, logaccratio
+from models.cache import SimulationCache
+from models.conservation import Reduction
+from models.designs import sample, tobox
+from models.diagnostics import Diagnostics, LEVELS
+from models.instrument import FitStats
+from models.solvers import solve, SolverWarning
+from models.transforms import Reparametrization, auto
+from utils import pstderr, mape, smape, logaccratio, autocorr_time
 
 __all__ = ['Variable', 'ODEModel']
 
 logger = logging.getLogger()
 
-_least_squares = scipy.optimize.least_squares
+# Relative step of the forward differences of `ODEModel._xjac`
+EPS_FD = numpy.sqrt(numpy.finfo(float).eps)
+
+
+# scipy.optimize, scipy.stats and scipy.linalg are imported on first use, so
+# that loading and simulating a model does not need them.
+def _least_squares(*args, **kwargs):
+    import scipy.optimize
+    return scipy.optimize.least_squares(*args, **kwargs)
+
+
+def _differential_evolution(*args, **kwargs):
+    import scipy.optimize
+    return scipy.optimize.differential_evolution(*args, **kwargs)
+
+
+# Model being fit by a worker process of `ODEModel.fit` (see `_initworker`).
+_worker_model = None
+
+
+def _initworker(model):
+    """
+    Initializer of the worker processes of `ODEModel.fit`. The model, with
+    the data and the times of the fit, is sent once per worker.
+    """
+    global _worker_model
+    _worker_model = model
+
+
+def _lrinterval(values, stat, threshold):
+    """
+    Confidence interval from a likelihood profile: the range of values
+    around the minimum of the likelihood-ratio statistic where it stays below
+    threshold, with interpolation of the crossings. Failed points (NaN) count
+    as outside. If there is no crossing on a side, the endpoint is infinite.
+    """
+    inside = stat <= threshold
+    k = numpy.nanargmin(stat)
+    endpoints = []
+    for step in (-1, 1):
+        j = k
+        while 0 <= j + step < len(values) and inside[j + step]:
+            j += step
+        if not 0 <= j + step < len(values):
+            endpoints.append(step * numpy.inf)
+        elif numpy.isnan(stat[j + step]):
+            endpoints.append(values[j + step])
+        else:
+            # interpolate the crossing between j and j + step on the square
+            # root of the statistic, which is linear near the minimum
+            s0 = numpy.sqrt(max(stat[j], 0.0))
+            s1 = numpy.sqrt(stat[j + step])
+            frac = (numpy.sqrt(threshold) - s0) / (s1 - s0)
+            endpoints.append(values[j] + frac * (values[j + step] - values[j]))
+    return tuple(endpoints)
+
+
+def _costworker(X):
+    """
+    Compute the costs of a batch of values of the unknowns in a worker
+    process (see `ODEModel.sample_posterior`).
+    """
+    return _worker_model._batchcost(X)
+
+
+def _profileworker(i, values, x0, jac, kwargs):
+    """
+    Compute a segment of a likelihood profile in a worker process (see
+    `ODEModel.profile`).
+    """
+    return _worker_model._profilesegment(i, values, x0, jac, kwargs)
+
+
+def _bootworker(seeds, method, yhat, resid, sigma, x0, jac, kwargs):
+    """
+    Refit a chunk of bootstrap replicates in a worker process (see
+    `ODEModel.bootstrap`).
+    """
+    return _worker_model._bootsegment(seeds, method, yhat, resid, sigma, x0,
+                                      jac, kwargs)
+
+
+def _fitworker(x0, jac, x_scale, bounds, kwargs):
+    """
+    Run one restart of the fit in a worker process. Return the result and
+    the invariant checks performed (or None).
+    """
+    m = _worker_model
+    if m.diagnostics != 'off':
+        m.diagnostics_ = Diagnostics()
+    res = m._restart(x0, jac, x_scale, bounds, **kwargs)
+    return res, getattr(m, 'diagnostics_', None)
 
 
 class Variable(object):
@@ -45,28 +143,31 @@ class Variable(object):
             assert lower <= upper, "Illegal bounds: lower > upper"
         self.lower = lower
         self.upper = upper
-        # This dictionary holds the values of all the attributes managed by any
-        # given instance of the descriptor. Since instances of this descriptor
-        # are actually class variables in the owner class (typically a subclass
-        # of `ODEModel`), the dictionary maps an owner class instance to its
-        # attribute value. Because this introduces an extra reference to the
-        # owner class instance, the mapping uses a "weak" key so that when no
-        # other reference to the instance is available, the whole entry can be
-        # automatically discarded. This is to avoid holding up memory for
-        # objects of the the owner class that are no longer in use.
-        self.values = weakref.WeakKeyDictionary()
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def _index(self, instance):
+        # Variables listed in `_theta` or `_y0` of an `ODEModel` are stored in
+        # the array of variables of the owner instance (see `ODEModel._x`);
+        # any other variable is stored in the instance dictionary.
+        return getattr(type(instance), '_index', {}).get(self.name)
 
     def __get__(self, instance, owner=None):
         if instance is None:
             # Return the descriptor instance if accessed as a class attribute.
             return self
-        try:
-            # Return the value managed by this descriptor instance if accessed
-            # as an instance attribute.
-            return self.values[instance]
-        except KeyError:
-            # To signal the value has not been set yet.
-            raise AttributeError("Value not set: {}".format(instance))
+        i = self._index(instance)
+        if i is None:
+            try:
+                return instance.__dict__[self.name]
+            except KeyError:
+                pass
+        elif instance._known[i]:
+            return instance._x[i]
+        # To signal the value has not been set yet.
+        raise AttributeError("Value not set: {}".format(instance))
 
     def __set__(self, instance, value):
         # Make sure the value is within bounds before updating it.
@@ -76,10 +177,24 @@ class Variable(object):
         if self.upper is not None:
             if value > self.upper:
                 raise ValueError("Illegal value > upper: {}".format(value))
-        self.values[instance] = value
+        i = self._index(instance)
+        if i is None:
+            instance.__dict__[self.name] = value
+        else:
+            instance._x[i] = value
+            instance._known[i] = True
+            instance._cache.clear()
 
     def __delete__(self, instance):
-        del self.values[instance]
+        i = self._index(instance)
+        if i is None:
+            del instance.__dict__[self.name]
+        elif instance._known[i]:
+            instance._x[i] = numpy.nan
+            instance._known[i] = False
+            instance._cache.clear()
+        else:
+            raise AttributeError(self.name)
 
 
 class ODEModel(object):
@@ -87,8 +202,11 @@ class ODEModel(object):
     Base class for all O.D.E. models.
 
     To write a subclass you will need to:
-        1. Override the `dy(y, t)` method. This returns the vector of
-           derivatives of the system of ODEs.
+        1. Override the `rhs(y, t, theta)` static method. This returns the
+           vector of derivatives of the system of ODEs. It must work both on
+           a single state vector and on a batch of states (see `rhs`).
+           Alternatively, override the `dy(y, t)` method (in this case
+           `simulate_many` will not be available).
 
         2. Define a list of names of parameters (_theta). These are the
            parameters of the ODEs.
@@ -103,6 +221,16 @@ class ODEModel(object):
 
         5. (Optional) Implement the `inity0(self, **kwargs)` method to
            initialize the initial conditions to the data.
+
+        6. (Optional) Implement the `rhs_jac(y, t, theta)` static method (or
+           the `jac(y, t)` method). This returns the Jacobian of the system
+           of ODEs. If available, it is passed to the integrator, which
+           otherwise has to estimate it with finite differences.
+
+        7. (Optional) Implement the `rhs_dtheta(y, t, theta)` static method.
+           This returns the partial derivatives of the system of ODEs with
+           respect to the parameters. Together with `rhs_jac`, it is needed
+           to fit with `jac="sensitivity"`.
     """
     # list of attribute names in the vector of parameters
     _theta = []
@@ -110,16 +238,80 @@ class ODEModel(object):
     # list of attribute names in the vector of state variables
     _y0 = []
 
+    # Maximum number of steps of scipy.integrate.odeint (0 = solver default)
+    _mxstep = 0
+
+    # Default solver backend and tolerance preset (see `models.solvers`).
+    # Both can be set per instance, or passed to `simulate`.
+    solver = 'lsoda'
+    solver_tol = 'default'
+
+    # Maximum number of trajectories memoized by `simulate` (0 = disabled)
+    cache_size = 16
+
+    # Invariant monitoring level, one of "off", "sampled", "full". When not
+    # "off", violations of mass conservation and non-negativity are counted
+    # in the `diagnostics_` attribute. See `models.diagnostics`.
+    diagnostics = 'off'
+
+    # Groups of compartments (indices in `_y0`) whose total is conserved.
+    # If `reduced` is set, the last compartment of each group is left out of
+    # the integration and computed from the total (see
+    # `models.conservation`).
+    _conserved = []
+    reduced = False
+
+    # Reparametrization of the unknowns during least squares (see
+    # `models.transforms`): None (optimize the variables as they are),
+    # "auto" (logit for bounded variables, log for variables with only a
+    # lower bound), or a dict of transform names by variable name, the
+    # others being "auto".
+    transform = None
+
+    # Computed for each subclass from `_theta` and `_y0` (see
+    # `__init_subclass__`): position of each variable in the array of
+    # variables, number of parameters, and arrays of lower / upper bounds.
+    _index = {}
+    _ntheta = 0
+    _lower = numpy.empty(0)
+    _upper = numpy.empty(0)
+
+    def __init_subclass__(cls, **kwargs):
+        super(ODEModel, cls).__init_subclass__(**kwargs)
+        var_names = cls._theta + cls._y0
+        cls._index = {name: i for i, name in enumerate(var_names)}
+        cls._ntheta = len(cls._theta)
+        variables = [getattr(cls, name) for name in var_names]
+        cls._lower = numpy.array([-numpy.inf if v.lower is None else v.lower
+                                  for v in variables], dtype=float)
+        cls._upper = numpy.array([+numpy.inf if v.upper is None else v.upper
+                                  for v in variables], dtype=float)
+
     def __init__(self, **kwargs):
         super(ODEModel, self).__init__()
-        self._do_agg = hasattr(self, "obs")
+        self._do_agg = type(self).obs is not ODEModel.obs
+        self._initvars()
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    def _initvars(self):
+        # The values of all variables (parameters, then initial conditions)
+        # are stored in a contiguous array; unknown variables are NaN and
+        # flagged in the mask of known variables.
+        n = len(self._index)
+        self._x = numpy.full(n, numpy.nan)
+        self._known = numpy.zeros(n, dtype=bool)
+        # Memoized simulations (see `simulate`); cleared whenever a variable
+        # is set.
+        self._cache = SimulationCache(self.cache_size)
+
     def __getstate__(self):
         # save separately the state of all attributes managed by Variable
         # instances
         state = self.__dict__.copy()
+        del state['_x']
+        del state['_known']
+        del state['_cache']
         theta_state = {}
         for name in self._theta:
             try:
@@ -139,6 +331,7 @@ class ODEModel(object):
         # instances
         state, theta_state, y_state = state
         self.__dict__.update(state)
+        self._initvars()
         for k, v in theta_state.items():
             setattr(self, k, v)
         for k, v in y_state.items():
@@ -146,8 +339,8 @@ class ODEModel(object):
 
     def gettheta(self):
         """ Get the vector of parameters """
-        x = [getattr(self, name, numpy.nan) for name in self._theta]
-        return numpy.asfarray(x)
+        P = self._ntheta
+        return numpy.where(self._known[:P], self._x[:P], numpy.nan)
 
     def settheta(self, theta):
         """ Set the vector of parameters """
@@ -158,8 +351,8 @@ class ODEModel(object):
 
     def gety0(self):
         """ Get the vector of state variables """
-        x = [getattr(self, name, numpy.nan) for name in self._y0]
-        return numpy.asfarray(x)
+        P = self._ntheta
+        return numpy.where(self._known[P:], self._x[P:], numpy.nan)
 
     def sety0(self, y0):
         """ Set the vector of parameters """
@@ -170,11 +363,88 @@ class ODEModel(object):
 
     def dy(self, y, t):
         """
-        Subclassess *must* to implement this to provide the instantaneous
-        derivative of the model for integration.
+        Instantaneous derivative of the model for integration. By default,
+        this evaluates `rhs` with the parameters of the instance.
+        """
+        return self.rhs(y, t, self._x[:self._ntheta])
+
+    @staticmethod
+    def rhs(y, t, theta):
+        """
+        Subclasses *must* implement this (or `dy`) to provide the
+        instantaneous derivative of the model.
+
+        Parameters
+        ==========
+        y : ndarray
+            State. Either an (N,) vector or an (N, R) array of R states.
+
+        t : float
+            Time.
+
+        theta : ndarray
+            Parameters. Either an (P,) vector or an (P, R) array of R
+            parameter vectors.
+
+        Returns
+        =======
+        A list of N derivatives. Each is either a scalar or an (R,) array.
+
+        Notes
+        =====
+        The function must only use element-wise operations on the rows of `y`
+        and `theta` (and reductions along the first axis), so that the same
+        code works for a single system and for a batch of systems.
+        """
+        raise NotImplementedError()
+
+    def jac(self, y, t):
+        """
+        Jacobian of the model, i.e. the (N, N) matrix of partial derivatives
+        of `dy` with respect to the state. By default, this evaluates
+        `rhs_jac` with the parameters of the instance.
+        """
+        return self.rhs_jac(y, t, self._x[:self._ntheta])
+
+    @staticmethod
+    def rhs_jac(y, t, theta):
+        """
+        Subclasses can implement this to provide the Jacobian of `rhs`.
+
+        Parameters
+        ==========
+        See `rhs`.
+
+        Returns
+        =======
+        An (N, N) array, or an (N, N, R) array for a batch of R states, where
+        element [i, j] is the partial derivative of the i-th derivative with
+        respect to the j-th state variable.
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def rhs_dtheta(y, t, theta):
+        """
+        Subclasses can implement this to provide the derivative of `rhs` with
+        respect to the parameters.
+
+        Parameters
+        ==========
+        See `rhs`.
+
+        Returns
+        =======
+        An (N, P) array, or an (N, P, R) array for a batch of R states, where
+        element [i, j] is the partial derivative of the i-th derivative with
+        respect to the j-th parameter.
         """
         raise NotImplementedError()
 
+    def _hasjac(self):
+        C = type(self)
+        return C.jac is not ODEModel.jac or C.rhs_jac is not ODEModel.rhs_jac
+
     @staticmethod
     def obs(y):
         """
@@ -214,6 +484,19 @@ class ODEModel(object):
         else:
             raise ValueError("No such option: {}".format(how))
 
+    @classmethod
+    def inity0_options(cls):
+        """
+        The options of `inity0` supported by the model: "all", and "none"
+        and "non-obs" if the model implements them.
+        """
+        options = ["all"]
+        if cls._inity0_none is not ODEModel._inity0_none:
+            options.append("none")
+        if cls._inity0_nonobs is not ODEModel._inity0_nonobs:
+            options.append("non-obs")
+        return options
+
     def _inity0_none(self, **kwargs):
         """
         Subclasses can implement this to initialize (part of) the initial
@@ -235,12 +518,47 @@ class ODEModel(object):
         raise NotImplementedError()
 
     def __call__(self, y, t):
-        dy = self.dy(y, t)
-        z = numpy.sum(dy)
-        if not numpy.isclose(z, 0):
-            import warnings
-            warnings.warn("sum(dy) does not cancel out: {}".format(z))
-        return dy
+        return self.dy(y, t)
+
+    def _monitor(self):
+        """
+        The counters of the invariant monitor (see `diagnostics`), created on
+        first use.
+        """
+        try:
+            return self.diagnostics_
+        except AttributeError:
+            self.diagnostics_ = Diagnostics()
+            return self.diagnostics_
+
+    def _stats(self):
+        """
+        The counters of the work done by the model (see `stats_`), created on
+        first use.
+        """
+        try:
+            return self.stats_
+        except AttributeError:
+            self.stats_ = FitStats()
+            return self.stats_
+
+    def _monitored(self, func, nblock=None):
+        """
+        Wrap the derivative `func(y, t)` with the invariant monitor, unless
+        monitoring is off, in which case `func` is returned unchanged. See
+        `models.diagnostics.Diagnostics.wrap` for nblock.
+        """
+        if self.diagnostics == 'off':
+            return func
+        return self._monitor().wrap(func, self.diagnostics, nblock=nblock)
+
+    def _check(self, y):
+        """
+        Check the full trajectory `y` (or a batch thereof) for invariant
+        violations, unless monitoring is off.
+        """
+        if self.diagnostics != 'off':
+            self._monitor().check_trajectory(y)
 
     def predict(self, times, full=False, **kwargs):
         """
@@ -248,10 +566,48 @@ class ODEModel(object):
         """
         return self.simulate(times, full=full, **kwargs)
 
-    def simulate(self, times, full=False, **kwargs):
+    def _integrate(self, func, y0, times, solver=None, tol=None, **kwargs):
+        """
+        Integrate y' = func(y, t) with the solver backend of the model. See
+        `models.solvers.solve` for the parameters.
+
+        Additional keyword arguments are passed to the solver backend. The
+        `mxstep` attribute of the model is only used by lsoda. The
+        integration is counted in `stats_`.
+        """
+        solver = self.solver if solver is None else solver
+        tol = self.solver_tol if tol is None else tol
+        if solver == 'lsoda':
+            kwargs['mxstep'] = max(self._mxstep, kwargs.get('mxstep', 0))
+        return solve(func, y0, times, solver=solver, tol=tol,
+                     stats=self._stats(), **kwargs)
+
+    def _solve(self, func, y0, times, jac=None, nblock=None, **kwargs):
+        """
+        Integrate with `_integrate`, on the reduced state if `reduced` is set
+        and the model has conservation laws. Returns the full trajectory.
+        """
+        if not (self.reduced and self._conserved):
+            return self._integrate(func, y0, times, jac=jac, nblock=nblock,
+                                   **kwargs)
+        red = Reduction(self._conserved, y0, len(self._y0))
+        z = self._integrate(red.func(func), red.reduce(y0), times,
+                            jac=None if jac is None else red.jac(jac),
+                            nblock=None if nblock is None else red.size,
+                            **kwargs)
+        return red.expand(z)
+
+    def cache_info(self):
+        """
+        Statistics of the simulation cache: hits, misses, maximum and current
+        size (see `simulate`).
+        """
+        return self._cache.info()
+
+    def simulate(self, times, full=False, cache=True, **kwargs):
         """
         Use numerical integration to simulate the model. For more information,
-        `scipy.integrate.odeint`.
+        see `models.solvers`.
 
         Parameters
         ==========
@@ -262,14 +618,114 @@ class ODEModel(object):
             Return the full system, not just the observables variables.
             (optional.)
 
+        cache : bool
+            Look up / store the trajectory in the simulation cache of the
+            model. The cache is keyed on parameters, initial conditions, times
+            and solver options, and is cleared whenever a variable is set. See
+            also `cache_info`. (optional.)
+
         Notes
         =====
         If neither `y0` nor `times` is passed, the method will use the values
         of the instance. If passed, the instance values take the passed values.
 
-        Additional keyword arguments are passed to `scipy.integrate.odeint`.
+        Pass `solver` and `tol` to override the solver backend and tolerance
+        preset of the model (see the `solver` and `solver_tol` attributes).
+        Additional keyword arguments are passed to the solver backend (for
+        lsoda, this is `scipy.integrate.odeint`). If the model has a Jacobian,
+        it is passed to the solver; pass `Dfun=None` to let the solver
+        estimate it instead.
+
+        If the `reduced` attribute is set, the state without one compartment
+        per conservation law (see `_conserved`) is integrated instead, and
+        the full trajectory is rebuilt from it.
+        """
+        if cache:
+            key = (self._x.tobytes(), self._known.tobytes(),
+                   numpy.asarray(times, dtype=float).tobytes(), self.solver,
+                   self.solver_tol, self.reduced,
+                   repr(sorted(kwargs.items())))
+            y = self._cache.get(key)
+        if not cache or y is None:
+            _kwargs = dict(kwargs)
+            jac = _kwargs.pop('Dfun', self.jac if self._hasjac() else None)
+            y = self._solve(self._monitored(self.dy), self.y0, times,
+                            jac=jac, **_kwargs)
+            self._check(y)
+            if cache:
+                self._cache.put(key, y)
+        # do not hand out the cached array
+        y = y.copy()
+        if full:
+            return y
+        elif self._do_agg:
+            return self.obs(y)
+        else:
+            return y
+
+    def simulate_many(self, thetas, y0s, times, full=False, **kwargs):
+        """
+        Simulate a batch of systems at once. All systems are stacked into a
+        single system of ODEs, whose derivative is computed by one vectorized
+        call to `rhs`, and integrated with one call to the solver backend.
+
+        Parameters
+        ==========
+        thetas : ndarray
+            An (R, P) array of parameter vectors. A single (P,) vector is
+            broadcast to all systems.
+
+        y0s : ndarray
+            An (R, N) array of initial conditions. A single (N,) vector is
+            broadcast to all systems.
+
+        times : times
+            The systems are evaluated at these times.
+
+        full : bool
+            Return the full systems, not just the observables variables.
+            (optional.)
+
+        Returns
+        =======
+        y : ndarray
+            An (R, T, K) array, where T is the number of time points and K is
+            the number of observables (or N, if full is True).
+
+        Notes
+        =====
+        LSODA controls the error with a max-norm, so each system is
+        integrated at least as accurately as it would be on its own (the
+        solve_ivp backends use an RMS norm instead). The Jacobian of the
+        stacked system is block diagonal; it is declared as banded (or
+        sparse) to the solver, so that its cost grows linearly with R. If the
+        model implements `rhs_jac`, the blocks are computed analytically.
+
+        Keyword arguments are handled as in `simulate`.
         """
-        y = scipy.integrate.odeint(self, self.y0, times, **kwargs)
+        thetas = numpy.atleast_2d(numpy.asarray(thetas, dtype=float))
+        y0s = numpy.atleast_2d(numpy.asarray(y0s, dtype=float))
+        R = max(len(thetas), len(y0s))
+        N = len(self._y0)
+        # parameters are passed to rhs as (P, R) rows
+        params = numpy.array(
+            numpy.broadcast_to(thetas, (R, thetas.shape[1])).T)
+        y0s = numpy.broadcast_to(y0s, (R, N))
+
+        def func(y, t):
+            dy = self.rhs(y.reshape(R, N).T, t, params)
+            return numpy.stack(numpy.broadcast_arrays(*dy), axis=1).ravel()
+
+        def jac(y, t):
+            return self.rhs_jac(y.reshape(R, N).T, t, params)
+
+        if type(self).rhs_jac is ODEModel.rhs_jac:
+            jac = None
+        jac = kwargs.pop('Dfun', jac)
+        y = self._solve(self._monitored(func, nblock=N), y0s.ravel(), times,
+                        jac=jac, nblock=N, **kwargs)
+        y = y.reshape(len(y), R, N).swapaxes(0, 1)
+        self._check(y)
         if full:
             return y
         elif self._do_agg:
@@ -277,29 +733,101 @@ class ODEModel(object):
         else:
             return y
 
+    def _simulate_sens(self, times, idx, **kwargs):
+        """
+        Simulate the model together with its forward sensitivities, i.e. the
+        derivatives of the trajectory with respect to some of the variables
+        of the model.
+
+        Parameters
+        ==========
+        times : times
+            The system is evaluated at these times.
+
+        idx : sequence of int
+            Indices of the variables in `_theta + _y0` to differentiate
+            against.
+
+        Returns
+        =======
+        y : ndarray
+            A (T, K) array with the observables (see `simulate`).
+
+        dy : ndarray
+            A (T, K, M) array with the derivatives of the observables with
+            respect to the M variables in `idx`.
+
+        Notes
+        =====
+        The sensitivities S = dy/dx solve the linear system S' = J S + F,
+        where J is the Jacobian (see `rhs_jac`) and F the derivative with
+        respect to the parameters (see `rhs_dtheta`), with S(0) = 0 for
+        parameters and S(0) = 1 for initial conditions. This is integrated
+        together with the model. The Jacobian passed to the integrator
+        neglects the dependence of the sensitivities on the state, which
+        only affects the convergence of the corrector, not the accuracy.
+
+        Additional keyword arguments are passed to the solver backend.
+        """
+        P = len(self._theta)
+        N = len(self._y0)
+        M = len(idx)
+        theta = self._x[:P]
+        # Columns of the parameters / initial conditions in the sensitivities
+        pidx = [(j, i) for j, i in enumerate(idx) if i < P]
+        pcol, prow = map(list, zip(*pidx)) if pidx else ([], [])
+        S0 = numpy.zeros((N, M))
+        for j, i in enumerate(idx):
+            if i >= P:
+                S0[i - P, j] = 1.0
+        eye = numpy.eye(M)
+
+        def func(z, t):
+            y = z[:N]
+            S = z[N:].reshape(N, M)
+            dy = numpy.asarray(self.rhs(y, t, theta))
+            dS = numpy.dot(self.rhs_jac(y, t, theta), S)
+            dS[:, pcol] += self.rhs_dtheta(y, t, theta)[:, prow]
+            return numpy.concatenate([dy, dS.ravel()])
+
+        import scipy.linalg
+
+        def dfun(z, t):
+            J = self.rhs_jac(z[:N], t, theta)
+            return scipy.linalg.block_diag(J, numpy.kron(J, eye))
+
+        z0 = numpy.concatenate([self.y0, S0.ravel()])
+        z = self._integrate(func, z0, times, jac=dfun, **kwargs)
+        y = z[:, :N]
+        self._check(y)
+        # (T, N, M) -> (T, M, N), so that obs can be applied to each column
+        dy = z[:, N:].reshape(len(z), N, M).swapaxes(1, 2)
+        if self._do_agg:
+            y = self.obs(y)
+            dy = self.obs(dy)
+        return y, dy.swapaxes(1, 2)
+
     def _getbounds(self):
-        C = self.__class__
-        var_names = self._theta + self._y0
-        tmp = []
-        for name in var_names:
-            try:
-                getattr(self, name)
-            except AttributeError:
-                v = getattr(C, name)
-                lower = v.lower if v.lower is not None else -numpy.inf
-                upper = v.upper if v.upper is not None else +numpy.inf
-                tmp.append((lower, upper))
-        return tmp
+        unknown = ~self._known
+        return list(zip(self._lower[unknown], self._upper[unknown]))
 
-    def _genparams(self, nrep):
+    def _genparams(self, nrep, design=None, scale=1.0):
         """
-        Generate parameters at random.
+        Generate parameters at random. If design is None, draw them uniformly
+        within bounds, and set unbounded ones to lower + 1.0. Otherwise, use
+        the given design and scale for unbounded unknowns (see
+        `models.designs.sample`).
         """
+        if design is not None:
+            unknown = ~self._known
+            return sample(design, nrep, self._lower[unknown],
+                          self._upper[unknown], scale=scale)
         bounds = self._getbounds()
         lower_bounds, upper_bounds = zip(*bounds)
         size = (nrep, len(bounds))
         loc = lower_bounds
         scale = numpy.asarray(upper_bounds) - numpy.asarray(lower_bounds)
+        import scipy.stats
         x0seq = scipy.stats.uniform.rvs(loc, scale, size)
         idx = numpy.isinf(x0seq)
         x0seq[idx] = numpy.broadcast_to(lower_bounds, x0seq.shape)[idx] + 1.0
@@ -315,21 +843,38 @@ class ODEModel(object):
         This follows the same convention of scikit-learn and means that the
         attribute has been estimated. (Default: fitted = False.)
         """
-        x = list(x)
-        var_names = self._theta + self._y0
-        for name in var_names:
-            try:
-                getattr(self, name)
-            except AttributeError:
-                # This variable is an unknown
-                value = x.pop(0)
-                setattr(self, name, value)
-                if fitted:
-                    # estimated attribute
-                    setattr(self, name + '_', value)
+        x = numpy.asarray(x, dtype=float)
+        idx = self._unknowns()
         # Make sure all unknowns have been assigned.
-        if len(x) > 0:
+        if len(x) != len(idx):
             raise ValueError("Some unknowns not assigned: {}".format(x))
+        lower = self._lower[idx]
+        upper = self._upper[idx]
+        if (x < lower).any():
+            raise ValueError("Illegal value < lower: {}".format(x[x < lower]))
+        if (x > upper).any():
+            raise ValueError("Illegal value > upper: {}".format(x[x > upper]))
+        self._x[idx] = x
+        self._known[idx] = True
+        self._cache.clear()
+        if fitted:
+            # estimated attributes
+            var_names = self._theta + self._y0
+            for i, value in zip(idx, x):
+                setattr(self, var_names[i] + '_', value)
+
+    def _setunknowns(self, x):
+        """
+        Temporarily assign values to the unknowns of the fit, which are
+        stored in the `_fitidx` attribute. Use `_resetunknowns` to flag them
+        as unknown again. Bounds are not checked.
+        """
+        self._x[self._fitidx] = x
+        self._known[self._fitidx] = True
+
+    def _resetunknowns(self):
+        self._x[self._fitidx] = numpy.nan
+        self._known[self._fitidx] = False
 
     def _residuals(self, x):
         """
@@ -340,15 +885,256 @@ class ODEModel(object):
         attributes set:
             * times
             * data
+            * _fitidx (indices of the unknowns)
 
-        A new object is created to compute the residuals.
+        The unknowns are assigned in place and reset afterwards.
         """
-        obj = copy.copy(self)
-        obj._assign(x)
-        yarr = obj.simulate(self.times)
+        self._setunknowns(x)
+        try:
+            yarr = self.simulate(self.times, cache=False)
+        finally:
+            self._resetunknowns()
         return (yarr - self.data).ravel()
 
-    def fit(self, data, times=None, x0=None, nrep=10, **kwargs):
+    def _unknowns(self):
+        """
+        Indices of the unknown variables in `_theta + _y0`.
+        """
+        return numpy.flatnonzero(~self._known)
+
+    def _residuals_jac(self, x):
+        """
+        Jacobian of `_residuals` computed with forward sensitivities (see
+        `_simulate_sens`). This requires a single integration of the model.
+        """
+        self._setunknowns(x)
+        try:
+            _, dy = self._simulate_sens(self.times, self._fitidx)
+        finally:
+            self._resetunknowns()
+        return dy.reshape(-1, len(x))
+
+    def _batchcost(self, X):
+        """
+        Least squares cost of each row of X, an (R, M) array of values for the
+        unknowns of the fit, with a single integration of the whole batch
+        (see `simulate_many`). If the integration of the batch fails, each row
+        is integrated on its own. Non-finite costs are set to infinity.
+        """
+        X = numpy.atleast_2d(X)
+        x = numpy.tile(self._x, (len(X), 1))
+        x[:, self._fitidx] = X
+        P = self._ntheta
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            y = self.simulate_many(x[:, :P], x[:, P:], self.times)
+            cost = 0.5 * ((y - self.data) ** 2).sum(axis=(1, 2))
+        if any(issubclass(w.category, SolverWarning) for w in caught):
+            cost = numpy.array([0.5 * (self._residuals(_x) ** 2).sum()
+                                for _x in X])
+        return numpy.where(numpy.isfinite(cost), cost, numpy.inf)
+
+    def _de(self, scale, options=None):
+        """
+        Global search of the unknowns of the fit with differential evolution.
+        The search space is the unit hypercube, mapped to the bounds as in
+        `models.designs.tobox`; the whole population of each generation is
+        evaluated with `_batchcost`. Return the best point and the result of
+        the search.
+        """
+        unknown = ~self._known
+        lower = self._lower[unknown]
+        upper = self._upper[unknown]
+
+        def func(u):
+            # u is (M, S): one column per member of the population
+            return self._batchcost(tobox(u.T, lower, upper, scale=scale))
+
+        opts = dict(maxiter=100, polish=False,
+                    seed=numpy.random.randint(2 ** 31))
+        opts.update(options or {})
+        res = _differential_evolution(func, [(0, 1)] * len(lower),
+                                      vectorized=True, updating='deferred',
+                                      **opts)
+        return tobox(res.x, lower, upper, scale=scale)[0], res
+
+    def _scalehints(self, data, scale=None):
+        """
+        Order of magnitude of the unknowns, used by start designs for
+        unbounded unknowns. Compartments are scaled by the peak of the total
+        of the observed data, and parameters by 1. The `scale` dict, mapping
+        variable names to values, takes precedence.
+        """
+        peak = max(float(numpy.nanmax(numpy.sum(data, axis=1))), 1.0)
+        hints = numpy.r_[numpy.ones(len(self._theta)),
+                         numpy.full(len(self._y0), peak)]
+        for name, value in (scale or {}).items():
+            hints[self._index[name]] = value
+        return hints[~self._known]
+
+    def _restart(self, x0, jac, x_scale, bounds, **kwargs):
+        """
+        Run least squares from the initial guess x0 (see `fit`). If the
+        `transform` attribute is set, see `_restart_transformed`. The work
+        done is recorded in the `stats` attribute of the result (see
+        `FitStats.restart`).
+        """
+        if jac == 'sensitivity':
+            jac = self._residuals_jac
+        stats = self._stats()
+        start = stats.start()
+        if self.transform is not None:
+            res = self._restart_transformed(x0, jac, x_scale, bounds,
+                                            **kwargs)
+        else:
+            res = _least_squares(self._residuals, x0, jac=jac,
+                                 x_scale=x_scale, bounds=bounds, **kwargs)
+        res.stats = stats.restart(start, res)
+        return res
+
+    def _reparametrization(self, bounds):
+        """
+        Reparametrization of the unknowns of the fit with the given bounds,
+        according to the `transform` attribute.
+        """
+        lower, upper = map(numpy.asarray, bounds)
+        kinds = auto(lower, upper)
+        if isinstance(self.transform, dict):
+            names = self._theta + self._y0
+            for j, i in enumerate(self._fitidx):
+                kinds[j] = self.transform.get(names[i], kinds[j])
+        elif self.transform != 'auto':
+            raise ValueError("No such transform: {}".format(self.transform))
+        return Reparametrization(lower, upper, kinds)
+
+    def _restart_transformed(self, x0, jac, x_scale, bounds, **kwargs):
+        """
+        Run least squares on the unconstrained values of the unknowns (see
+        `_reparametrization`). Transformed unknowns have unit scale. The
+        solution is mapped back, and the Jacobian of the result is replaced
+        by the one of the residuals with respect to the unknowns at the
+        solution (see `_xjac`), so that `pstderr` computes the errors of the
+        unknowns themselves. Mapping back the errors of the unconstrained
+        values instead (the delta method) would understate them for
+        unknowns close to a bound, where dx/dz vanishes.
+        """
+        rep = self._reparametrization(bounds)
+        if not isinstance(x_scale, str):
+            x_scale = numpy.where(rep.identity, x_scale, 1.0)
+        elif not rep.identity.any():
+            x_scale = 1.0
+
+        def fun(z):
+            return self._residuals(rep.inverse(z))
+
+        if callable(jac):
+            _jac = jac
+
+            def jac(z):
+                return _jac(rep.inverse(z)) * rep.deriv(z)
+
+        res = _least_squares(fun, rep.forward(x0), jac=jac, x_scale=x_scale,
+                             bounds=rep.bounds, **kwargs)
+        # keep the solution within bounds, even after round-off
+        res.x = numpy.clip(rep.inverse(res.x), *bounds)
+        res.jac = self._xjac(res.x, _jac if callable(jac) else None, bounds)
+        return res
+
+    def _xjac(self, x, jac, bounds):
+        """
+        Jacobian of `_residuals` at x, with the callable jac if not None, or
+        else with forward differences. Steps go towards the inside of the
+        bounds, so that unknowns at a bound are not moved past it.
+        """
+        if jac is not None:
+            return numpy.atleast_2d(jac(x))
+        lower, upper = map(numpy.asarray, bounds)
+        f0 = self._residuals(x)
+        J = numpy.empty((len(f0), len(x)))
+        for j in range(len(x)):
+            h = EPS_FD * max(abs(x[j]), 1.0)
+            if x[j] + h > upper[j]:
+                h = -h
+            xh = x.copy()
+            xh[j] += h
+            J[:, j] = (self._residuals(xh) - f0) / h
+        return J
+
+    def _map(self, pool, x0seq, jac, x_scale, bounds, kwargs):
+        """
+        Run least squares from each initial guess in x0seq, in this process
+        if pool is None, or else on the pool (see `fit`). Return the list of
+        results, in order, with None for failed runs.
+        """
+        results = []
+        if pool is None:
+            for _x0 in x0seq:
+                try:
+                    res = self._restart(_x0, jac, x_scale, bounds, **kwargs)
+                except Exception:
+                    logger.exception("Caught exception in fit. Traceback "
+                                     "follows:")
+                    res = None
+                results.append(res)
+        else:
+            futures = [pool.submit(_fitworker, _x0, jac, x_scale, bounds,
+                                   kwargs) for _x0 in x0seq]
+            for future in futures:
+                try:
+                    res, diagnostics = future.result()
+                    if diagnostics is not None:
+                        self.diagnostics_.update(diagnostics)
+                except Exception:
+                    logger.exception("Caught exception in fit. Traceback "
+                                     "follows:")
+                    res = None
+                results.append(res)
+        return results
+
+    def _race(self, pool, x0seq, race, eta, jac, x_scale, bounds, kwargs):
+        """
+        Successive halving of the repetitions of the fit. In each round, the
+        surviving runs continue from where they stopped, for at most the
+        number of residual evaluations of the round; then the best 1/eta of
+        them survive. After the last round, or as soon as a single run
+        survives, the best run is polished without limits.
+
+        Return the last result of each run, all results, and the cost trace
+        (the cost of each run after each round it took part in).
+        """
+        xs = list(x0seq)
+        trace = [[] for _x0 in xs]
+        last = {}
+        alltmp = []
+        alive = list(range(len(xs)))
+        rounds = list(race)
+        while alive:
+            opts = dict(kwargs)
+            polish = not rounds or len(alive) == 1
+            if polish:
+                alive = alive[:1]
+            else:
+                opts['max_nfev'] = rounds.pop(0)
+            results = self._map(pool, [xs[i] for i in alive], jac, x_scale,
+                                bounds, opts)
+            for i, res in zip(alive, results):
+                if res is None:
+                    trace[i].append(numpy.nan)
+                else:
+                    trace[i].append(res.cost)
+                    xs[i] = res.x
+                    last[i] = res
+                    alltmp.append(res)
+            if polish:
+                break
+            alive = sorted((i for i, res in zip(alive, results)
+                            if res is not None), key=lambda i: last[i].cost)
+            alive = alive[:int(numpy.ceil(len(alive) / eta))]
+        return list(last.values()), alltmp, trace
+
+    def fit(self, data, times=None, x0=None, nrep=10, jac='2-point',
+            n_jobs=None, executor=None, race=None, eta=3, design=None,
+            scale=None, de_options=None, candidates=None, **kwargs):
         """
         Fit this model to empirical data with least squares.
 
@@ -366,12 +1152,64 @@ class ODEModel(object):
 
         x0 : ndarray
             An optional (N, 1) array of initial guesses for unknowns of the
-            fit. If not passed, this is drawn uniformly at random.
+            fit. If not passed, this is drawn uniformly at random, or from
+            `design`.
 
         nrep : int
             Repeat the fitting multiple times and return the solution with
             minimum cost.
 
+        jac : str or callable
+            How to compute the Jacobian of the residuals. If "sensitivity",
+            it is computed exactly by integrating the forward sensitivity
+            equations of the model (see `rhs_jac` and `rhs_dtheta`).
+            Otherwise, it is passed as is to the least squares routine.
+            Default: "2-point" (finite differences).
+
+        n_jobs : int
+            Number of worker processes for the repetitions. If None or 1, run
+            them in this process, one after the other. If -1, use all CPUs.
+
+        executor : callable
+            Factory of the pool of workers, called with the `max_workers`,
+            `initializer` and `initargs` keyword arguments. The workers must
+            be separate processes. Only used if n_jobs > 1. Default:
+            `concurrent.futures.ProcessPoolExecutor`.
+
+        race : sequence of int
+            Optional. Schedule of a race among the repetitions (successive
+            halving): the maximum number of residual evaluations of each
+            round, e.g. (10, 30, 90). All repetitions run the first round;
+            after each round only the best 1/eta continue into the next. The
+            winner is then run to convergence. If None, every repetition is
+            run to convergence.
+
+        eta : float
+            Reduction factor of the race (default: 3).
+
+        design : str
+            Optional. Design of the initial guesses of the repetitions: one of
+            "uniform", "sobol", "lhs" (see `models.designs`). Unbounded
+            unknowns are then sampled on a log scale around a scale hint,
+            which for compartments is the peak of the data. If None, guesses
+            are uniform within bounds and unbounded unknowns start at their
+            lower bound + 1.0.
+
+        scale : dict
+            Optional. Scale hints of unbounded unknowns, by variable name;
+            they override the ones inferred from the data.
+
+        candidates : ndarray
+            Optional. A (K, M) array of additional initial guesses for the M
+            unknowns (e.g. from earlier fits), tried before the nrep others.
+            They are clipped to bounds.
+
+        de_options : dict
+            Optional. Keyword arguments of
+            `scipy.optimize.differential_evolution` when method is "de" (see
+            notes). Default: at most 100 generations, no polish (the fit
+            polishes with least squares).
+
         Returns
         =======
         self : a fitted instance of ODEModel
@@ -382,6 +1220,32 @@ class ODEModel(object):
         By default, the trf method is used, with bounds and x_scale
         automatically inferred from the model variables. See
         `scipy.optimize.least_squares` for more information.
+
+        If the `diagnostics` attribute is not "off", the counters of invariant
+        violations are reset before the fit and logged after it.
+
+        The initial guesses are drawn before the repetitions start and the
+        results are collected in order, so parallel and serial fits return
+        the same solution for the same seed.
+
+        The cost of each repetition (after each round of the race, if any) is
+        stored in the `trace_` attribute, with NaN for failed runs.
+
+        The work done by the fit is counted in the `stats_` attribute, reset
+        at the start: integrations, evaluations of the derivative by the
+        solver and failed integrations, and, for each run of least squares
+        (each repetition and round), the same counters, its wall time, its
+        residual and Jacobian evaluations, and its final cost and status. See
+        `models.instrument.FitStats`. The counters as the fit returns are
+        copied to the `fitstats_` attribute, which is not updated by later
+        simulations.
+
+        If method is "de", the initial guess is found with a global search by
+        differential evolution (`_de`), within the bounds (or, for unbounded
+        unknowns, within the range of the start designs), and then polished
+        with least squares; nrep, x0, race, design and candidates are
+        ignored. The population of each generation is integrated at once, as
+        a batch. The result of the search is stored in the `de_` attribute.
         """
         bounds = self._getbounds()
         lower_bounds, upper_bounds = zip(*bounds)
@@ -390,39 +1254,683 @@ class ODEModel(object):
         if times is None:
             times = numpy.arange(len(data))
         self.times = times
-        if x0 is None:
-            # Draw x0 at random from bounds. If any unknown is unconstrained,
-            # set the initial guess to lower + 1.0 (a safe value).
-            x0seq = self._genparams(nrep)
+        self._fitidx = self._unknowns()
+        if self.diagnostics not in LEVELS:
+            raise ValueError("No such option: {}".format(self.diagnostics))
+        if self.diagnostics != 'off':
+            self.diagnostics_ = Diagnostics()
+        tic = time.perf_counter()
+        self.stats_ = FitStats()
+        de = kwargs.get('method') == 'de'
+        if de:
+            del kwargs['method']
+            _x0, self.de_ = self._de(self._scalehints(data, scale),
+                                     de_options)
+            x0seq = [_x0]
+            race = None
+        elif x0 is None:
+            # Draw x0 at random from bounds, or from the design. Without a
+            # design, if any unknown is unconstrained, set the initial guess to
+            # lower + 1.0 (a safe value).
+            x0seq = self._genparams(nrep, design=design,
+                                    scale=self._scalehints(data, scale))
         else:
             # Use provided x0 for all repetitions
-            x0seq = (x0 for i in range(nrep))
+            x0seq = [x0 for i in range(nrep)]
+        if candidates is not None and not de:
+            candidates = numpy.clip(numpy.reshape(candidates,
+                                                  (-1, len(bounds))),
+                                    lower_bounds, upper_bounds)
+            x0seq = list(candidates) + list(x0seq)
         x_scale = numpy.diff(bounds, axis=1).ravel()
         # We cannot mix finite and infinite x_scale values, so if any unknown
         # is unconstrained, we let the routine estimate x_scale using the
         # Jacobian.
         if numpy.isinf(x_scale).any():
             x_scale = 'jac'
-        tmp = []
-        for _x0 in x0seq:
-            try:
-                res = _least_squares(self._residuals, _x0, x_scale=x_scale,
-                                     bounds=(lower_bounds, upper_bounds),
-                                     **kwargs)
-                tmp.append(res)
-            except Exception:
-                logger.exception("Caught exception in fit. Traceback follows:")
+        bounds = (lower_bounds, upper_bounds)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        pool = None
+        if n_jobs is not None and n_jobs > 1:
+            if executor is None:
+                executor = concurrent.futures.ProcessPoolExecutor
+            pool = executor(max_workers=n_jobs, initializer=_initworker,
+                            initargs=(self,))
+        try:
+            if race is None:
+                results = self._map(pool, x0seq, jac, x_scale, bounds, kwargs)
+                tmp = [res for res in results if res is not None]
+                alltmp = tmp
+                self.trace_ = [[numpy.nan if res is None else res.cost]
+                               for res in results]
+            else:
+                tmp, alltmp, self.trace_ = self._race(pool, x0seq, race, eta,
+                                                      jac, x_scale, bounds,
+                                                      kwargs)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stats_.restarts = [res.stats for res in alltmp]
+        if pool is not None:
+            # counted by the workers
+            for res in alltmp:
+                self.stats_.add(res.stats)
+        self.stats_.fit_time = time.perf_counter() - tic
         if tmp:
             best_res = min(tmp, key=lambda k: k.cost)
             self.err_ = pstderr(best_res)
             self._assign(best_res.x, fitted=True)
             self.cost_ = best_res.cost
+            # Total number of residual and Jacobian evaluations (all repeats
+            # and rounds)
+            self.nfev_ = sum(res.nfev for res in alltmp)
+            self.njev_ = sum(res.njev or 0 for res in alltmp)
         else:
             logger.error("All fits failed!")
+        if self.diagnostics != 'off':
+            logger.info("Diagnostics: {}".format(self.diagnostics_))
+        self.fitstats_ = self.stats_.snapshot()
         del self.data
         del self.times
+        del self._fitidx
+        return self
+
+    def _lnpost(self, X, pool=None, n_jobs=1):
+        """
+        Log-posterior of each row of X, an (R, M) array of values for the
+        unknowns. Priors are flat within bounds. Errors are Gaussian with
+        unknown variance, which is integrated out with a Jeffreys prior, so
+        that the log-likelihood is -n / 2 * log(SSR). Rows within bounds are
+        integrated as a batch (see `_batchcost`), split among the workers of
+        pool, if any.
+        """
+        X = numpy.atleast_2d(X)
+        lower = self._lower[self._fitidx]
+        upper = self._upper[self._fitidx]
+        inside = ((X >= lower) & (X <= upper)).all(axis=1)
+        lp = numpy.full(len(X), -numpy.inf)
+        if inside.any():
+            if pool is None:
+                cost = self._batchcost(X[inside])
+            else:
+                chunks = numpy.array_split(X[inside], n_jobs)
+                cost = numpy.concatenate(list(pool.map(_costworker, chunks)))
+            with numpy.errstate(divide='ignore'):
+                lp[inside] = -0.5 * self.data.size * numpy.log(2 * cost)
+        return lp
+
+    def sample_posterior(self, data, nwalkers=32, nsteps=1000, times=None,
+                         x0=None, a=2.0, burn=0, path=None, n_jobs=None,
+                         executor=None):
+        """
+        Sample the posterior distribution of the unknowns with the
+        affine-invariant ensemble sampler of Goodman & Weare (2010), using
+        stretch moves. The walkers are split in two halves; each half moves
+        in turn, and the log-posterior of all its proposals is computed with
+        a single integration of the batch (see `_lnpost`).
+
+        Parameters
+        ==========
+        data : ndarray
+            The empirical data, as in `fit`.
+
+        nwalkers : int
+            Number of walkers. Must be even, and at least twice the number of
+            unknowns.
+
+        nsteps : int
+            Number of steps.
+
+        times : ndarray
+            Optional. Times of the data, as in `fit`.
+
+        x0 : ndarray
+            Optional. An (M,) vector of values for the unknowns (e.g. from a
+            fit); the walkers start in a small ball around it. If not passed,
+            the walkers start from a Latin hypercube design (see
+            `models.designs`), and a long burn-in is needed.
+
+        a : float
+            Scale of the stretch moves (default: 2).
+
+        burn : int
+            Number of initial steps discarded when estimating the
+            autocorrelation time.
+
+        path : str
+            Optional. Stream the chain to this .npy file, one step at a time.
+            The file holds an (nsteps, nwalkers, M + 1) array; the last column
+            is the log-posterior.
+
+        n_jobs : int
+            Number of worker processes among which the proposals of each half
+            are split. If None or 1, run in this process.
+
+        executor : callable
+            Factory of the pool of workers, as in `fit`.
+
+        Returns
+        =======
+        self : ODEModel
+            With the attributes: `chain_`, an (nsteps, nwalkers, M) array;
+            `lnprob_`, the (nsteps, nwalkers) log-posterior; `sampled_`, the
+            names of the unknowns; `acceptance_`, the acceptance fraction of
+            each walker; `tau_`, the autocorrelation time of each unknown (in
+            steps); `ess_`, the effective sample size; and `ess_per_sec_`.
+
+        Notes
+        =====
+        The values of the unknowns are not changed.
+
+        References
+        ==========
+        Goodman & Weare, 2010. Ensemble samplers with affine invariance.
+        Comm. App. Math. and Comp. Sci. 5(1), pp. 65--80.
+        """
+        self.data = data
+        if times is None:
+            times = numpy.arange(len(data))
+        self.times = times
+        self._fitidx = self._unknowns()
+        M = len(self._fitidx)
+        if nwalkers % 2 or nwalkers < 2 * M:
+            raise ValueError("nwalkers must be even and at least {}: "
+                             "{}".format(2 * M, nwalkers))
+        lower = self._lower[self._fitidx]
+        upper = self._upper[self._fitidx]
+        if x0 is None:
+            X = self._genparams(nwalkers, design='lhs',
+                                scale=self._scalehints(data))
+        else:
+            x0 = numpy.asarray(x0, dtype=float)
+            X = x0 + 1e-4 * numpy.maximum(numpy.abs(x0), 1.0) * \
+                numpy.random.randn(nwalkers, M)
+            X = numpy.clip(X, lower, upper)
+        shape = (nsteps, nwalkers, M + 1)
+        if path is None:
+            chain = numpy.empty(shape)
+        else:
+            chain = numpy.lib.format.open_memmap(path, mode='w+', shape=shape)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        pool = None
+        if n_jobs is not None and n_jobs > 1:
+            if executor is None:
+                executor = concurrent.futures.ProcessPoolExecutor
+            pool = executor(max_workers=n_jobs, initializer=_initworker,
+                            initargs=(self,))
+        names = self._theta + self._y0
+        self.sampled_ = [names[i] for i in self._fitidx]
+        half = nwalkers // 2
+        halves = [numpy.arange(half), numpy.arange(half, nwalkers)]
+        accepted = numpy.zeros(nwalkers)
+        tic = time.perf_counter()
+        try:
+            lp = self._lnpost(X, pool, n_jobs)
+            for step in range(nsteps):
+                for k in range(2):
+                    S, C = halves[k], halves[1 - k]
+                    u = numpy.random.uniform(size=half)
+                    z = ((a - 1.0) * u + 1.0) ** 2 / a
+                    partners = C[numpy.random.randint(half, size=half)]
+                    Y = X[partners] + z[:, None] * (X[S] - X[partners])
+                    lpY = self._lnpost(Y, pool, n_jobs)
+                    with numpy.errstate(invalid='ignore'):
+                        lnratio = (M - 1) * numpy.log(z) + lpY - lp[S]
+                    # NaN (both -inf) is never accepted
+                    acc = numpy.log(numpy.random.uniform(size=half)) < lnratio
+                    X[S[acc]] = Y[acc]
+                    lp[S[acc]] = lpY[acc]
+                    accepted[S[acc]] += 1
+                chain[step, :, :M] = X
+                chain[step, :, M] = lp
+                if path is not None:
+                    chain.flush()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            del self.data
+            del self.times
+            del self._fitidx
+        elapsed = time.perf_counter() - tic
+        self.chain_ = chain[:, :, :M]
+        self.lnprob_ = chain[:, :, M]
+        self.acceptance_ = accepted / nsteps
+        self.tau_ = autocorr_time(self.chain_[burn:])
+        self.ess_ = (nsteps - burn) * nwalkers / numpy.nanmax(self.tau_)
+        self.ess_per_sec_ = self.ess_ / elapsed
+        logger.info(
+            "Posterior sampling: {} walkers x {} steps in {:.2f} s; mean "
+            "acceptance: {:.2f}; max. autocorrelation time: {:.1f} steps; "
+            "effective samples: {:.0f} ({:.1f}/s)".format(
+                nwalkers, nsteps, elapsed, self.acceptance_.mean(),
+                numpy.nanmax(self.tau_), self.ess_, self.ess_per_sec_))
         return self
 
+    def _fitted(self):
+        """
+        Indices of the variables estimated by the last fit (those with a
+        trailing underscore attribute, e.g. alpha_), in the order of `err_`.
+        """
+        names = self._theta + self._y0
+        return numpy.array([i for i, name in enumerate(names)
+                            if hasattr(self, name + '_')], dtype=int)
+
+    def _profilesegment(self, i, values, x0, jac, kwargs):
+        """
+        Fix variable i at each of the values, in turn, and re-optimize the
+        other fitted variables with least squares, starting from x0 and then
+        from the solution at the previous value. Return the (K,) costs and the
+        (K, M) values of all fitted variables (NaN where the fit failed).
+        """
+        fitted = self._fitted()
+        rest = fitted[fitted != i]
+        saved = self._x.copy(), self._known.copy()
+        lower = self._lower[rest]
+        upper = self._upper[rest]
+        x_scale = upper - lower
+        if numpy.isinf(x_scale).any():
+            x_scale = 'jac'
+        cost = numpy.full(len(values), numpy.nan)
+        xs = numpy.full((len(values), len(fitted)), numpy.nan)
+        self._fitidx = rest
+        self._known[rest] = False
+        try:
+            for k, value in enumerate(values):
+                self._x[i] = value
+                try:
+                    res = self._restart(numpy.clip(x0, lower, upper), jac,
+                                        x_scale, (lower, upper), **kwargs)
+                except Exception:
+                    logger.exception("Caught exception in profile of {} at "
+                                     "{}:".format((self._theta +
+                                                   self._y0)[i], value))
+                    continue
+                x0 = res.x
+                cost[k] = res.cost
+                xs[k, fitted != i] = res.x
+                xs[k, fitted == i] = value
+        finally:
+            self._x, self._known = saved
+            del self._fitidx
+        return cost, xs
+
+    def _profilegrid(self, i, npoints):
+        """
+        Default grid of a profile: npoints values within +/- 50% of the
+        estimate (+/- 1 if it is zero), within bounds.
+        """
+        value = self._x[i]
+        delta = abs(value) / 2 if value else 1.0
+        lo = max(value - delta, self._lower[i])
+        hi = min(value + delta, self._upper[i])
+        return numpy.linspace(lo, hi, npoints)
+
+    def profile(self, data, name=None, grid=None, times=None, npoints=21,
+                level=0.95, jac='2-point', nseg=1, n_jobs=None,
+                executor=None, **kwargs):
+        """
+        Profile likelihood of fitted variables. Each variable is fixed along
+        a grid of values, and the other fitted variables are re-optimized;
+        the likelihood-ratio test then gives a confidence interval. This
+        shows which variables the data identify, unlike `err_`.
+
+        Parameters
+        ==========
+        data : ndarray
+            The data of the fit.
+
+        name : str or sequence of str
+            Variable(s) to profile. Default: all fitted variables.
+
+        grid : ndarray or dict
+            Optional. Grid of values of the variable (or a dict of grids, by
+            name). Default: see `npoints`.
+
+        times : ndarray
+            Optional. Times of the data, as in `fit`.
+
+        npoints : int
+            Number of points of default grids, which span +/- 50% of the
+            estimate, within bounds. (Note that `err_` is not a good guide for
+            the width: it is not scaled by the variance of the residuals.)
+
+        level : float
+            Confidence level of the intervals (default: 0.95).
+
+        jac : str
+            Jacobian of the residuals, as in `fit`.
+
+        nseg : int
+            Number of contiguous segments of the grid on each side of the
+            estimate (see notes). Default: 1.
+
+        n_jobs : int
+            Number of worker processes among which the segments are split.
+            The results do not depend on it.
+
+        executor : callable
+            Factory of the pool of workers, as in `fit`.
+
+        Returns
+        =======
+        ci : dict
+            Confidence interval (lower, upper) of each profiled variable. An
+            infinite endpoint means that the interval extends past the grid.
+
+        Notes
+        =====
+        The model must have been fitted. The points of a segment are swept
+        away from the estimate, each starting from the solution of the
+        previous one (the first from the estimate). Segments are swept
+        independently: with more of them, more can be swept in parallel, but
+        more points start from the estimate instead of from the solution at
+        a neighbouring point. With Gaussian errors of
+        unknown variance, the likelihood ratio statistic is n * log(SSR /
+        SSR_min), compared with the chi-squared quantile with one degree of
+        freedom; SSR_min is the lowest cost of the fit and of the profile.
+        Profiles are stored in the `profiles_` attribute (grid, costs and
+        values of all fitted variables) and intervals in `ci_`.
+
+        Additional keyword arguments are passed to the least squares routine.
+        """
+        if not hasattr(self, 'cost_'):
+            raise ValueError("Model not fitted")
+        names = self._theta + self._y0
+        fitted = self._fitted()
+        if name is None:
+            name = [names[i] for i in fitted]
+        elif isinstance(name, str):
+            name = [name]
+            if grid is not None and not isinstance(grid, dict):
+                grid = {name[0]: grid}
+        grid = grid or {}
+        self.data = data
+        if times is None:
+            times = numpy.arange(len(data))
+        self.times = times
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        pool = None
+        if n_jobs is not None and n_jobs > 1:
+            if executor is None:
+                executor = concurrent.futures.ProcessPoolExecutor
+            pool = executor(max_workers=n_jobs, initializer=_initworker,
+                            initargs=(self,))
+        x_hat = self._x[fitted]
+        import scipy.stats
+        threshold = scipy.stats.chi2.ppf(level, 1)
+        if not hasattr(self, 'profiles_'):
+            self.profiles_ = {}
+            self.ci_ = {}
+        try:
+            for _name in name:
+                i = self._index[_name]
+                if i not in fitted:
+                    raise ValueError("Not a fitted variable: {}".format(_name))
+                if _name in grid:
+                    values = numpy.asarray(grid[_name], dtype=float)
+                else:
+                    values = self._profilegrid(i, npoints)
+                value = self._x[i]
+                # sweep away from the estimate on each side
+                left = numpy.sort(values[values < value])[::-1]
+                right = numpy.sort(values[values > value])
+                segments = [seg for side in (left, right)
+                            for seg in numpy.array_split(side, nseg)
+                            if len(seg)]
+                # each segment starts from the estimate of the other variables
+                x0 = x_hat[fitted != i]
+                if pool is None:
+                    results = [self._profilesegment(i, seg, x0, jac, kwargs)
+                               for seg in segments]
+                else:
+                    futures = [pool.submit(_profileworker, i, seg, x0, jac,
+                                           kwargs) for seg in segments]
+                    results = [future.result() for future in futures]
+                values = numpy.concatenate(segments + [[value]])
+                cost = numpy.concatenate([c for c, _ in results] +
+                                         [[self.cost_]])
+                xs = numpy.concatenate([x for _, x in results] + [[x_hat]])
+                order = numpy.argsort(values)
+                values, cost, xs = values[order], cost[order], xs[order]
+                best = numpy.nanmin(cost)
+                if best < self.cost_:
+                    logger.warning("Profile of {} found a lower cost than the "
+                                   "fit: {:.6g}".format(_name, best))
+                with numpy.errstate(divide='ignore', invalid='ignore'):
+                    stat = data.size * numpy.log(cost / best)
+                self.profiles_[_name] = {'grid': values, 'cost': cost,
+                                         'x': xs, 'stat': stat}
+                lo, hi = _lrinterval(values, stat, threshold)
+                # an interval extending to a bound of the variable is closed
+                if lo == -numpy.inf and values[0] == self._lower[i]:
+                    lo = values[0]
+                if hi == numpy.inf and values[-1] == self._upper[i]:
+                    hi = values[-1]
+                self.ci_[_name] = (lo, hi)
+                logger.info("Profile of {}: {:.0%} C.I. [{:.4g}, {:.4g}]"
+                            "".format(_name, level, *self.ci_[_name]))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            del self.data
+            del self.times
+        return {_name: self.ci_[_name] for _name in name}
+
+    def _bootdata(self, seed, method, yhat, resid, sigma):
+        """
+        Data of a bootstrap replicate: the fitted curve plus residuals
+        resampled by time point ("residual"), or plus Gaussian noise
+        ("parametric", as in `test_fitting.gendata`), clipped at zero.
+        """
+        prng = numpy.random.RandomState(seed)
+        if method == 'residual':
+            idx = prng.randint(len(resid), size=len(resid))
+            y = yhat + resid[idx]
+        elif method == 'parametric':
+            y = yhat + prng.normal(scale=sigma, size=yhat.shape)
+        else:
+            raise ValueError("No such method: {}".format(method))
+        return y.clip(min=0)
+
+    def _bootsegment(self, seeds, method, yhat, resid, sigma, x0, jac,
+                     kwargs):
+        """
+        Refit the fitted variables to the replicate of each seed, starting
+        from x0. Return the (K, M) values of the fitted variables, the (K,)
+        costs and the (K, T, N) fitted curves (NaN where the fit failed).
+        """
+        fitted = self._fitted()
+        saved = self._x.copy(), self._known.copy()
+        lower = self._lower[fitted]
+        upper = self._upper[fitted]
+        x_scale = upper - lower
+        if numpy.isinf(x_scale).any():
+            x_scale = 'jac'
+        xs = numpy.full((len(seeds), len(fitted)), numpy.nan)
+        cost = numpy.full(len(seeds), numpy.nan)
+        curves = numpy.full((len(seeds),) + yhat.shape, numpy.nan)
+        self._fitidx = fitted
+        self._known[fitted] = False
+        try:
+            for k, seed in enumerate(seeds):
+                self.data = self._bootdata(seed, method, yhat, resid, sigma)
+                try:
+                    res = self._restart(x0, jac, x_scale, (lower, upper),
+                                        **kwargs)
+                    self._setunknowns(res.x)
+                    curves[k] = self.simulate(self.times, cache=False)
+                except Exception:
+                    logger.exception("Caught exception in bootstrap "
+                                     "replicate {}:".format(seed[-1]))
+                    continue
+                finally:
+                    self._resetunknowns()
+                xs[k] = res.x
+                cost[k] = res.cost
+        finally:
+            self._x, self._known = saved
+            del self._fitidx
+            del self.data
+        return xs, cost, curves
+
+    def bootstrap(self, data, nboot=200, method='residual', times=None,
+                  level=0.95, sigma=None, seed=None, tol=None, check=20,
+                  jac='2-point', n_jobs=None, executor=None, **kwargs):
+        """
+        Bootstrap confidence intervals of the fitted variables, and bands of
+        the fitted curve. Replicates of the data are generated from the fit,
+        and the model is refitted to each of them, starting from the
+        estimate.
+
+        Parameters
+        ==========
+        data : ndarray
+            The data of the fit.
+
+        nboot : int
+            Maximum number of replicates.
+
+        method : str
+            Either "residual" (the fitted curve plus the residuals of the fit,
+            resampled with replacement by time point) or "parametric" (the
+            fitted curve plus Gaussian noise with standard deviation sigma).
+            Replicates are clipped at zero.
+
+        times : ndarray
+            Optional. Times of the data, as in `fit`.
+
+        level : float
+            Confidence level of the percentile intervals (default: 0.95).
+
+        sigma : float
+            Optional. Noise of the parametric bootstrap. Default: estimated
+            from the cost of the fit.
+
+        seed : int
+            Optional. Seed of the replicates. Replicate r is generated from
+            the seed (seed, r), so results do not depend on n_jobs. Default:
+            drawn from the global PRNG.
+
+        tol : float
+            Optional. Stop early when no endpoint of the intervals moved by
+            more than tol times the width of its interval since the previous
+            check.
+
+        check : int
+            Number of replicates between checks of the intervals. Each batch
+            of replicates is split among the workers.
+
+        jac : str
+            Jacobian of the residuals, as in `fit`.
+
+        n_jobs : int
+            Number of worker processes.
+
+        executor : callable
+            Factory of the pool of workers, as in `fit`.
+
+        Returns
+        =======
+        ci : dict
+            Confidence interval (lower, upper) of each fitted variable.
+
+        Notes
+        =====
+        The model must have been fitted. The values of the variables are not
+        changed. Results are stored in the `bootstrap_` attribute: a dict
+        with the method, the seed, the (B, M) values of the fitted variables
+        (`x`), the (B,) costs and the (B, T, N) curves of the replicates,
+        the percentile intervals (`ci`) and the (T, N) bounds of the band of
+        the fitted curve (`band`). Failed refits are NaN, and are ignored by
+        the percentiles.
+
+        Additional keyword arguments are passed to the least squares routine.
+        """
+        if not hasattr(self, 'cost_'):
+            raise ValueError("Model not fitted")
+        if times is None:
+            times = numpy.arange(len(data))
+        self.times = times
+        names = self._theta + self._y0
+        fitted = self._fitted()
+        x_hat = self._x[fitted]
+        yhat = self.simulate(times)
+        resid = data - yhat
+        if sigma is None:
+            sigma = numpy.sqrt(2 * self.cost_ / data.size)
+        if seed is None:
+            seed = numpy.random.randint(2 ** 31)
+        q = 50 * (1 - level)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        pool = None
+        if n_jobs is not None and n_jobs > 1:
+            if executor is None:
+                executor = concurrent.futures.ProcessPoolExecutor
+            pool = executor(max_workers=n_jobs, initializer=_initworker,
+                            initargs=(self,))
+        results = []
+        ci = None
+        try:
+            for start in range(0, nboot, check):
+                seeds = numpy.array([(seed, r) for r in range(
+                    start, min(start + check, nboot))])
+                args = (method, yhat, resid, sigma, x_hat, jac, kwargs)
+                if pool is None:
+                    results.append(self._bootsegment(seeds, *args))
+                else:
+                    chunks = [c for c in numpy.array_split(seeds, n_jobs)
+                              if len(c)]
+                    futures = [pool.submit(_bootworker, chunk, *args)
+                               for chunk in chunks]
+                    results.extend(future.result() for future in futures)
+                xs = numpy.concatenate([x for x, _, _ in results])
+                with warnings.catch_warnings():
+                    # all-NaN columns
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    new = numpy.nanpercentile(xs, [q, 100 - q], axis=0)
+                if tol is not None and ci is not None:
+                    width = numpy.abs(new[1] - new[0])
+                    moved = numpy.abs(new - ci).max(axis=0)
+                    if (moved <= tol * width).all():
+                        ci = new
+                        logger.info("Bootstrap: intervals stable after {} "
+                                    "replicates".format(len(xs)))
+                        break
+                ci = new
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            del self.times
+        cost = numpy.concatenate([c for _, c, _ in results])
+        curves = numpy.concatenate([y for _, _, y in results])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            band = numpy.nanpercentile(curves, [q, 100 - q], axis=0)
+        nfail = numpy.isnan(cost).sum()
+        if nfail:
+            logger.warning("Bootstrap: {} of {} refits failed".format(
+                nfail, len(cost)))
+        ci = {names[i]: tuple(ci[:, j]) for j, i in enumerate(fitted)}
+        self.bootstrap_ = {
+            'method': method,
+            'seed': seed,
+            'names': [names[i] for i in fitted],
+            'x': xs,
+            'cost': cost,
+            'curves': curves,
+            'ci': ci,
+            'band': band,
+        }
+        for name in ci:
+            logger.info("Bootstrap ({}, {} replicates) of {}: {:.0%} C.I. "
+                        "[{:.4g}, {:.4g}]".format(method, len(xs), name,
+                                                  level, *ci[name]))
+        return ci
+
     def summary(self, fmt='.2e'):
         """
         Prints to console a summary of all model variables and errors.
@@ -517,13 +2025,20 @@ class ODEModel(object):
         """
         Model prediction error.
 
-        metric : str
+        metric : str or sequence of str
             Error metric to use. It can be "mape", "smape", "logaccratio", and
-            "rmse". Default: mape.
+            "rmse", or the information criteria "aic" and "bic" (see
+            `_infocriterion`). Default: mape. If a sequence is passed, return
+            a dict with all the metrics, computed from a single simulation.
         """
         if times is None:
             times = numpy.arange(len(data))
         y = self.simulate(times)
+        if isinstance(metric, str):
+            return self._error(y, data, metric)
+        return {m: self._error(y, data, m) for m in metric}
+
+    def _error(self, y, data, metric):
         if metric == 'mape':
             return mape(y, data)
         elif metric == 'smape':
@@ -532,5 +2047,25 @@ class ODEModel(object):
             return logaccratio(y, data)
         elif metric == 'rmse':
             return numpy.sqrt(self.cost_) # should be rmse(y, data) (with rmse function, currently missing)
+        elif metric in ('aic', 'bic'):
+            return self._infocriterion(y, data, metric)
         else:
             raise ValueError("No such metric: {}".format(metric))
+
+    def _infocriterion(self, y, data, metric):
+        """
+        Akaike ("aic") or Bayesian ("bic") information criterion of the
+        prediction y, assuming independent Gaussian errors of equal variance:
+        n log(RSS / n) + 2 k, or n log(RSS / n) + k log(n), where n is the
+        number of data points and k the number of variables estimated by the
+        last fit. Lower is better.
+        """
+        resid = numpy.ravel(y - data)
+        n = resid.size
+        k = len(self._fitted())
+        rss = numpy.dot(resid, resid)
+        if metric == 'aic':
+            penalty = 2.0 * k
+        else:
+            penalty = k * numpy.log(n)
+        return n * numpy.log(rss / n) + penalty
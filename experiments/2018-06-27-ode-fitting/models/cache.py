@@ -0,0 +1,55 @@
+""" Memoization of model simulations """
+
+import collections
+
+__all__ = ['SimulationCache', 'CacheInfo']
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class SimulationCache(object):
+    """
+    Bounded LRU cache of simulated trajectories. When the cache is full, the
+    least recently used trajectory is discarded. Hit and miss counts are not
+    reset when the cache is cleared.
+
+    Parameters
+    ==========
+    maxsize : int
+        Maximum number of trajectories. If zero, nothing is cached.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key):
+        """ Return the value for key, or None if not in the cache. """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
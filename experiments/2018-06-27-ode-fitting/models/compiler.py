@@ -0,0 +1,431 @@
+"""
+Compiler of declarative compartment models
+
+A compartment model is described by a specification, a dict with the keys:
+
+    compartments : list of str
+        Names of the state variables, in order.
+
+    parameters : dict
+        Names of the parameters, in order, with their (lower, upper) bounds
+        (None = unbounded).
+
+    let : dict
+        Optional. Auxiliary quantities, name -> expression, in order. Each
+        expression can use the compartments, the parameters, and the
+        quantities defined before it.
+
+    transitions : list of tuples
+        The flows (source, target, rate): `rate` is the expression of the
+        number of individuals moving from the source compartment to the
+        target one per unit time. A source (target) of None is an inflow
+        from (outflow to) outside of the system.
+
+    observables : list
+        Optional. Each item is the name of a compartment, or a list of names
+        of compartments that are observed as a sum. By default, all
+        compartments are observed.
+
+    mxstep : int
+        Optional. Maximum number of steps of scipy.integrate.odeint.
+
+Expressions are Python arithmetic expressions (+, -, *, /, ** with a
+constant exponent, and the functions exp, log and sqrt) of numbers and names.
+The compiler generates the source code of `rhs`, `rhs_jac` (by symbolic
+differentiation of the rates), `rhs_dtheta` and `obs`, so a compiled model
+runs at the speed of a hand-written one, works on batches of systems (see
+`ODEModel.rhs`), and can be fit with the "sensitivity" Jacobian.
+
+>>> from models.compiler import compile_model
+>>> SIR = compile_model({
+...     'compartments': ['S', 'I', 'R'],
+...     'parameters': {'beta': (0, None), 'mu': (0, None)},
+...     'let': {'N': 'S + I + R'},
+...     'transitions': [('S', 'I', 'beta * I / N * S'),
+...                     ('I', 'R', 'mu * I')],
+... }, 'SIR')
+"""
+
+import ast
+import keyword
+import numpy
+
+from models.base import ODEModel, Variable
+
+__all__ = ['compile_model', 'conserved_groups']
+
+# Functions allowed in expressions: name -> (numpy function, derivative of
+# f(u) with respect to u as a format string of the source of f(u) and u).
+FUNCTIONS = {
+    'exp': ('numpy.exp', '{f}'),
+    'log': ('numpy.log', '(1.0 / {u})'),
+    'sqrt': ('numpy.sqrt', '(0.5 / {f})'),
+}
+
+# Names used by the generated code
+RESERVED = {'y', 't', 'theta', 'numpy', 'J', 'D'} | set(FUNCTIONS)
+
+# Relative tolerance of the conservation check of `compile_model`
+RTOL = 1e-9
+
+
+def _check_name(name, what):
+    if not name.isidentifier() or keyword.iskeyword(name) or \
+            name.startswith('_') or name in RESERVED:
+        raise ValueError("Not a valid name of a {}: {}".format(what, name))
+
+
+def _add(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return '({} + {})'.format(a, b)
+
+
+def _neg(a):
+    if a is None:
+        return None
+    return '(-{})'.format(a)
+
+
+def _sub(a, b):
+    if b is None:
+        return a
+    if a is None:
+        return _neg(b)
+    return '({} - {})'.format(a, b)
+
+
+def _mul(a, b):
+    if a is None or b is None:
+        return None
+    if a == '1.0':
+        return b
+    if b == '1.0':
+        return a
+    return '({} * {})'.format(a, b)
+
+
+def _div(a, b):
+    if a is None:
+        return None
+    return '({} / {})'.format(a, b)
+
+
+class _Expression(object):
+    """
+    A parsed expression. Derivatives are strings of Python source code, or
+    None if identically zero.
+
+    Parameters
+    ==========
+    source : str
+        The expression.
+
+    names : set
+        The names that the expression can use.
+    """
+    _BINOPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+               ast.Pow: '**'}
+
+    def __init__(self, source, names):
+        try:
+            self.tree = ast.parse(source.strip(), mode='eval').body
+        except SyntaxError as e:
+            raise ValueError("Invalid expression: {}".format(source)) from e
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Name) and node.id not in names and \
+                    node.id not in FUNCTIONS:
+                raise ValueError("Unknown name {} in: {}".format(node.id,
+                                                                 source))
+        self.source = self.unparse(self.tree)
+
+    def unparse(self, node):
+        """ Source code of a node, with numpy functions. """
+        if isinstance(node, ast.Constant) and \
+                isinstance(node.value, (int, float)):
+            return repr(float(node.value))
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+            return node.id
+        if isinstance(node, ast.BinOp) and type(node.op) in self._BINOPS:
+            return '({} {} {})'.format(self.unparse(node.left),
+                                       self._BINOPS[type(node.op)],
+                                       self.unparse(node.right))
+        if isinstance(node, ast.UnaryOp) and \
+                isinstance(node.op, (ast.USub, ast.UAdd)):
+            sign = '-' if isinstance(node.op, ast.USub) else '+'
+            return '({}{})'.format(sign, self.unparse(node.operand))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+                and node.func.id in FUNCTIONS and len(node.args) == 1 \
+                and not node.keywords:
+            return '{}({})'.format(FUNCTIONS[node.func.id][0],
+                                   self.unparse(node.args[0]))
+        raise ValueError("Unsupported expression: {}".format(ast.dump(node)))
+
+    def diff(self, var, lets, node=None):
+        """
+        Derivative with respect to the variable `var`. The derivatives of the
+        auxiliary quantities are given by `lets`, a dict name -> dict var ->
+        source of the derivative (missing if zero).
+        """
+        if node is None:
+            node = self.tree
+        if isinstance(node, ast.Constant):
+            return None
+        if isinstance(node, ast.Name):
+            if node.id == var:
+                return '1.0'
+            return lets.get(node.id, {}).get(var)
+        if isinstance(node, ast.UnaryOp):
+            d = self.diff(var, lets, node.operand)
+            return _neg(d) if isinstance(node.op, ast.USub) else d
+        if isinstance(node, ast.Call):
+            u = node.args[0]
+            du = self.diff(var, lets, u)
+            fmt = FUNCTIONS[node.func.id][1]
+            return _mul(fmt.format(f=self.unparse(node), u=self.unparse(u)),
+                        du)
+        a, b = node.left, node.right
+        da = self.diff(var, lets, a)
+        db = self.diff(var, lets, b)
+        if isinstance(node.op, ast.Add):
+            return _add(da, db)
+        if isinstance(node.op, ast.Sub):
+            return _sub(da, db)
+        if isinstance(node.op, ast.Mult):
+            return _add(_mul(da, self.unparse(b)), _mul(self.unparse(a), db))
+        if isinstance(node.op, ast.Div):
+            if db is None:
+                return _div(da, self.unparse(b))
+            return _sub(_div(da, self.unparse(b)),
+                        _div(_mul(self.unparse(a), db),
+                             '({} ** 2)'.format(self.unparse(b))))
+        # power with a constant exponent
+        if db is not None:
+            raise ValueError("Exponents cannot depend on variables: "
+                             "{}".format(self.unparse(node)))
+        n = self.unparse(b)
+        return _mul('({} * {} ** ({} - 1.0))'.format(n, self.unparse(a), n),
+                    da)
+
+
+def conserved_groups(spec):
+    """
+    Groups of compartments whose total is conserved by the transitions of a
+    specification: the connected components of the graph of transitions,
+    except those with inflows or outflows. Returns a list of lists of
+    indices of compartments.
+    """
+    index = {name: i for i, name in enumerate(spec['compartments'])}
+    parent = list(range(len(index)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    open_ = set()
+    for source, target, rate in spec['transitions']:
+        if source is None or target is None:
+            open_.add(index[target if source is None else source])
+        else:
+            parent[find(index[source])] = find(index[target])
+    groups = {}
+    for i in range(len(index)):
+        groups.setdefault(find(i), []).append(i)
+    closed = [g for g in groups.values() if not open_.intersection(g)]
+    return sorted(closed)
+
+
+def _generate(spec):
+    """ Source code of the functions of a compiled model. """
+    states = list(spec['compartments'])
+    params = list(spec['parameters'])
+    for name in states:
+        _check_name(name, 'compartment')
+    for name in params:
+        _check_name(name, 'parameter')
+    names = set(states) | set(params)
+    if len(names) != len(states) + len(params):
+        raise ValueError("Names of compartments and parameters must be "
+                         "unique")
+    # auxiliary quantities, and their derivatives w.r.t. all variables
+    lets = []
+    for name, source in spec.get('let', {}).items():
+        _check_name(name, 'quantity')
+        if name in names:
+            raise ValueError("Duplicate name: {}".format(name))
+        lets.append((name, _Expression(source, names)))
+        names.add(name)
+    fluxes = []
+    for k, (source, target, rate) in enumerate(spec['transitions']):
+        for c in (source, target):
+            if c is not None and c not in states:
+                raise ValueError("Unknown compartment: {}".format(c))
+        if source == target:
+            raise ValueError("Invalid transition: {} -> {}".format(source,
+                                                                   target))
+        fluxes.append((source, target, _Expression(rate, names)))
+    N, P = len(states), len(params)
+    head = ['    {}, = y'.format(', '.join(states)),
+            '    {}, = theta'.format(', '.join(params))]
+    head += ['    {} = {}'.format(name, e.source) for name, e in lets]
+
+    def terms(i, values):
+        # sum of the inflows and outflows of compartment i
+        out = ''
+        for (source, target, e), v in zip(fluxes, values):
+            if v is None:
+                continue
+            if target == states[i]:
+                out += ' + {}'.format(v)
+            elif source == states[i]:
+                out += ' - {}'.format(v)
+        out = out.strip()
+        if out.startswith('+ '):
+            return out[2:]
+        return out.replace('- ', '-', 1)
+
+    # rhs
+    lines = ['def rhs(y, t, theta):'] + head
+    lines += ['    _r{} = {}'.format(k, e.source)
+              for k, (s, d, e) in enumerate(fluxes)]
+    dy = [terms(i, ['_r{}'.format(k) for k in range(len(fluxes))])
+          for i in range(N)]
+    lines.append('    return [{}]'.format(', '.join(
+        d or 'numpy.zeros_like(y[0])' for d in dy)))
+    sources = ['\n'.join(lines)]
+    # derivatives of rhs w.r.t. the states (J) and the parameters (D)
+    for func, out, variables in [('rhs_jac', 'J', states),
+                                 ('rhs_dtheta', 'D', params)]:
+        lines = ['def {}(y, t, theta):'.format(func)] + head
+        dlets = {}
+        for name, e in lets:
+            dlets[name] = {}
+            for var in variables:
+                d = e.diff(var, dlets)
+                if d == '1.0':
+                    dlets[name][var] = d
+                elif d is not None:
+                    symbol = '_d{}_{}'.format(name, var)
+                    lines.append('    {} = {}'.format(symbol, d))
+                    dlets[name][var] = symbol
+        lines.append('    {} = numpy.zeros(({}, {}) + y.shape[1:])'.format(
+            out, N, len(variables)))
+        for j, var in enumerate(variables):
+            values = []
+            for k, (s, d, e) in enumerate(fluxes):
+                g = e.diff(var, dlets)
+                if g is not None:
+                    symbol = '_g{}_{}'.format(k, j)
+                    lines.append('    {} = {}'.format(symbol, g))
+                    values.append(symbol)
+                else:
+                    values.append(None)
+            for i in range(N):
+                entry = terms(i, values)
+                if entry:
+                    lines.append('    {}[{}, {}] = {}'.format(out, i, j,
+                                                              entry))
+        lines.append('    return {}'.format(out))
+        sources.append('\n'.join(lines))
+    # obs
+    observables = spec.get('observables')
+    if observables is not None:
+        columns = []
+        for item in observables:
+            group = [item] if isinstance(item, str) else list(item)
+            for c in group:
+                if c not in states:
+                    raise ValueError("Unknown compartment: {}".format(c))
+            columns.append(' + '.join('y[..., {}]'.format(states.index(c))
+                                      for c in group))
+        sources.append('def obs(y):\n    return numpy.stack([{}], '
+                       'axis=-1)'.format(', '.join(columns)))
+    return sources
+
+
+def compile_model(spec, name, base=ODEModel, module=None):
+    """
+    Compile the specification of a compartment model (see the documentation
+    of this module) to a subclass of `ODEModel`.
+
+    Parameters
+    ==========
+    spec : dict
+        The specification.
+
+    name : str
+        The name of the class.
+
+    base : type
+        Optional. The base class, `ODEModel` or one of its subclasses. A
+        subclass must have the same parameters and compartments of the
+        specification, and the compiled functions replace its own; this way,
+        the compiled version of a model keeps e.g. its `inity0`.
+
+    module : str
+        Optional. The module of the class. Classes must be defined at the top
+        level of their module to be pickled (e.g. by `fit` with n_jobs > 1).
+
+    Returns
+    =======
+    A subclass of base, with the attributes `spec`, the specification,
+    `_conserved`, the groups of compartments with a conserved total (see
+    `conserved_groups`), and `_source`, the generated code.
+
+    Notes
+    =====
+    As a check of the compiler, `rhs` is evaluated at a random state and the
+    derivatives of each conserved group must sum to zero.
+    """
+    if not issubclass(base, ODEModel):
+        raise TypeError("Not a subclass of ODEModel: {}".format(base))
+    sources = _generate(spec)
+    namespace = {'numpy': numpy}
+    exec(compile('\n\n'.join(sources), '<{}>'.format(name), 'exec'),
+         namespace)
+    attrs = {
+        '__doc__': base.__doc__ if base is not ODEModel else
+        spec.get('doc', "Compartment model compiled from a specification"),
+        'spec': spec,
+        '_conserved': conserved_groups(spec),
+        '_source': '\n\n'.join(sources),
+    }
+    if module is not None:
+        attrs['__module__'] = module
+    for func in ['rhs', 'rhs_jac', 'rhs_dtheta', 'obs']:
+        if func in namespace:
+            attrs[func] = staticmethod(namespace[func])
+    theta = list(spec['parameters'])
+    states = list(spec['compartments'])
+    if base is ODEModel:
+        attrs['_theta'] = theta
+        attrs['_y0'] = states
+        for param, (lower, upper) in spec['parameters'].items():
+            attrs[param] = Variable(lower=lower, upper=upper)
+        for state in states:
+            attrs[state] = Variable(lower=0)
+    elif base._theta != theta or base._y0 != states or any(
+            (getattr(base, param).lower, getattr(base, param).upper) !=
+            tuple(bounds) for param, bounds in spec['parameters'].items()):
+        raise ValueError("The variables of the specification are not those "
+                         "of {}".format(base.__name__))
+    if 'mxstep' in spec:
+        attrs['_mxstep'] = spec['mxstep']
+    cls = type(name, (base, ), attrs)
+    # check of the conservation laws
+    rng = numpy.random.RandomState(0)
+    y = rng.uniform(1, 2, len(states))
+    theta = numpy.clip(rng.uniform(0, 1, len(theta)), cls._lower[:len(theta)],
+                       cls._upper[:len(theta)])
+    with numpy.errstate(all='ignore'):
+        dy = numpy.asarray(cls.rhs(y, 0.0, theta), dtype=float)
+    for group in cls._conserved:
+        total = dy[group].sum()
+        if not abs(total) <= RTOL * numpy.abs(dy[group]).sum() + RTOL:
+            raise ValueError("Compartments {} do not conserve their total "
+                             "({:.2e})".format([states[i] for i in group],
+                                               total))
+    return cls
@@ -0,0 +1,107 @@
+""" Reduction of the state of a system with conservation laws """
+
+import numpy
+
+__all__ = ['Reduction']
+
+
+class Reduction(object):
+    """
+    Elimination of one compartment per conserved quantity. If the total of a
+    group of compartments is constant, the last compartment of the group is
+    the total minus the others, and can be left out of the integration.
+
+    Parameters
+    ==========
+    groups : list of lists of int
+        The indices of the compartments of each group, in a system of N
+        compartments. Groups must not overlap.
+
+    y0 : ndarray
+        The initial state, which gives the totals. This is a stack of R
+        systems of N compartments, stored contiguously (see `nblock` of
+        `models.solvers.solve`).
+
+    N : int
+        The number of compartments of each system.
+
+    Notes
+    =====
+    The Jacobian of the reduced system is obtained from the full one by the
+    chain rule: the derivative with respect to a compartment of a group is
+    the one of the full system minus that with respect to the eliminated
+    compartment.
+    """
+
+    def __init__(self, groups, y0, N):
+        y0 = numpy.asarray(y0, dtype=float)
+        self.N = N
+        self.R = len(y0) // N
+        self.drop = [g[-1] for g in groups]
+        self.keep = numpy.array(sorted(set(range(N)) - set(self.drop)),
+                                dtype=int)
+        pos = {i: k for k, i in enumerate(self.keep)}
+        # per group: eliminated compartment, and the others (in the reduced
+        # state)
+        self._groups = [(g[-1], [pos[i] for i in g[:-1]]) for g in groups]
+        # The full state is an affine function of the reduced one: each of
+        # the R systems is Y = A Z + b, with b the totals in the place of
+        # the eliminated compartments.
+        self._A = numpy.zeros((N, self.size))
+        self._A[self.keep, numpy.arange(self.size)] = 1.0
+        Y0 = y0.reshape(self.R, N)
+        self._b = numpy.zeros((self.R, N))
+        for g in groups:
+            self._A[g[-1], [pos[i] for i in g[:-1]]] = -1.0
+            self._b[:, g[-1]] = Y0[:, g].sum(axis=1)
+        self._AT = numpy.ascontiguousarray(self._A.T)
+        # positions of the reduced state in the full one, for all systems
+        self._take = (N * numpy.arange(self.R)[:, None] + self.keep).ravel()
+
+    @property
+    def size(self):
+        """ Number of compartments of each reduced system. """
+        return len(self.keep)
+
+    def reduce(self, y):
+        """ Reduced state(s) of the (..., R * N) state(s) y. """
+        return numpy.take(y, self._take, axis=-1)
+
+    def expand(self, z):
+        """ Full state(s) of the (..., R * M) reduced state(s) z. """
+        z = numpy.asarray(z, dtype=float)
+        Z = z.reshape(z.shape[:-1] + (self.R, self.size))
+        return (numpy.dot(Z, self._AT) + self._b).reshape(z.shape[:-1] +
+                                                         (-1, ))
+
+    def func(self, func):
+        """ Derivative of the reduced system, from that of the full one. """
+        # This is called at every step of the solver: avoid the reshapes
+        # of `expand` for a single system.
+        take = self._take
+        if self.R == 1:
+            A = self._A
+            b = self._b[0]
+
+            def reduced(z, t):
+                return numpy.asarray(func(A.dot(z) + b, t)).take(take)
+        else:
+            def reduced(z, t):
+                return numpy.asarray(func(self.expand(z), t)).take(take)
+        return reduced
+
+    def jac(self, jac):
+        """
+        Jacobian of the reduced system, from that of the full one: an (N, N)
+        array, or the (N, N, R) blocks of a stack of systems.
+        """
+        keep = self.keep
+
+        def reduced(z, t):
+            J = numpy.asarray(jac(self.expand(z), t))[keep]
+            Jr = J[:, keep]
+            for d, cols in self._groups:
+                Jr[:, cols] -= J[:, [d]]
+            return Jr
+
+        return reduced
@@ -0,0 +1,111 @@
+""" Designs of the initial guesses of multi-start fits """
+
+import warnings
+import numpy
+
+__all__ = ['DESIGNS', 'sample', 'tobox']
+
+# Registry of designs, name -> function. A design takes the number of points
+# n and the dimension d and returns an (n, d) array of points in the unit
+# hypercube. scipy.stats is imported by the designs that need it.
+DESIGNS = {}
+
+
+def register(name):
+    """ Decorator to add a design to the registry. """
+    def decorator(func):
+        DESIGNS[name] = func
+        return func
+    return decorator
+
+
+def _seed():
+    # Draw the seed of the quasi-random generators from the global PRNG, so
+    # that numpy.random.seed makes designs reproducible.
+    return numpy.random.randint(2 ** 31)
+
+
+@register('uniform')
+def uniform(n, d):
+    """ Independent uniform draws. """
+    return numpy.random.uniform(size=(n, d))
+
+
+@register('sobol')
+def sobol(n, d):
+    """
+    Scrambled Sobol' sequence. The first n points do not depend on n, and
+    the coverage of the hypercube is best when n is a power of two.
+    """
+    import scipy.stats.qmc
+    sampler = scipy.stats.qmc.Sobol(d, scramble=True, seed=_seed())
+    with warnings.catch_warnings():
+        # warns if n is not a power of two
+        warnings.simplefilter("ignore", UserWarning)
+        return sampler.random(n)
+
+
+@register('lhs')
+def lhs(n, d):
+    """ Latin hypercube: each coordinate has exactly one point per 1/n. """
+    import scipy.stats.qmc
+    sampler = scipy.stats.qmc.LatinHypercube(d, seed=_seed())
+    return sampler.random(n)
+
+
+def sample(design, n, lower, upper, scale=1.0, decades=2):
+    """
+    Draw initial guesses in the box with the given bounds.
+
+    Parameters
+    ==========
+    design : str
+        The name of the design (see `DESIGNS`).
+
+    n : int
+        Number of points.
+
+    lower, upper : array_like
+        The (d,) bounds of the box. Lower bounds must be finite.
+
+    scale : float or array_like
+        Order of magnitude of each coordinate. Only used for unbounded
+        coordinates, see notes.
+
+    decades : float
+        Half-width, in decades, of the range of unbounded coordinates.
+
+    Returns
+    =======
+    x : ndarray
+        An (n, d) array of initial guesses.
+
+    Notes
+    =====
+    Bounded coordinates are mapped linearly to [lower, upper]. Unbounded ones
+    are mapped to lower + scale * 10 ** [-decades, decades] on a log scale,
+    so that all orders of magnitude around the scale are sampled alike.
+    """
+    try:
+        func = DESIGNS[design]
+    except KeyError:
+        raise ValueError("No such design: {}".format(design))
+    return tobox(func(n, len(lower)), lower, upper, scale=scale,
+                 decades=decades)
+
+
+def tobox(u, lower, upper, scale=1.0, decades=2):
+    """
+    Map the (n, d) points u of the unit hypercube to the box with the given
+    bounds, as in `sample`.
+    """
+    lower = numpy.asarray(lower, dtype=float)
+    upper = numpy.asarray(upper, dtype=float)
+    scale = numpy.broadcast_to(numpy.asarray(scale, dtype=float), lower.shape)
+    u = numpy.atleast_2d(u)
+    bounded = numpy.isfinite(upper)
+    x = numpy.empty_like(u)
+    x[:, bounded] = lower[bounded] + u[:, bounded] * (upper - lower)[bounded]
+    exponent = decades * (2 * u[:, ~bounded] - 1)
+    x[:, ~bounded] = lower[~bounded] + scale[~bounded] * 10 ** exponent
+    return x
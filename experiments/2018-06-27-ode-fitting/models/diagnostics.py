@@ -0,0 +1,112 @@
+""" Monitoring of model invariants (conservation, non-negativity) """
+
+import numpy
+
+__all__ = ['Diagnostics', 'LEVELS']
+
+# Monitoring levels:
+#   off     - no checks (default, no cost per derivative evaluation);
+#   sampled - check returned trajectories and one derivative every `every`;
+#   full    - check returned trajectories and every derivative.
+LEVELS = ('off', 'sampled', 'full')
+
+
+class Diagnostics(object):
+    """
+    Counters of invariant violations in the simulations of a model. All
+    models in this package describe a closed population, so the sum of the
+    derivatives must be zero and the total population must stay constant;
+    moreover, no compartment can become negative.
+
+    Parameters
+    ==========
+    every : int
+        Sampling period of derivative checks when the level is "sampled".
+
+    rtol, atol : float
+        Relative and absolute tolerance of the checks. Relative tolerances
+        are computed with respect to the total population (for trajectories)
+        or the sum of the absolute values of the derivatives.
+    """
+
+    def __init__(self, every=100, rtol=1e-6, atol=1e-6):
+        self.every = every
+        self.rtol = rtol
+        self.atol = atol
+        # derivative evaluations and checks
+        self.rhs_calls = 0
+        self.rhs_checks = 0
+        self.rhs_mass = 0
+        # trajectories checks
+        self.trajectories = 0
+        self.traj_mass = 0
+        self.traj_negative = 0
+        self.max_mass_error = 0.0
+
+    def update(self, other):
+        """ Add the counters of another instance (e.g. from a worker). """
+        for name in ['rhs_calls', 'rhs_checks', 'rhs_mass', 'trajectories',
+                     'traj_mass', 'traj_negative']:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.max_mass_error = max(self.max_mass_error, other.max_mass_error)
+
+    def wrap(self, func, level, nblock=None):
+        """
+        Return a version of the derivative `func(y, t)` that checks the sum of
+        the derivatives, every time (level = "full") or every `self.every`
+        calls (level = "sampled"). If nblock is passed, y is a stack of
+        systems of size nblock, stored contiguously (see
+        `ODEModel.simulate_many`), and each system is checked on its own.
+        """
+        every = 1 if level == 'full' else self.every
+
+        def monitored(y, t):
+            dy = func(y, t)
+            self.rhs_calls += 1
+            if self.rhs_calls % every == 0:
+                if nblock is None:
+                    self.check_rhs(dy)
+                else:
+                    # (R, N) -> the (N, R) batch of `check_rhs`
+                    self.check_rhs(numpy.reshape(dy, (-1, nblock)).T)
+            return dy
+
+        return monitored
+
+    def check_rhs(self, dy):
+        """
+        Check that the derivatives sum to zero (mass conservation). Works for
+        a single system or for a batch of systems (see `ODEModel.rhs`).
+        """
+        dy = numpy.asarray(dy)
+        z = numpy.abs(dy.sum(axis=0))
+        tol = self.rtol * numpy.abs(dy).sum(axis=0) + self.atol
+        self.rhs_checks += 1
+        self.rhs_mass += int(numpy.any(z > tol))
+
+    def check_trajectory(self, y):
+        """
+        Check the full trajectory `y` of one or more systems, a (..., T, N)
+        array, for mass conservation and non-negativity. Each system counts
+        at most once per type of violation.
+        """
+        total = y.sum(axis=-1)
+        total0 = total[..., :1]
+        err = numpy.abs(total - total0) / numpy.abs(total0).clip(min=1)
+        tol = self.rtol + self.atol
+        # reduce over time and compartments
+        mass = (err > tol).any(axis=-1)
+        negative = (y < -(self.rtol * numpy.abs(total0[..., None]) +
+                          self.atol)).any(axis=(-1, -2))
+        self.trajectories += mass.size
+        self.traj_mass += int(mass.sum())
+        self.traj_negative += int(negative.sum())
+        if err.size:
+            self.max_mass_error = max(self.max_mass_error, float(err.max()))
+
+    def __str__(self):
+        return ("{rhs_mass}/{rhs_checks} derivative checks failed "
+                "(out of {rhs_calls} evaluations); trajectories: "
+                "{trajectories}, not conserving mass: {traj_mass} (max. rel. "
+                "error: {max_mass_error:.2e}), negative: "
+                "{traj_negative}".format(**self.__dict__))
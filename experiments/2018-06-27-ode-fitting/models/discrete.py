@@ -0,0 +1,88 @@
+""" Discrete-time models (maps) """
+
+import numpy
+
+from models.base import ODEModel
+
+__all__ = ['DiscreteModel', 'iterate']
+
+
+def iterate(func, y0, times, threshold=None):
+    """
+    Iterate the map y(t + 1) = func(y(t), t) from y(0) = y0.
+
+    Parameters
+    ==========
+    func : callable
+        The map. Takes the (N,) state and the step, and returns the next
+        state (a sequence of N values).
+
+    y0 : ndarray
+        The (N,) initial state. A batch of systems can be iterated at once by
+        stacking their states, if func does the same.
+
+    times : array_like
+        The steps at which to return the state. Must be non-negative
+        integers, in any order.
+
+    threshold : float
+        Optional. After each step, values at or below the threshold
+        (including negative ones) are set to zero, all at once.
+
+    Returns
+    =======
+    y : ndarray
+        A (T, N) array with the state at each of the times.
+    """
+    times = numpy.asarray(times, dtype=float)
+    steps = numpy.rint(times).astype(int)
+    if (steps != times).any() or (steps < 0).any():
+        raise ValueError("Times of a discrete-time model must be "
+                         "non-negative integers: {}".format(times))
+    y0 = numpy.asarray(y0, dtype=float)
+    nsteps = steps.max() + 1 if len(steps) else 0
+    y = numpy.empty((nsteps, len(y0)))
+    if nsteps:
+        y[0] = y0
+    for t in range(1, nsteps):
+        y[t] = func(y[t - 1], t - 1)
+        if threshold is not None:
+            y[t, y[t] <= threshold] = 0.0
+    return y[steps]
+
+
+class DiscreteModel(ODEModel):
+    """
+    Base class for discrete-time models, i.e. maps
+
+        y(t + 1) = F(y(t), t; theta),
+
+    evaluated at integer times (steps) only. Subclasses are written as those
+    of `ODEModel`, except that `rhs(y, t, theta)` returns the next state F
+    instead of the derivative. The conventions on batches are the same (see
+    `ODEModel.rhs`), so `simulate_many` iterates a batch of systems with one
+    vectorized call of `rhs` per step, and `fit`, `error` and the rest of the
+    API of `ODEModel` work unchanged. Forward sensitivities (the
+    "sensitivity" Jacobian of `fit`) are not available.
+    """
+
+    # After each step, compartments at or below this value are set to zero
+    # (None = never). This is the threshold of the legacy mean-field code.
+    threshold = 1e-10
+
+    def _integrate(self, func, y0, times, solver=None, tol=None, jac=None,
+                   nblock=None, **kwargs):
+        """
+        Iterate the map func from y0 (see `iterate`). The solver options are
+        ignored.
+        """
+        return iterate(func, y0, times, threshold=self.threshold)
+
+    def _monitored(self, func, nblock=None):
+        # The checks of the derivative (see `models.diagnostics`) do not
+        # apply to maps; trajectories are still checked.
+        return func
+
+    def _simulate_sens(self, times, idx, **kwargs):
+        raise NotImplementedError("Sensitivities of discrete-time models are"
+                                  " not available")
@@ -1,5 +1,7 @@
 """ Hoax model by Tambuscio et al. """
 
+import numpy
+
 from models.base import ODEModel, Variable
 
 __all__ = ['HoaxModel']
@@ -57,12 +59,15 @@ class HoaxModel(ODEModel):
     FI = Variable(lower=0)
     S = Variable(lower=0)
 
+    # the total population is constant
+    _conserved = [[0, 1, 2, 3, 4]]
+
     @staticmethod
     def obs(y):
         """
         Returns BA (fake) and FA (fact)
         """
-        return y[:, :2]
+        return y[..., :2]
 
     def _inity0_none(self, BA, FA):
         self.BA = BA
@@ -76,14 +81,71 @@ class HoaxModel(ODEModel):
         self.BA = BA
         self.FA = FA
 
-    def dy(self, y, t):
+    @staticmethod
+    def rhs(y, t, theta):
         BA, FA, BI, FI, S = y
-        f = BA / float(y.sum())
-        dBA = f * BI - (self.tauinv + self.pv) * BA
-        dFA = f * FI - self.tauinv * FA
-        dBI = self.alpha * f * S + self.tauinv * BA - (f + self.pv) * BI
-        dFI = (1.0 - self.alpha) * f * S + self.pv * (BI + BA) + \
-            self.tauinv * FA - f * FI
+        pv, tauinv, alpha = theta
+        f = BA / y.sum(axis=0)
+        dBA = f * BI - (tauinv + pv) * BA
+        dFA = f * FI - tauinv * FA
+        dBI = alpha * f * S + tauinv * BA - (f + pv) * BI
+        dFI = (1.0 - alpha) * f * S + pv * (BI + BA) + tauinv * FA - f * FI
         dS = -f * S
         dy = [dBA, dFA, dBI, dFI, dS]
         return dy
+
+    @staticmethod
+    def rhs_jac(y, t, theta):
+        BA, FA, BI, FI, S = y
+        pv, tauinv, alpha = theta
+        N = y.sum(axis=0)
+        f = BA / N
+        # gradient of f = BA / N
+        df = numpy.empty(y.shape)
+        df[:] = -f / N
+        df[0] += 1.0 / N
+        J = numpy.zeros((5,) + y.shape)
+        # dBA
+        J[0] = BI * df
+        J[0, 0] -= tauinv + pv
+        J[0, 2] += f
+        # dFA
+        J[1] = FI * df
+        J[1, 1] -= tauinv
+        J[1, 3] += f
+        # dBI
+        J[2] = (alpha * S - BI) * df
+        J[2, 0] += tauinv
+        J[2, 2] -= f + pv
+        J[2, 4] += alpha * f
+        # dFI
+        J[3] = ((1.0 - alpha) * S - FI) * df
+        J[3, 0] += pv
+        J[3, 1] += tauinv
+        J[3, 2] += pv
+        J[3, 3] -= f
+        J[3, 4] += (1.0 - alpha) * f
+        # dS
+        J[4] = -S * df
+        J[4, 4] -= f
+        return J
+
+    @staticmethod
+    def rhs_dtheta(y, t, theta):
+        BA, FA, BI, FI, S = y
+        pv, tauinv, alpha = theta
+        f = BA / y.sum(axis=0)
+        D = numpy.zeros((5, 3) + y.shape[1:])
+        # pv
+        D[0, 0] = -BA
+        D[2, 0] = -BI
+        D[3, 0] = BI + BA
+        # tauinv
+        D[0, 1] = -BA
+        D[1, 1] = -FA
+        D[2, 1] = BA
+        D[3, 1] = FA
+        # alpha
+        D[2, 2] = f * S
+        D[3, 2] = -f * S
+        return D
@@ -0,0 +1,101 @@
+""" Instrumentation of the fits and simulations of a model """
+
+import time
+
+__all__ = ['FitStats']
+
+
+class FitStats(object):
+    """
+    Counters of the work done by a model since the start of its last fit
+    (see the `stats_` attribute of `ODEModel`): integrations, evaluations of
+    the derivative and of its Jacobian by the solver, and integrations that
+    failed (e.g. odeint giving up before the end of the time span, with
+    excess work or repeated convergence failures). The counts of the
+    evaluations are the ones reported by the solver backend, so they do not
+    cost anything per evaluation.
+
+    The fit adds one record per run of least squares to `restarts` (see
+    `restart`), and its wall time to `fit_time`. As it returns, it keeps a
+    copy of the counters in the `fitstats_` attribute of the model (see
+    `snapshot`), which does not count the simulations done afterwards, e.g.
+    to score the fit.
+    """
+
+    COUNTERS = ('integrations', 'rhs_calls', 'jac_calls', 'failures')
+
+    def __init__(self):
+        self.integrations = 0
+        self.rhs_calls = 0
+        self.jac_calls = 0
+        self.failures = 0
+        self.restarts = []
+        self.fit_time = 0.0
+
+    def record(self, nfe, nje=0, failed=False):
+        """
+        Count an integration with nfe evaluations of the derivative and nje
+        of the Jacobian. Called by the solver backends (see
+        `models.solvers.solve`).
+        """
+        self.integrations += 1
+        self.rhs_calls += int(nfe)
+        self.jac_calls += int(nje)
+        self.failures += bool(failed)
+
+    def counts(self):
+        """ The current values of the counters. """
+        return dict((name, getattr(self, name)) for name in self.COUNTERS)
+
+    def add(self, counts):
+        """ Add counts, e.g. of a run of least squares done by a worker. """
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + counts[name])
+
+    def snapshot(self):
+        """ A copy of the counters and the records, e.g. as a fit returns. """
+        other = FitStats()
+        other.add(self.counts())
+        other.restarts = [dict(rec) for rec in self.restarts]
+        other.fit_time = self.fit_time
+        return other
+
+    def start(self):
+        """ Mark the start of a run of least squares (see `restart`). """
+        return time.perf_counter(), self.counts()
+
+    def restart(self, start, res):
+        """
+        Record of a run of least squares, from its start (see `start`) and
+        its result: the counters in between, the wall time, the evaluations
+        of the residuals and of their Jacobian, the final cost and the status
+        of least squares.
+        """
+        tic, before = start
+        rec = dict((name, getattr(self, name) - before[name])
+                   for name in self.COUNTERS)
+        rec['time'] = time.perf_counter() - tic
+        rec['nfev'] = int(res.nfev)
+        rec['njev'] = int(res.njev or 0)
+        rec['cost'] = float(res.cost)
+        rec['status'] = int(res.status)
+        return rec
+
+    def todict(self):
+        """ The counters and the records, e.g. to be saved as JSON. """
+        obj = self.counts()
+        obj['fit_time'] = self.fit_time
+        obj['nfev'] = sum(rec['nfev'] for rec in self.restarts)
+        obj['njev'] = sum(rec['njev'] for rec in self.restarts)
+        obj['restarts'] = list(self.restarts)
+        return obj
+
+    def __str__(self):
+        return ("{} restarts, {} residual and {} Jacobian evaluations; {} "
+                "integrations ({} failed), {} derivative and {} Jacobian "
+                "evaluations by the solver; fit time {:.2f} s".format(
+                    len(self.restarts),
+                    sum(rec['nfev'] for rec in self.restarts),
+                    sum(rec['njev'] for rec in self.restarts),
+                    self.integrations, self.failures, self.rhs_calls,
+                    self.jac_calls, self.fit_time))
@@ -3,58 +3,236 @@
 import numpy
 
 from .hoaxmodel import HoaxModel
+from .base import Variable
+from .discrete import DiscreteModel, iterate
 
-__all__ = ['probmodel', 'simprobmodel']
+__all__ = ['probmodel', 'simprobmodel', 'ProbHoaxModel', 'ProbSegHoaxModel']
 
 
 def _checkparams(pv, tauinv, alpha):
     """
-    Create a HoaxModel instance and try to assign parameters. If value are not
-    within range, exception will be raised
+    Check that the parameters are within the bounds of the parameters of
+    HoaxModel. If values are not within range, exception will be raised
     """
-    model = HoaxModel()
-    model.pv = pv
-    model.tauinv = tauinv
-    model.alpha = alpha
+    P = HoaxModel._ntheta
+    theta = numpy.array([pv, tauinv, alpha], dtype=float)
+    if (theta < HoaxModel._lower[:P]).any():
+        raise ValueError("Illegal value < lower: {}".format(theta))
+    if (theta > HoaxModel._upper[:P]).any():
+        raise ValueError("Illegal value > upper: {}".format(theta))
+
+
+class ProbHoaxModel(DiscreteModel):
+    """
+    Hoax Model by Tambuscio et al., expressed as discrete probabilistic
+    transitions (a mean-field map). This is the model without segregation;
+    states and parameters are those of `HoaxModel`. With the default
+    threshold, it reproduces `mf_noseg` of the legacy fitting code (with
+    tau = tauinv).
+
+    Transitions
+    ===========
+        S -> BI <-> BA
+        S -> FI <-> FA
+        BI -> FI
+        BA -> FI
+
+    State
+    =====
+        BA  - active believers
+        FA  - active fact-checkers
+        BI  - inactive believers
+        FI  - inactive fact-checkers
+        S   - susceptible
+
+    Parameters
+    ==========
+        pv      - probability to verify (bounded in [0,1])
+        tauinv  - inverse tau (bounded in [0,1])
+        alpha   - relative strenght of the hoax (bounded in [0, 1])
+    """
+    _theta = ['pv', 'tauinv', 'alpha']
+
+    pv = Variable(lower=0, upper=1)
+    tauinv = Variable(lower=0, upper=1)
+    alpha = Variable(lower=0, upper=1)
+
+    _y0 = ['BA', 'FA', 'BI', 'FI', 'S']
+
+    BA = Variable(lower=0)
+    FA = Variable(lower=0)
+    BI = Variable(lower=0)
+    FI = Variable(lower=0)
+    S = Variable(lower=0)
+
+    @staticmethod
+    def rhs(y, t, theta):
+        BA, FA, BI, FI, S = y
+        pv, tauinv, alpha = theta
+        f = BA / y.sum(axis=0)
+        y1 = [
+            # BA (believers, active)
+            (1.0 - pv) * f * BI + (1.0 - tauinv) * (1.0 - pv) * BA,
+            # FA (fact-checkers, active)
+            f * FI + (1.0 - tauinv) * FA,
+            # BI (believers, inactive)
+            alpha * f * S + tauinv * BA + (1.0 - pv) * (1.0 - f) * BI,
+            # FI (fact-checkers, inactive)
+            (1.0 - alpha) * f * S + tauinv * FA + pv * BI + pv *
+            (1.0 - tauinv) * BA + (1.0 - f) * FI,
+            # S (susceptibles)
+            (1.0 - f) * S,
+        ]
+        return y1
+
+    @staticmethod
+    def obs(y):
+        """
+        Returns BA (fake) and FA (fact)
+        """
+        return y[..., :2]
+
+    def _inity0_none(self, BA, FA):
+        self.BA = BA
+        self.FA = FA
+        # set to 0
+        self.FI = 0
+        self.BI = 0
+        # do not set S -- always has to be fit
+
+    def _inity0_nonobs(self, BA, FA):
+        self.BA = BA
+        self.FA = FA
+
+
+class ProbSegHoaxModel(DiscreteModel):
+    """
+    Hoax Model by Tambuscio et al. with segregation, expressed as discrete
+    probabilistic transitions (a mean-field map). States and parameters are
+    those of `SegHoaxModel`. With the default threshold, it reproduces
+    `mf_seg` of the legacy fitting code (with tau = tauinv, gulsize = gamma,
+    and the size of each group given by its compartments).
+
+    Transitions
+    ===========
+        S_i -> BI_i <-> BA_i
+        S_i -> FI_i <-> FA_i
+        BI_i -> FI_i
+        BA_i -> FI_i
+
+    i = {sk, gu}
+
+    State
+    =====
+        BA_gu  - active believers gullible
+        FA_gu  - active fact-checkers gullible
+        BI_gu  - inactive believers gullible
+        FI_gu  - inactive fact-checkers gullible
+        S_gu   - susceptible gullible
+        BA_sk  - active believers skeptic
+        FA_sk  - active fact-checkers skeptic
+        BI_sk  - inactive believers skeptic
+        FI_sk  - inactive fact-checkers skeptic
+        S_sk   - susceptible skeptic
+
+    Parameters
+    ==========
+        pvgu    - probability to verify in the gullible group
+        pvsk    - probability to verify in the skeptic group
+        tauinv  - inverse tau
+        alpha   - relative strenght of the hoax
+        seg     - network segregation
+        gamma   - relative size of the gullible group
+    """
+    _theta = ["pvgu", "pvsk", "tauinv", "alpha", "seg", "gamma"]
+
+    pvgu = Variable(lower=0, upper=1)
+    pvsk = Variable(lower=0, upper=1)
+    tauinv = Variable(lower=0, upper=1)
+    alpha = Variable(lower=0, upper=1)
+    seg = Variable(lower=0, upper=1)
+    gamma = Variable(lower=0, upper=1)
+
+    _y0 = [
+        "BA_gu", "FA_gu", "BI_gu", "FI_gu", "S_gu", "BA_sk", "FA_sk", "BI_sk",
+        "FI_sk", "S_sk"
+    ]
+
+    BA_gu = Variable(lower=0)
+    FA_gu = Variable(lower=0)
+    BI_gu = Variable(lower=0)
+    FI_gu = Variable(lower=0)
+    S_gu = Variable(lower=0)
+    BA_sk = Variable(lower=0)
+    FA_sk = Variable(lower=0)
+    BI_sk = Variable(lower=0)
+    FI_sk = Variable(lower=0)
+    S_sk = Variable(lower=0)
+
+    @staticmethod
+    def rhs(y, t, theta):
+        pvgu, pvsk, tauinv, alpha, seg, gamma = theta
+        N_gu = y[:5].sum(axis=0)
+        N_sk = y[5:].sum(axis=0)
+        x_gu = gamma * y[0] / N_gu
+        x_sk = (1 - gamma) * y[5] / N_sk
+        fgu = seg * x_gu + (1 - seg) * x_sk
+        fsk = seg * x_sk + (1 - seg) * x_gu
+        y1 = []
+        # Each group has the same equations
+        for (BA, FA, BI, FI, S), f, pv in [(y[:5], fgu, pvgu),
+                                          (y[5:], fsk, pvsk)]:
+            y1.extend([
+                (1.0 - pv) * f * BI + (1.0 - tauinv) * (1.0 - pv) * BA,
+                f * FI + (1.0 - tauinv) * FA,
+                alpha * f * S + tauinv * BA + (1.0 - pv) * (1.0 - f) * BI,
+                (1.0 - alpha) * f * S + tauinv * FA + pv *
+                (BI + (1.0 - tauinv) * BA) + (1.0 - f) * FI,
+                (1.0 - f) * S,
+            ])
+        return y1
+
+    @staticmethod
+    def obs(y):
+        """
+        Returns BA_gu + BA_sk and FA_gu + FA_sk
+        """
+        y_gu = y[..., :2]  # BA_gu, FA_gu
+        y_sk = y[..., 5:7]  # BA_sk, FA_sk
+        return y_gu + y_sk
+
+    def _inity0_none(self, BA, FA):
+        # split fake fact
+        self.BA_sk = 0.5 * BA
+        self.FA_sk = 0.5 * FA
+        self.BA_gu = 0.5 * BA
+        self.FA_gu = 0.5 * FA
+        # set to zero
+        self.FI_sk = 0
+        self.BI_sk = 0
+        self.FI_gu = 0
+        self.BI_gu = 0
+        # do not set S_sk / S_gu -- they always have to be fit
+
+    def _inity0_nonobs(self, BA, FA):
+        # split fake fact
+        self.BA_sk = 0.5 * BA
+        self.FA_sk = 0.5 * FA
+        self.BA_gu = 0.5 * BA
+        self.FA_gu = 0.5 * FA
 
 
 def probmodel(y, t, pv, tauinv, alpha):
     """
     The model expressed as discrete probabilistic transitions. Returns state
     value at the next time step, y(t + 1). Can be simulated using the
-    `simprobmodel` function.
-
-    State:
-        BA - active believers
-        FA - active fact-checkers
-        BI - inactive believers
-        FI - inactive fact-checkers
-        S - susceptible
-
-    Parameters:
-        pv - probability to verify
-        tauinv - inverse tau
-        alpha - relative strenght of the hoax
+    `simprobmodel` function. See `ProbHoaxModel` for the state and the
+    parameters.
     """
     _checkparams(pv, tauinv, alpha)
     y = numpy.asfarray(y)
-    BA, FA, BI, FI, S = y
     N = y.sum()
-    f = BA / N
-    y1 = [
-        # BA (believers, active)
-        (1.0 - pv) * f * BI + (1.0 - tauinv) * (1.0 - pv) * BA,
-        # FA (fact-checkers, active)
-        f * FI + (1.0 - tauinv) * FA,
-        # BI (believers, inactive)
-        alpha * f * S + tauinv * BA + (1.0 - pv) * (1.0 - f) * BI,
-        # FI (fact-checkers, inactive)
-        (1.0 - alpha) * f * S + tauinv * FA + pv * BI + pv * (1.0 - tauinv) \
-        * BA + (1.0 - f) * FI,
-        # S (susceptibles)
-        (1.0 - f) * S,
-    ]
-    y1 = numpy.asfarray(y1)
+    y1 = numpy.asfarray(ProbHoaxModel.rhs(y, t, (pv, tauinv, alpha)))
     assert numpy.isclose(y1.sum(), N), "Number of agents changed"
     return y1
 
@@ -63,7 +241,17 @@ def simprobmodel(nsteps, f, y0, *args):
     """
     Simulate a probabilistic model by repeatedly applying the transition
     rules. This is currently used to perform all simulations and fits.
+
+    If f is `probmodel`, the parameters are checked once, and the steps are
+    iterated with `models.discrete.iterate`.
     """
+    if f is probmodel:
+        _checkparams(*args)
+        y = iterate(lambda y, t: ProbHoaxModel.rhs(y, t, args), y0,
+                    numpy.arange(nsteps))
+        assert numpy.allclose(y.sum(axis=1), y[0].sum()), \
+            "Number of agents changed"
+        return y
     tmp = [y0]
     for i in range(nsteps - 1):
         y1 = f(y0, i, *args)
@@ -1,5 +1,7 @@
 """ Hoax model with segregation by Tambuscio et al. """
 
+import numpy
+
 from models.base import ODEModel, Variable
 
 __all__ = ['SegHoaxModel']
@@ -72,6 +74,8 @@ class SegHoaxModel(ODEModel):
         "S_sk"
     ]
 
+    _mxstep = MXSTEP
+
     BA_gu = Variable(lower=0)
     FA_gu = Variable(lower=0)
     BI_gu = Variable(lower=0)
@@ -83,20 +87,18 @@ class SegHoaxModel(ODEModel):
     FI_sk = Variable(lower=0)
     S_sk = Variable(lower=0)
 
+    # the population of each group is constant
+    _conserved = [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+
     @staticmethod
     def obs(y):
         """
         Returns BA_gu + BA_sk and FA_gu + FA_sk
         """
-        y_gu = y[:, :2]  # BA_gu, FA_gu
-        y_sk = y[:, 5:7]  # BA_sk, FA_sk
+        y_gu = y[..., :2]  # BA_gu, FA_gu
+        y_sk = y[..., 5:7]  # BA_sk, FA_sk
         return y_gu + y_sk
 
-    def simulate(self, times, full=False, **kwargs):
-        _mxstep = kwargs.get('mxstep', 0)
-        kwargs.update({'mxstep': max(MXSTEP, _mxstep)})
-        return super(SegHoaxModel, self).simulate(times, full=full, **kwargs)
-
     def _inity0_none(self, BA, FA):
         # split fake fact
         self.BA_sk = 0.5 * BA
@@ -117,25 +119,27 @@ class SegHoaxModel(ODEModel):
         self.BA_gu = 0.5 * BA
         self.FA_gu = 0.5 * FA
 
-    def dy(self, y, t):
+    @staticmethod
+    def rhs(y, t, theta):
         BA_gu, FA_gu, BI_gu, FI_gu, S_gu, BA_sk, FA_sk, BI_sk, FI_sk, S_sk = y
-        N = (BA_gu + BA_sk) / float(y.sum())
-        fgu = self.seg * self.gamma * BA_gu / N + (1 - self.seg) * \
-            (1 - self.gamma) * BA_sk / N
-        fsk = self.seg * (1 - self.gamma) * BA_gu / N + (1 - self.seg) * \
-            self.gamma * BA_sk / N
-        dBA_gu = fgu * BI_gu - (self.tauinv + self.pvgu) * BA_gu
-        dBA_sk = fsk * BI_sk - (self.tauinv + self.pvsk) * BA_sk
-        dFA_gu = fgu * FI_gu - self.tauinv * FA_gu
-        dFA_sk = fsk * FI_sk - self.tauinv * FA_sk
-        dBI_gu = self.alpha * fgu * S_gu + self.tauinv * BA_gu - \
-            (fgu + self.pvgu) * BI_gu
-        dBI_sk = self.alpha * fsk * S_sk + self.tauinv * BA_sk - \
-            (fsk + self.pvsk) * BI_sk
-        dFI_gu = (1.0 - self.alpha) * fgu * S_gu + self.pvgu * \
-            (BI_gu + BA_gu) + self.tauinv * FA_gu - fgu * FI_gu
-        dFI_sk = (1.0 - self.alpha) * fsk * S_sk + self.pvsk * \
-            (BI_sk + BA_sk) + self.tauinv * FA_sk - fsk * FI_sk
+        pvgu, pvsk, tauinv, alpha, seg, gamma = theta
+        N = (BA_gu + BA_sk) / y.sum(axis=0)
+        fgu = seg * gamma * BA_gu / N + (1 - seg) * \
+            (1 - gamma) * BA_sk / N
+        fsk = seg * (1 - gamma) * BA_gu / N + (1 - seg) * \
+            gamma * BA_sk / N
+        dBA_gu = fgu * BI_gu - (tauinv + pvgu) * BA_gu
+        dBA_sk = fsk * BI_sk - (tauinv + pvsk) * BA_sk
+        dFA_gu = fgu * FI_gu - tauinv * FA_gu
+        dFA_sk = fsk * FI_sk - tauinv * FA_sk
+        dBI_gu = alpha * fgu * S_gu + tauinv * BA_gu - \
+            (fgu + pvgu) * BI_gu
+        dBI_sk = alpha * fsk * S_sk + tauinv * BA_sk - \
+            (fsk + pvsk) * BI_sk
+        dFI_gu = (1.0 - alpha) * fgu * S_gu + pvgu * \
+            (BI_gu + BA_gu) + tauinv * FA_gu - fgu * FI_gu
+        dFI_sk = (1.0 - alpha) * fsk * S_sk + pvsk * \
+            (BI_sk + BA_sk) + tauinv * FA_sk - fsk * FI_sk
         dS_gu = -fgu * S_gu
         dS_sk = -fsk * S_sk
         dy = [
@@ -143,3 +147,95 @@ class SegHoaxModel(ODEModel):
            dFI_sk, dS_sk
         ]
         return dy
+
+    @staticmethod
+    def rhs_jac(y, t, theta):
+        BA_gu, FA_gu, BI_gu, FI_gu, S_gu, BA_sk, FA_sk, BI_sk, FI_sk, S_sk = y
+        pvgu, pvsk, tauinv, alpha, seg, gamma = theta
+        T = y.sum(axis=0)
+        A = BA_gu + BA_sk
+        # fgu = T * (a * BA_gu + b * BA_sk) / A, and likewise for fsk
+        a, b = seg * gamma, (1 - seg) * (1 - gamma)
+        c, d = seg * (1 - gamma), (1 - seg) * gamma
+        fgu = T * (a * BA_gu + b * BA_sk) / A
+        fsk = T * (c * BA_gu + d * BA_sk) / A
+        dfgu = numpy.empty(y.shape)
+        dfgu[:] = fgu / T
+        dfgu[0] += (a * T - fgu) / A
+        dfgu[5] += (b * T - fgu) / A
+        dfsk = numpy.empty(y.shape)
+        dfsk[:] = fsk / T
+        dfsk[0] += (c * T - fsk) / A
+        dfsk[5] += (d * T - fsk) / A
+        J = numpy.zeros((10,) + y.shape)
+        # Each group has the same equations, with offset k = 0 (gu), 5 (sk)
+        groups = [
+            (0, fgu, dfgu, pvgu, BI_gu, FI_gu, S_gu),
+            (5, fsk, dfsk, pvsk, BI_sk, FI_sk, S_sk),
+        ]
+        for k, f, df, pv, BI, FI, S in groups:
+            BA, FA, BI_, FI_, S_ = range(k, k + 5)
+            # dBA
+            J[BA] = BI * df
+            J[BA, BA] -= tauinv + pv
+            J[BA, BI_] += f
+            # dFA
+            J[FA] = FI * df
+            J[FA, FA] -= tauinv
+            J[FA, FI_] += f
+            # dBI
+            J[BI_] = (alpha * S - BI) * df
+            J[BI_, BA] += tauinv
+            J[BI_, BI_] -= f + pv
+            J[BI_, S_] += alpha * f
+            # dFI
+            J[FI_] = ((1.0 - alpha) * S - FI) * df
+            J[FI_, BA] += pv
+            J[FI_, FA] += tauinv
+            J[FI_, BI_] += pv
+            J[FI_, FI_] -= f
+            J[FI_, S_] += (1.0 - alpha) * f
+            # dS
+            J[S_] = -S * df
+            J[S_, S_] -= f
+        return J
+
+    @staticmethod
+    def rhs_dtheta(y, t, theta):
+        BA_gu, FA_gu, BI_gu, FI_gu, S_gu, BA_sk, FA_sk, BI_sk, FI_sk, S_sk = y
+        pvgu, pvsk, tauinv, alpha, seg, gamma = theta
+        T = y.sum(axis=0)
+        A = BA_gu + BA_sk
+        fgu = T * (seg * gamma * BA_gu + (1 - seg) * (1 - gamma) * BA_sk) / A
+        fsk = T * (seg * (1 - gamma) * BA_gu + (1 - seg) * gamma * BA_sk) / A
+        # derivatives of fgu, fsk with respect to seg and gamma
+        dfgu_seg = T * (gamma * BA_gu - (1 - gamma) * BA_sk) / A
+        dfgu_gamma = T * (seg * BA_gu - (1 - seg) * BA_sk) / A
+        dfsk_seg = T * ((1 - gamma) * BA_gu - gamma * BA_sk) / A
+        dfsk_gamma = T * ((1 - seg) * BA_sk - seg * BA_gu) / A
+        D = numpy.zeros((10, 6) + y.shape[1:])
+        # Each group has the same equations, with offset k = 0 (gu), 5 (sk)
+        # and its own probability to verify (column 0 for gu, 1 for sk).
+        groups = [
+            (0, 0, fgu, dfgu_seg, dfgu_gamma, y[:5]),
+            (5, 1, fsk, dfsk_seg, dfsk_gamma, y[5:]),
+        ]
+        for k, j, f, df_seg, df_gamma, (BA, FA, BI, FI, S) in groups:
+            # derivative of each equation with respect to f
+            df = [BI, FI, alpha * S - BI, (1.0 - alpha) * S - FI, -S]
+            for i in range(5):
+                D[k + i, 4] = df[i] * df_seg
+                D[k + i, 5] = df[i] * df_gamma
+            # pv
+            D[k, j] = -BA
+            D[k + 2, j] = -BI
+            D[k + 3, j] = BI + BA
+            # tauinv
+            D[k, 2] = -BA
+            D[k + 1, 2] = -FA
+            D[k + 2, 2] = BA
+            D[k + 3, 2] = FA
+            # alpha
+            D[k + 2, 3] = f * S
+            D[k + 3, 3] = -f * S
+        return D
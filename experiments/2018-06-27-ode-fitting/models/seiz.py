@@ -1,5 +1,7 @@
 """ SEIZ model by et al. Jin et al. (2013) """
 
+import numpy
+
 from models.base import ODEModel, Variable
 
 __all__ = ['SEIZ']
@@ -47,22 +49,22 @@ class SEIZ(ODEModel):
 
     _y0 = ["S", "E", "I", "Z"]
 
+    _mxstep = MXSTEP
+
     S = Variable(lower=0)
     E = Variable(lower=0)
     I = Variable(lower=0)  # noqa
     Z = Variable(lower=0)
 
+    # the total population is constant
+    _conserved = [[0, 1, 2, 3]]
+
     @staticmethod
     def obs(y):
         """
         Return I and Z
         """
-        return y[:, 2:]
-
-    def simulate(self, times, full=False, **kwargs):
-        _mxstep = kwargs.get('mxstep', 0)
-        kwargs.update({'mxstep': max(MXSTEP, _mxstep)})
-        return super(SEIZ, self).simulate(times, full=full, **kwargs)
+        return y[..., 2:]
 
     def _inity0_nonobs(self, I, Z):
         self.I = I  # noqa
@@ -74,14 +76,74 @@ class SEIZ(ODEModel):
         self.E = 0
         # do not set S --- it always has to be fit
 
-    def dy(self, y, t):
+    @staticmethod
+    def rhs(y, t, theta):
         S, E, I, Z = y
-        N = float(y.sum())
-        dS = - self.beta * I * S / N - self.b * Z * S / N
-        dE = (1.0 - self.p) * self.beta * I * S / N + (1.0 - self.l) * \
-            self.b * Z * S / N - self.rho * E * I / N - self.epsilon * E
-        dI = self.p * self.beta * I * S / N + self.rho * E * I / N + \
-            self.epsilon * E
-        dZ = self.l * self.b * S * Z / N
+        rho, l, b, beta, p, epsilon = theta
+        N = y.sum(axis=0)
+        dS = - beta * I * S / N - b * Z * S / N
+        dE = (1.0 - p) * beta * I * S / N + (1.0 - l) * \
+            b * Z * S / N - rho * E * I / N - epsilon * E
+        dI = p * beta * I * S / N + rho * E * I / N + \
+            epsilon * E
+        dZ = l * b * S * Z / N
         dy = [dS, dE, dI, dZ]
         return dy
+
+    @staticmethod
+    def rhs_jac(y, t, theta):
+        S, E, I, Z = y
+        rho, l, b, beta, p, epsilon = theta
+        N = y.sum(axis=0)
+        # gradients of the contact terms I * S / N, Z * S / N, and E * I / N
+        dIS = numpy.empty(y.shape)
+        dIS[:] = -I * S / N ** 2
+        dIS[0] += I / N
+        dIS[2] += S / N
+        dZS = numpy.empty(y.shape)
+        dZS[:] = -Z * S / N ** 2
+        dZS[0] += Z / N
+        dZS[3] += S / N
+        dEI = numpy.empty(y.shape)
+        dEI[:] = -E * I / N ** 2
+        dEI[1] += I / N
+        dEI[2] += E / N
+        J = numpy.zeros((4,) + y.shape)
+        J[0] = - beta * dIS - b * dZS
+        J[1] = (1.0 - p) * beta * dIS + (1.0 - l) * b * dZS - rho * dEI
+        J[1, 1] -= epsilon
+        J[2] = p * beta * dIS + rho * dEI
+        J[2, 1] += epsilon
+        J[3] = l * b * dZS
+        return J
+
+    @staticmethod
+    def rhs_dtheta(y, t, theta):
+        S, E, I, Z = y
+        rho, l, b, beta, p, epsilon = theta
+        N = y.sum(axis=0)
+        IS = I * S / N
+        ZS = Z * S / N
+        EI = E * I / N
+        D = numpy.zeros((4, 6) + y.shape[1:])
+        # rho
+        D[1, 0] = -EI
+        D[2, 0] = EI
+        # l
+        D[1, 1] = -b * ZS
+        D[3, 1] = b * ZS
+        # b
+        D[0, 2] = -ZS
+        D[1, 2] = (1.0 - l) * ZS
+        D[3, 2] = l * ZS
+        # beta
+        D[0, 3] = -IS
+        D[1, 3] = (1.0 - p) * IS
+        D[2, 3] = p * IS
+        # p
+        D[1, 4] = -beta * IS
+        D[2, 4] = beta * IS
+        # epsilon
+        D[1, 5] = -E
+        D[2, 5] = E
+        return D
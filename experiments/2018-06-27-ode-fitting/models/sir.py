@@ -1,5 +1,7 @@
 """ The SIR and the "double" SIR model """
 
+import numpy
+
 from models.base import ODEModel, Variable
 
 __all__ = ['SIR', 'DoubleSIR']
@@ -36,15 +38,51 @@ class SIR(ODEModel):
     I = Variable(lower=0)  # noqa
     R = Variable(lower=0)
 
-    def dy(self, y, t):
+    # the total population is constant
+    _conserved = [[0, 1, 2]]
+
+    @staticmethod
+    def rhs(y, t, theta):
         S, I, R = y
-        N = float(y.sum())
-        dS = - self.beta * I / N * S
-        dI = self.beta * I / N * S - self.mu * I
-        dR = self.mu * I
+        beta, mu = theta
+        N = y.sum(axis=0)
+        dS = - beta * I / N * S
+        dI = beta * I / N * S - mu * I
+        dR = mu * I
         dy = [dS, dI, dR]
         return dy
 
+    @staticmethod
+    def rhs_jac(y, t, theta):
+        S, I, R = y
+        beta, mu = theta
+        N = y.sum(axis=0)
+        # gradient of the force of infection q = beta * I * S / N
+        q = beta * I * S / N
+        dq = numpy.empty(y.shape)
+        dq[:] = -q / N
+        dq[0] += beta * I / N
+        dq[1] += beta * S / N
+        J = numpy.zeros((3,) + y.shape)
+        J[0] = -dq
+        J[1] = dq
+        J[1, 1] -= mu
+        J[2, 1] = mu
+        return J
+
+    @staticmethod
+    def rhs_dtheta(y, t, theta):
+        S, I, R = y
+        N = y.sum(axis=0)
+        D = numpy.zeros((3, 2) + y.shape[1:])
+        # beta
+        D[0, 0] = - I / N * S
+        D[1, 0] = I / N * S
+        # mu
+        D[1, 1] = -I
+        D[2, 1] = I
+        return D
+
 
 class DoubleSIR(ODEModel):
     """
@@ -61,6 +99,8 @@ class DoubleSIR(ODEModel):
 
     _y0 = ["S1", "I1", "R1", "S2", "I2", "R2"]
 
+    _mxstep = MXSTEP
+
     S1 = Variable(lower=0)
     I1 = Variable(lower=0)
     R1 = Variable(lower=0)
@@ -68,54 +108,45 @@ class DoubleSIR(ODEModel):
     I2 = Variable(lower=0)
     R2 = Variable(lower=0)
 
-    def __init__(self, **kwargs):
-        super(DoubleSIR, self).__init__(**kwargs)
-        kwargs1 = {}
-        kwargs2 = {}
-        for key in kwargs:
-            if key.endswith("1"):
-                kwargs1[key] = kwargs[key]
-            elif key.endwith("2"):
-                kwargs2[key] = kwargs[key]
-            else:
-                raise ValueError("Not a valid parameter: {}".format(key))
-        self.sir1 = SIR(**kwargs1)
-        self.sir2 = SIR(**kwargs2)
+    # the population of each SIR process is constant
+    _conserved = [[0, 1, 2], [3, 4, 5]]
 
     @staticmethod
     def obs(y):
         """
         Returns I1 and I2
         """
-        return y[:, [1, 4]]
-
-    def simulate(self, times, full=False, **kwargs):
-        _mxstep = kwargs.get('mxstep', 0)
-        kwargs.update({'mxstep': max(MXSTEP, _mxstep)})
-        return super(DoubleSIR, self).simulate(times, full=full, **kwargs)
+        return y[..., [1, 4]]
 
     def _inity0_nonobs(self, I1, I2):
         self.I1 = I1
         self.I2 = I2
-        self.sir1.I = I1  # noqa
-        self.sir2.I = I2  # noqa
 
     def _inity0_none(self, I1, I2):
         self.I1 = I1
         self.I2 = I2
-        self.sir1.I = I1  # noqa
-        self.sir2.I = I2  # noqa
         self.R1 = 0
         self.R2 = 0
-        self.sir1.R = 0
-        self.sir2.R = 0
         # do not set S1/S2 --- they always have to be fit
 
     # XXX not sure how to make sure that N stays the same across the two models
-    def dy(self, y, t):
-        self.sir1.theta = self.theta[:2]
-        self.sir2.theta = self.theta[2:]
-        dy1 = self.sir1.dy(y[:3], t)
-        dy2 = self.sir2.dy(y[3:], t)
+    @staticmethod
+    def rhs(y, t, theta):
+        dy1 = SIR.rhs(y[:3], t, theta[:2])
+        dy2 = SIR.rhs(y[3:], t, theta[2:])
         dy = dy1 + dy2  # list concatenation
         return dy
+
+    @staticmethod
+    def rhs_jac(y, t, theta):
+        J = numpy.zeros((6,) + y.shape)
+        J[:3, :3] = SIR.rhs_jac(y[:3], t, theta[:2])
+        J[3:, 3:] = SIR.rhs_jac(y[3:], t, theta[2:])
+        return J
+
+    @staticmethod
+    def rhs_dtheta(y, t, theta):
+        D = numpy.zeros((6, 4) + y.shape[1:])
+        D[:3, :2] = SIR.rhs_dtheta(y[:3], t, theta[:2])
+        D[3:, 2:] = SIR.rhs_dtheta(y[3:], t, theta[2:])
+        return D
@@ -0,0 +1,288 @@
+""" Solver backends for the integration of O.D.E. models """
+
+import warnings
+import numpy
+
+__all__ = ['SOLVERS', 'PRESETS', 'SolverWarning', 'solve']
+
+
+class SolverWarning(RuntimeWarning):
+    """ Issued when a solver fails to reach the end of the time span. """
+    pass
+
+
+# Registry of solver backends, name -> function. All backends share the same
+# signature (see `solve`). Backends import scipy on first use, so that this
+# module (and simulation with rk4) does not need it.
+SOLVERS = {}
+
+# Tolerance presets of each backend. The "default" preset of lsoda leaves the
+# defaults of `scipy.integrate.odeint` untouched.
+PRESETS = {
+    'lsoda': {
+        'fast': {'rtol': 1e-6, 'atol': 1e-6},
+        'default': {},
+        'accurate': {'rtol': 1e-10, 'atol': 1e-10},
+    },
+    'bdf': {
+        'fast': {'rtol': 1e-4, 'atol': 1e-4},
+        'default': {'rtol': 1e-6, 'atol': 1e-6},
+        'accurate': {'rtol': 1e-10, 'atol': 1e-10},
+    },
+    'radau': {
+        'fast': {'rtol': 1e-4, 'atol': 1e-4},
+        'default': {'rtol': 1e-6, 'atol': 1e-6},
+        'accurate': {'rtol': 1e-10, 'atol': 1e-10},
+    },
+    'rk45': {
+        'fast': {'rtol': 1e-4, 'atol': 1e-4},
+        'default': {'rtol': 1e-6, 'atol': 1e-6},
+        'accurate': {'rtol': 1e-10, 'atol': 1e-10},
+    },
+    # fixed step: the preset sets the maximum step size
+    'rk4': {
+        'fast': {'step': 0.5},
+        'default': {'step': 0.1},
+        'accurate': {'step': 0.01},
+    },
+}
+
+
+def register(name):
+    """
+    Decorator to add a backend to the registry. Backends take the arguments
+    of `solve`, except solver and tol, and the options of their preset.
+    """
+    def decorator(func):
+        SOLVERS[name] = func
+        return func
+    return decorator
+
+
+def solve(func, y0, times, solver='lsoda', tol='default', jac=None,
+          nblock=None, stats=None, **options):
+    """
+    Integrate the system y' = func(y, t) with the given backend.
+
+    Parameters
+    ==========
+    func : callable
+        The derivative, `func(y, t)` (same convention as odeint).
+
+    y0 : ndarray
+        An (n,) vector of initial conditions.
+
+    times : ndarray
+        The system is evaluated at these times.
+
+    solver : str
+        The name of the backend (see `SOLVERS`).
+
+    tol : str
+        The name of the tolerance preset (see `PRESETS`).
+
+    jac : callable
+        Optional. The Jacobian, `jac(y, t)`. If `nblock` is None, it returns
+        an (n, n) array; otherwise, see below.
+
+    nblock : int
+        Optional. If passed, y is a stack of R = n / nblock independent
+        systems of size nblock, stored contiguously. In this case the
+        Jacobian is block diagonal and `jac` returns the (nblock, nblock, R)
+        array of its blocks.
+
+    stats : FitStats
+        Optional. The backend records the integration in it, with the number
+        of evaluations of func and jac and whether it failed (see
+        `models.instrument.FitStats.record`).
+
+    Returns
+    =======
+    y : ndarray
+        A (T, n) array with the solution.
+
+    Notes
+    =====
+    Additional keyword arguments are passed to the backend and take
+    precedence over the tolerance preset.
+    """
+    try:
+        backend = SOLVERS[solver]
+    except KeyError:
+        raise ValueError("No such solver: {}".format(solver))
+    try:
+        opts = dict(PRESETS[solver][tol])
+    except KeyError:
+        raise ValueError("No such tolerance preset: {}".format(tol))
+    opts.update(options)
+    return backend(func, y0, times, jac=jac, nblock=nblock, stats=stats,
+                   **opts)
+
+
+def _banded(jac, N):
+    """
+    Convert a function returning the (N, N, R) blocks of a block diagonal
+    Jacobian into a function returning the Jacobian in the banded format of
+    odeint, with ml = mu = N - 1.
+    """
+    # row/column indices of each block
+    ii, jj = numpy.indices((N, N))
+
+    def banded(y, t):
+        J = jac(y, t)
+        R = J.shape[-1]
+        # Banded storage: band[i - j + mu, j] = J[i, j] (here mu = N - 1)
+        band = numpy.zeros((2 * N - 1, R, N))
+        band[ii - jj + N - 1, :, jj] = J
+        return band.reshape(2 * N - 1, R * N)
+
+    return banded
+
+
+def _sparse(J):
+    """
+    Convert the (N, N, R) blocks of a block diagonal Jacobian into a sparse
+    matrix.
+    """
+    import scipy.sparse
+    N, _, R = J.shape
+    data = numpy.ascontiguousarray(J.transpose(2, 0, 1))
+    idx = numpy.arange(R)
+    return scipy.sparse.bsr_matrix((data, idx, numpy.arange(R + 1)),
+                                   shape=(N * R, N * R)).tocsc()
+
+
+# Messages of odeint when the integration did not fail
+_LSODA_OK = ("Integration successful.",
+             "Nothing was done; the integration time was 0.")
+
+
+@register('lsoda')
+def lsoda(func, y0, times, jac=None, nblock=None, stats=None, **options):
+    """
+    LSODA (automatic stiff / non-stiff switching) via
+    `scipy.integrate.odeint`. Options are passed to odeint.
+
+    If the integration fails, odeint leaves the rows of the solution that
+    were not reached uninitialized, so that the result depends on the
+    history of the process. These rows are set to the state at the point of
+    failure, which keeps residuals finite and reproducible.
+    """
+    import scipy.integrate
+    if nblock is not None:
+        # The Jacobian of a stack of systems is banded. Declaring it keeps the
+        # cost of the linear algebra linear in the number of systems.
+        options.setdefault('ml', nblock - 1)
+        options.setdefault('mu', nblock - 1)
+        if jac is not None:
+            jac = _banded(jac, nblock)
+    if jac is not None:
+        options.setdefault('Dfun', jac)
+    options['full_output'] = True
+    y, info = scipy.integrate.odeint(func, y0, times, **options)
+    # Each successful output step ends past the requested time. The rows of
+    # info past the point of failure are uninitialized too, so only the rows
+    # up to the first one that was not reached are meaningful.
+    reached = info['tcur'] >= numpy.asarray(times, dtype=float)[1:]
+    failed = info['message'] not in _LSODA_OK or not reached.all()
+    # last meaningful row of info
+    last = len(reached) - 1
+    if not reached.all():
+        last = numpy.argmin(reached)
+        y[last + 2:] = y[last + 1]
+    if failed:
+        warnings.warn(info['message'].strip(), SolverWarning)
+    if stats is not None and len(reached):
+        # cumulative counts at each output time
+        stats.record(info['nfe'][last], info['nje'][last], failed)
+    return y
+
+
+def _ivp(method, func, y0, times, jac=None, nblock=None, stats=None,
+         **options):
+    """
+    Backends based on `scipy.integrate.solve_ivp`. Options are passed to
+    solve_ivp.
+    """
+    import scipy.integrate
+
+    def fun(t, y):
+        return numpy.asarray(func(y, t), dtype=float)
+
+    times = numpy.asarray(times, dtype=float)
+    if method in ('BDF', 'Radau'):
+        if jac is not None and nblock is not None:
+            options.setdefault('jac', lambda t, y: _sparse(jac(y, t)))
+        elif jac is not None:
+            options.setdefault('jac', lambda t, y: jac(y, t))
+        elif nblock is not None:
+            ones = numpy.ones((nblock, nblock, len(y0) // nblock))
+            options.setdefault('jac_sparsity', _sparse(ones))
+    sol = scipy.integrate.solve_ivp(fun, (times[0], times[-1]), y0,
+                                    method=method, t_eval=times, **options)
+    y = numpy.full((len(times), len(y0)), numpy.nan)
+    y[:sol.y.shape[1]] = sol.y.T
+    if sol.status < 0:
+        warnings.warn(sol.message, SolverWarning)
+    if stats is not None:
+        stats.record(sol.nfev, sol.njev, sol.status < 0)
+    return y
+
+
+@register('bdf')
+def bdf(func, y0, times, jac=None, nblock=None, **options):
+    """ Implicit multi-step BDF (stiff), via solve_ivp. """
+    return _ivp('BDF', func, y0, times, jac=jac, nblock=nblock, **options)
+
+
+@register('radau')
+def radau(func, y0, times, jac=None, nblock=None, **options):
+    """ Implicit Runge-Kutta Radau IIA of order 5 (stiff), via solve_ivp. """
+    return _ivp('Radau', func, y0, times, jac=jac, nblock=nblock, **options)
+
+
+@register('rk45')
+def rk45(func, y0, times, jac=None, nblock=None, **options):
+    """ Explicit Runge-Kutta 4(5) (non-stiff), via solve_ivp. """
+    return _ivp('RK45', func, y0, times, **options)
+
+
+@register('rk4')
+def rk4(func, y0, times, jac=None, nblock=None, stats=None, step=0.1,
+        rtol=None, atol=None):
+    """
+    Classic explicit Runge-Kutta of order 4 with a fixed step no larger than
+    `step`. There is no error control and no Python loop over the systems of
+    a stack, so this is fast on large batches of non-stiff systems.
+
+    The Jacobian and the tolerances rtol and atol of the other backends are
+    accepted, so that the same options can be passed to all of them, and
+    ignored: the accuracy only depends on the step.
+    """
+    def f(y, t):
+        return numpy.asarray(func(y, t), dtype=float)
+
+    y = numpy.array(y0, dtype=float)
+    out = numpy.empty((len(times), len(y)))
+    out[0] = y
+    nsteps = 0
+    for k in range(1, len(times)):
+        t = times[k - 1]
+        n = max(1, int(numpy.ceil((times[k] - t) / step)))
+        nsteps += n
+        h = (times[k] - t) / n
+        for i in range(n):
+            k1 = f(y, t)
+            k2 = f(y + 0.5 * h * k1, t + 0.5 * h)
+            k3 = f(y + 0.5 * h * k2, t + 0.5 * h)
+            k4 = f(y + h * k3, t + h)
+            y = y + h / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
+            t = t + h
+        out[k] = y
+    failed = not numpy.isfinite(y).all()
+    if failed:
+        warnings.warn("rk4: solution is not finite, step too large?",
+                      SolverWarning)
+    if stats is not None:
+        stats.record(4 * nsteps, 0, failed)
+    return out
@@ -0,0 +1,129 @@
+"""
+Specifications of the models of this package as compartment models, and
+their compiled versions (see `models.compiler`).
+
+Each compiled class is a subclass of the hand-written model, with the same
+variables and `inity0`, and with `rhs`, `rhs_jac`, `rhs_dtheta` and `obs`
+generated from the specification.
+
+The hand-written models remain the reference implementation: they are the
+ones fit by fit.py, and the ones in existing pickles. Both versions are kept,
+so a change to a model must be made to its specification too;
+tests/test_compiler.py checks that the two agree.
+"""
+
+from models.compiler import compile_model
+from models.hoaxmodel import HoaxModel
+from models.seghoaxmodel import SegHoaxModel
+from models.sir import SIR, DoubleSIR
+from models.seiz import SEIZ
+
+__all__ = ['SPECS', 'COMPILED', 'CompiledHoaxModel', 'CompiledSegHoaxModel',
+           'CompiledSIR', 'CompiledDoubleSIR', 'CompiledSEIZ']
+
+
+def _hoax(suffix, f, pv):
+    """ Transitions of the Hoax model in a group of compartments. """
+    BA, FA, BI, FI, S = [c + suffix for c in ['BA', 'FA', 'BI', 'FI', 'S']]
+    return [
+        (S, BI, 'alpha * {} * {}'.format(f, S)),
+        (S, FI, '(1.0 - alpha) * {} * {}'.format(f, S)),
+        (BI, BA, '{} * {}'.format(f, BI)),
+        (BA, BI, 'tauinv * {}'.format(BA)),
+        (FI, FA, '{} * {}'.format(f, FI)),
+        (FA, FI, 'tauinv * {}'.format(FA)),
+        (BI, FI, '{} * {}'.format(pv, BI)),
+        (BA, FI, '{} * {}'.format(pv, BA)),
+    ]
+
+
+def _sir(suffix):
+    """ Transitions of the SIR model in a group of compartments. """
+    S, I, R = [c + suffix for c in ['S', 'I', 'R']]
+    return [
+        (S, I, 'beta{0} * {1} / N{0} * {2}'.format(suffix, I, S)),
+        (I, R, 'mu{} * {}'.format(suffix, I)),
+    ]
+
+
+SPECS = {
+    'HoaxModel': {
+        'compartments': ['BA', 'FA', 'BI', 'FI', 'S'],
+        'parameters': {'pv': (0, 1), 'tauinv': (0, 1), 'alpha': (0, 1)},
+        'let': {'f': 'BA / (BA + FA + BI + FI + S)'},
+        'transitions': _hoax('', 'f', 'pv'),
+        'observables': ['BA', 'FA'],
+    },
+    'SegHoaxModel': {
+        'compartments': ['BA_gu', 'FA_gu', 'BI_gu', 'FI_gu', 'S_gu', 'BA_sk',
+                         'FA_sk', 'BI_sk', 'FI_sk', 'S_sk'],
+        'parameters': {'pvgu': (0, 1), 'pvsk': (0, 1), 'tauinv': (0, 1),
+                       'alpha': (0, 1), 'seg': (0, 1), 'gamma': (0, 1)},
+        # as in SegHoaxModel.rhs, where this quantity is called N
+        'let': {
+            'ba': '(BA_gu + BA_sk) / (BA_gu + FA_gu + BI_gu + FI_gu + S_gu + '
+                  'BA_sk + FA_sk + BI_sk + FI_sk + S_sk)',
+            'fgu': 'seg * gamma * BA_gu / ba + (1 - seg) * (1 - gamma) * '
+                   'BA_sk / ba',
+            'fsk': 'seg * (1 - gamma) * BA_gu / ba + (1 - seg) * gamma * '
+                   'BA_sk / ba',
+        },
+        'transitions': _hoax('_gu', 'fgu', 'pvgu') +
+        _hoax('_sk', 'fsk', 'pvsk'),
+        'observables': [['BA_gu', 'BA_sk'], ['FA_gu', 'FA_sk']],
+        'mxstep': SegHoaxModel._mxstep,
+    },
+    'SIR': {
+        'compartments': ['S', 'I', 'R'],
+        'parameters': {'beta': (0, None), 'mu': (0, None)},
+        'let': {'N': 'S + I + R'},
+        'transitions': [('S', 'I', 'beta * I / N * S'),
+                        ('I', 'R', 'mu * I')],
+    },
+    'DoubleSIR': {
+        'compartments': ['S1', 'I1', 'R1', 'S2', 'I2', 'R2'],
+        'parameters': {'beta1': (0, None), 'mu1': (0, None),
+                       'beta2': (0, None), 'mu2': (0, None)},
+        'let': {'N1': 'S1 + I1 + R1', 'N2': 'S2 + I2 + R2'},
+        'transitions': _sir('1') + _sir('2'),
+        'observables': ['I1', 'I2'],
+        'mxstep': DoubleSIR._mxstep,
+    },
+    'SEIZ': {
+        'compartments': ['S', 'E', 'I', 'Z'],
+        'parameters': {'rho': (0, None), 'l': (0, 1), 'b': (0, None),
+                       'beta': (0, None), 'p': (0, 1), 'epsilon': (0, None)},
+        'let': {'N': 'S + E + I + Z'},
+        'transitions': [
+            ('S', 'I', 'p * beta * I * S / N'),
+            ('S', 'E', '(1.0 - p) * beta * I * S / N'),
+            ('S', 'Z', 'l * b * S * Z / N'),
+            ('S', 'E', '(1.0 - l) * b * Z * S / N'),
+            ('E', 'I', 'rho * E * I / N'),
+            ('E', 'I', 'epsilon * E'),
+        ],
+        'observables': ['I', 'Z'],
+        'mxstep': SEIZ._mxstep,
+    },
+}
+
+CompiledHoaxModel = compile_model(SPECS['HoaxModel'], 'CompiledHoaxModel',
+                                  base=HoaxModel, module=__name__)
+CompiledSegHoaxModel = compile_model(SPECS['SegHoaxModel'],
+                                     'CompiledSegHoaxModel',
+                                     base=SegHoaxModel, module=__name__)
+CompiledSIR = compile_model(SPECS['SIR'], 'CompiledSIR', base=SIR,
+                           module=__name__)
+CompiledDoubleSIR = compile_model(SPECS['DoubleSIR'], 'CompiledDoubleSIR',
+                                  base=DoubleSIR, module=__name__)
+CompiledSEIZ = compile_model(SPECS['SEIZ'], 'CompiledSEIZ', base=SEIZ,
+                             module=__name__)
+
+# Compiled version of each model, by name of the hand-written model
+COMPILED = {
+    'HoaxModel': CompiledHoaxModel,
+    'SegHoaxModel': CompiledSegHoaxModel,
+    'SIR': CompiledSIR,
+    'DoubleSIR': CompiledDoubleSIR,
+    'SEIZ': CompiledSEIZ,
+}
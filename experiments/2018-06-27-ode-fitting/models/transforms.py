@@ -0,0 +1,161 @@
+""" Transforms of bounded variables to unconstrained ones """
+
+import numpy
+
+__all__ = ['TRANSFORMS', 'Reparametrization']
+
+# Registry of transforms, name -> class. A transform maps a variable x with
+# bounds [lower, upper] to an unconstrained variable z. Each class has the
+# static methods forward(x, lower, upper) -> z, inverse(z, lower, upper) -> x
+# and deriv(z, lower, upper) -> dx/dz, all element-wise.
+TRANSFORMS = {}
+
+# Values closer than this to a bound are moved inside before the forward
+# transform (relative to the width of the interval for logit).
+EPS = 1e-6
+
+
+def register(name):
+    """ Decorator to add a transform to the registry. """
+    def decorator(cls):
+        TRANSFORMS[name] = cls
+        return cls
+    return decorator
+
+
+@register('identity')
+class Identity(object):
+    """ z = x """
+
+    @staticmethod
+    def forward(x, lower, upper):
+        return x
+
+    @staticmethod
+    def inverse(z, lower, upper):
+        return z
+
+    @staticmethod
+    def deriv(z, lower, upper):
+        return numpy.ones_like(z)
+
+
+@register('log')
+class Log(object):
+    """ z = log(x - lower), for variables with only a lower bound. """
+
+    @staticmethod
+    def forward(x, lower, upper):
+        return numpy.log(numpy.maximum(x - lower, EPS))
+
+    @staticmethod
+    def inverse(z, lower, upper):
+        return lower + numpy.exp(z)
+
+    @staticmethod
+    def deriv(z, lower, upper):
+        return numpy.exp(z)
+
+
+@register('logit')
+class Logit(object):
+    """ z = logit((x - lower) / (upper - lower)), for bounded variables. """
+
+    @staticmethod
+    def forward(x, lower, upper):
+        import scipy.special
+        u = (x - lower) / (upper - lower)
+        return scipy.special.logit(numpy.clip(u, EPS, 1 - EPS))
+
+    @staticmethod
+    def inverse(z, lower, upper):
+        import scipy.special
+        return lower + (upper - lower) * scipy.special.expit(z)
+
+    @staticmethod
+    def deriv(z, lower, upper):
+        import scipy.special
+        p = scipy.special.expit(z)
+        return (upper - lower) * p * (1 - p)
+
+
+def auto(lower, upper):
+    """
+    Default transform of each variable: logit if both bounds are finite, log
+    if only the lower bound is, identity otherwise.
+    """
+    kinds = []
+    for lo, hi in zip(lower, upper):
+        if numpy.isfinite(lo) and numpy.isfinite(hi):
+            kinds.append('logit')
+        elif numpy.isfinite(lo):
+            kinds.append('log')
+        else:
+            kinds.append('identity')
+    return kinds
+
+
+class Reparametrization(object):
+    """
+    Element-wise transform of a vector of bounded variables to an
+    unconstrained vector.
+
+    Parameters
+    ==========
+    lower, upper : array_like
+        The (M,) bounds of the variables (infinite if unbounded).
+
+    kinds : sequence of str
+        Optional. The name of the transform of each variable (see
+        `TRANSFORMS`). Default: see `auto`.
+    """
+
+    def __init__(self, lower, upper, kinds=None):
+        self.lower = numpy.asarray(lower, dtype=float)
+        self.upper = numpy.asarray(upper, dtype=float)
+        if kinds is None:
+            kinds = auto(self.lower, self.upper)
+        for kind in kinds:
+            if kind not in TRANSFORMS:
+                raise ValueError("No such transform: {}".format(kind))
+        self.kinds = list(kinds)
+        # indices of the variables of each transform
+        self._groups = [(TRANSFORMS[kind], numpy.flatnonzero(
+            numpy.array(self.kinds) == kind)) for kind in set(self.kinds)]
+
+    def _apply(self, method, v):
+        v = numpy.asarray(v, dtype=float)
+        out = numpy.empty_like(v)
+        for cls, idx in self._groups:
+            func = getattr(cls, method)
+            out[..., idx] = func(v[..., idx], self.lower[idx],
+                                 self.upper[idx])
+        return out
+
+    def forward(self, x):
+        """ Unconstrained values z of the variables x. """
+        return self._apply('forward', x)
+
+    def inverse(self, z):
+        """ Variables x of the unconstrained values z. """
+        return self._apply('inverse', z)
+
+    def deriv(self, z):
+        """ Derivative dx/dz of each variable, at z. """
+        return self._apply('deriv', z)
+
+    @property
+    def identity(self):
+        """ Mask of the variables that are not transformed. """
+        return numpy.array(self.kinds) == 'identity'
+
+    @property
+    def bounds(self):
+        """
+        Bounds of the unconstrained values: infinite, except for variables
+        that are not transformed, which keep their bounds.
+        """
+        idx = self.identity
+        lower = numpy.where(idx, self.lower, -numpy.inf)
+        upper = numpy.where(idx, self.upper, numpy.inf)
+        return lower, upper
@@ -0,0 +1,57 @@
+""" The "unifying" rumor model by Moreno et al. (discrete-time version) """
+
+from models.base import Variable
+from models.discrete import DiscreteModel
+
+__all__ = ['UnifiedModel']
+
+
+class UnifiedModel(DiscreteModel):
+    """
+    The map of `sir_unified` in the legacy fitting code (unifying model by
+    Moreno et al., 2016).
+
+    State:
+        X - ignorants
+        Y - spreaders
+        Z - stiflers
+
+    Transitions:
+        Y -> X
+        Z -> X
+        X -> Y
+        Z -> Y
+        X -> Z
+        Y -> Z
+
+    Parameters:
+        delta1 - probability that a spreader becomes an ignorant
+        gamma - probability that a stifler becomes an ignorant
+        eta - probability that an ignorant becomes a spreader
+
+    Notes
+    =====
+    The legacy function also takes beta, alpha, delta2, lamda and N, but its
+    update does not use them (and it does not run as written: the initial
+    state is never set), so they are not parameters of this model.
+    """
+    _theta = ["delta1", "gamma", "eta"]
+
+    delta1 = Variable(lower=0, upper=1)
+    gamma = Variable(lower=0, upper=1)
+    eta = Variable(lower=0, upper=1)
+
+    _y0 = ["X", "Y", "Z"]
+
+    X = Variable(lower=0)
+    Y = Variable(lower=0)
+    Z = Variable(lower=0)
+
+    @staticmethod
+    def rhs(y, t, theta):
+        X, Y, Z = y
+        delta1, gamma, eta = theta
+        X1 = Y * delta1 + Z * gamma
+        Y1 = X * eta + Z * (1 - gamma)
+        Z1 = X * (1 - eta) + Y * (1 - delta1)
+        return [X1, Y1, Z1]
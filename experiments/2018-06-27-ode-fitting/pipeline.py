@@ -0,0 +1,206 @@
+""" Stages of a pipelined run of fit.py, connected by bounded queues. """
+
+import time
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+import scheduler
+
+logger = logging.getLogger()
+
+# Marks the end of the items of a queue
+_END = object()
+
+
+class Prefetch(object):
+    """
+    Iterate over an iterable in a background thread, up to size items ahead
+    of the consumer, e.g. to read the data of the next stories while the
+    current one is fit. Exceptions are raised in the consumer.
+
+    Attributes
+    ==========
+    count : int
+        Number of items produced.
+
+    busy : float
+        Time spent producing them, in seconds.
+
+    waited : float
+        Time the consumer spent waiting for them, in seconds.
+    """
+
+    def __init__(self, iterable, size=2):
+        self.count = 0
+        self.busy = 0.0
+        self.waited = 0.0
+        self._queue = queue.Queue(maxsize=size)
+        self._thread = threading.Thread(target=self._produce,
+                                        args=(iter(iterable), ))
+        # do not wait for the producer if the consumer stops early
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _produce(self, iterator):
+        try:
+            while True:
+                tic = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self.busy += time.perf_counter() - tic
+                self.count += 1
+                self._queue.put((item, None))
+        except Exception as e:
+            self._queue.put((_END, e))
+            return
+        self._queue.put((_END, None))
+
+    def __iter__(self):
+        while True:
+            tic = time.perf_counter()
+            item, error = self._queue.get()
+            self.waited += time.perf_counter() - tic
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+
+
+def throughput(count, busy):
+    """ Describe the number of items done by a stage in busy seconds. """
+    rate = count / busy if busy > 0 else float('nan')
+    return "{} in {:.1f} s ({:.3g}/s)".format(count, busy, rate)
+
+
+class _Prefix(logging.Filter):
+    """ Prefix the log records with the name of the current item. """
+
+    prefix = ''
+
+    def filter(self, record):
+        record.msg = self.prefix + record.getMessage()
+        record.args = None
+        return True
+
+
+def _consume(func, items, logs, stats, level, name):
+    """
+    Main loop of the process of a `Consumer`. Send back the number of
+    items done and the time spent on them.
+    """
+    root = logging.getLogger()
+    # do not write to the handlers of the parent, if any were inherited
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    prefix = _Prefix()
+    handler = QueueHandler(logs)
+    handler.addFilter(prefix)
+    root.addHandler(handler)
+    root.setLevel(level)
+    logging.captureWarnings(True)
+    count = 0
+    busy = 0.0
+    while True:
+        item = items.get()
+        if item is None:
+            break
+        prefix.prefix = '[{} {}] '.format(name, item[0])
+        tic = time.perf_counter()
+        try:
+            func(*item)
+        except Exception:
+            logger.exception("Exception:")
+        busy += time.perf_counter() - tic
+        count += 1
+    stats.put((count, busy))
+
+
+class Consumer(object):
+    """
+    Call func(*item) for each item put, in a separate process, e.g. to
+    report and plot fits while the next stories are fit. Items wait in a
+    queue of the given size, so that the producer blocks when the consumer
+    lags behind.
+
+    Parameters
+    ==========
+    func : callable
+        A module-level function, so that it can be sent to the process. The
+        process is started as the workers of `scheduler.run` are, and items
+        are sent to it, so they must be picklable.
+
+    size : int
+        Size of the queue of the items.
+
+    name : str
+        Name of the items in the log, e.g. "story". The log records of the
+        process go to the handlers of the root logger of this process,
+        prefixed with the name and the first element of the current item.
+
+    Attributes
+    ==========
+    count : int
+        Number of items done, after `close`.
+
+    busy : float
+        Time spent on them by the process, in seconds, after `close`.
+
+    waited : float
+        Time spent waiting for room in the queue, in seconds.
+    """
+
+    # How often to check that the process is alive while waiting for it
+    POLL = 1.0
+
+    def __init__(self, func, size=4, name='item'):
+        ctx = scheduler.context()
+        self.count = 0
+        self.busy = 0.0
+        self.waited = 0.0
+        self._items = ctx.Queue(maxsize=size)
+        self._stats = ctx.Queue()
+        self._logs = ctx.Queue()
+        root = logging.getLogger()
+        self._proc = ctx.Process(target=_consume,
+                                 args=(func, self._items, self._logs,
+                                       self._stats, root.getEffectiveLevel(),
+                                       name))
+        self._proc.daemon = True
+        self._proc.start()
+        # the thread of the listener is started only once the process is
+        self._listener = QueueListener(self._logs, *root.handlers,
+                                       respect_handler_level=True)
+        self._listener.start()
+
+    def _wait(self, call, *args):
+        """ call(*args, timeout=...) until it succeeds or the process dies. """
+        while True:
+            try:
+                return call(*args, timeout=self.POLL)
+            except (queue.Full, queue.Empty):
+                if not self._proc.is_alive():
+                    raise RuntimeError("Consumer process died (exit code "
+                                       "{})".format(self._proc.exitcode))
+
+    def put(self, *item):
+        """ Queue an item. Blocks while the queue is full. """
+        tic = time.perf_counter()
+        self._wait(self._items.put, item)
+        self.waited += time.perf_counter() - tic
+
+    def close(self):
+        """ Wait until all items are done, and stop the process. """
+        try:
+            self._wait(self._items.put, None)
+            self.count, self.busy = self._wait(self._stats.get)
+            self._proc.join()
+        finally:
+            if self._proc.is_alive():
+                self._proc.terminate()
+                self._proc.join()
+            self._listener.stop()
@@ -36,11 +36,9 @@ for run in runs:
     models = run['models']
     del run['models']
     for story, model in models.items():
-        tup = []
-        for metric in metrics:
-            e = err(story, model, metric)
-            tup.append(e)
-        data.append(tuple(tup))
+        # all metrics from a single simulation
+        e = err(story, model, metrics)
+        data.append(tuple(e[metric] for metric in metrics))
         label = dict(run)
         label['story'] = story
         labels.append(label)
@@ -0,0 +1,239 @@
+""" Run independent fits on worker processes, with timeouts and retries. """
+
+import time
+import zlib
+import logging
+import traceback
+import collections
+import multiprocessing
+import multiprocessing.connection
+from logging.handlers import QueueHandler
+
+import numpy
+
+logger = logging.getLogger()
+
+# How worker processes are started. They are not forked from this process:
+# a run forks while other threads (e.g. the reader of `pipeline.Prefetch`, or
+# a logging listener) may hold locks, which the child would inherit locked.
+# They are forked from a server process instead, which has no other threads,
+# or spawned where there is no such server.
+START_METHOD = ('forkserver' if 'forkserver' in
+                multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def context():
+    """ The multiprocessing context of the worker processes. """
+    return multiprocessing.get_context(START_METHOD)
+
+
+def preload(modules):
+    """
+    Import modules (e.g. the module of the function run by the workers, and
+    its heavy dependencies) once in the server process of the workers, so
+    that they are not imported again by each worker. Must be called before
+    the first worker starts. Nothing is done when workers are spawned.
+    """
+    if START_METHOD == 'forkserver':
+        context().set_forkserver_preload(list(modules))
+
+
+class _PipeHandler(QueueHandler):
+    """
+    Send the log records of a worker to the parent process, through the pipe
+    of the results. The records are prefixed with the name of the task.
+    """
+
+    def __init__(self, conn, prefix):
+        super(_PipeHandler, self).__init__(None)
+        self.conn = conn
+        self.prefix = prefix
+
+    def prepare(self, record):
+        record = super(_PipeHandler, self).prepare(record)
+        record.msg = self.prefix + record.msg
+        return record
+
+    def enqueue(self, record):
+        self.conn.send(('log', record))
+
+
+def _worker(func, args, prefix, seed, level, conn):
+    """
+    Run func(*args) in a worker process, and send back the result or the
+    traceback. Log records go to the parent as they are emitted.
+    """
+    root = logging.getLogger()
+    # do not write to the handlers of the parent, if any were inherited
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_PipeHandler(conn, prefix))
+    root.setLevel(level)
+    logging.captureWarnings(True)
+    numpy.random.seed(seed)
+    try:
+        result = func(*args)
+        conn.send(('result', result))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def taskseed(seed, key, attempt):
+    """
+    Seed of an attempt of a task. With a base seed, it depends only on the
+    seed, the key of the task and the attempt number, and not on the order in
+    which tasks are run. Without one, it is drawn from fresh entropy.
+    """
+    if seed is None:
+        entropy = None
+    else:
+        entropy = [seed, zlib.crc32(repr(key).encode()), attempt]
+    return int(numpy.random.SeedSequence(entropy).generate_state(1)[0])
+
+
+def run(func, tasks, jobs=1, timeout=None, retries=1, seed=None,
+        name='task', seedkey=None):
+    """
+    Run func(*args) for each (key, args) in tasks, on up to jobs worker
+    processes. A generator of (key, result) pairs, in the order of tasks.
+    The result is None if all attempts of the task failed. Tasks are taken
+    from the iterable only when a worker is free.
+
+    Parameters
+    ==========
+    func : callable
+        A module-level function, so that it can be sent to the workers.
+
+    tasks : iterable of (key, args)
+        The key identifies the task, in the log and in the seeds. The
+        arguments are sent to the workers, so they must be picklable.
+
+    jobs : int
+        Number of worker processes. -1 means the number of CPUs.
+
+    timeout : float
+        Wall-clock limit of each attempt, in seconds. Workers that run over
+        it are terminated. Default: no limit.
+
+    retries : int
+        Number of new attempts after a timeout, or after the worker died
+        (e.g. killed for lack of memory). Each attempt has a new seed (see
+        `taskseed`). Exceptions raised by func are not retried, since they
+        would most likely be raised again.
+
+    seed : int
+        Base seed of the attempts.
+
+    name : str
+        Name of the tasks in the log, e.g. "story".
+
+    seedkey : callable
+        Key of the seeds of a task, from its key. Tasks with the same seed
+        key have the same seeds. Default: the key of the task.
+
+    Notes
+    =====
+    Each attempt runs in a fresh process (see `START_METHOD`), so that it
+    can be terminated on timeout. The log records of the workers are sent to
+    the handlers of the root logger of this process, prefixed with the name
+    and key of the task.
+    """
+    if jobs == -1:
+        jobs = multiprocessing.cpu_count()
+    jobs = max(1, jobs)
+    ctx = context()
+    level = logging.getLogger().getEffectiveLevel()
+    source = iter(tasks)
+    tasks = []
+    # attempts to retry
+    pending = collections.deque()
+    # reader end of the pipe -> (task, attempt, process, deadline)
+    running = {}
+    done = {}
+    nextout = 0
+    try:
+        while True:
+            while len(running) < jobs:
+                if pending:
+                    i, attempt = pending.popleft()
+                elif source is not None:
+                    try:
+                        tasks.append(next(source))
+                    except StopIteration:
+                        source = None
+                        continue
+                    i, attempt = len(tasks) - 1, 0
+                else:
+                    break
+                key, args = tasks[i]
+                prefix = '[{} {}] '.format(name, key)
+                s = taskseed(seed, key if seedkey is None else seedkey(key),
+                             attempt)
+                logger.info("{}Attempt {} of {}, seed {}".format(
+                    prefix, attempt + 1, retries + 1, s))
+                reader, writer = ctx.Pipe(duplex=False)
+                proc = ctx.Process(target=_worker,
+                                   args=(func, args, prefix, s, level, writer))
+                proc.daemon = True
+                proc.start()
+                # so that the reader sees EOF if the worker dies
+                writer.close()
+                deadline = None
+                if timeout is not None:
+                    deadline = time.monotonic() + timeout
+                running[reader] = (i, attempt, proc, deadline)
+            if not running:
+                break
+            wait = None
+            deadlines = [d for _, _, _, d in running.values() if d is not None]
+            if deadlines:
+                wait = max(0.0, min(deadlines) - time.monotonic())
+            finished = []
+            for reader in multiprocessing.connection.wait(list(running),
+                                                          wait):
+                try:
+                    kind, value = reader.recv()
+                except EOFError:
+                    kind, value = 'died', None
+                if kind == 'log':
+                    logger.handle(value)
+                else:
+                    finished.append((reader, kind, value))
+            now = time.monotonic()
+            ended = set(reader for reader, _, _ in finished)
+            for reader, (i, attempt, proc, deadline) in running.items():
+                if reader in ended:
+                    continue
+                if deadline is not None and now >= deadline:
+                    proc.terminate()
+                    finished.append((reader, 'timeout', None))
+            for reader, kind, value in finished:
+                i, attempt, proc, deadline = running.pop(reader)
+                reader.close()
+                proc.join()
+                key = tasks[i][0]
+                if kind == 'result':
+                    done[i] = value
+                    continue
+                if kind == 'error':
+                    msg = "failed:\n{}".format(value.rstrip())
+                elif kind == 'timeout':
+                    msg = "timed out after {} s".format(timeout)
+                else:
+                    msg = "died (exit code {})".format(proc.exitcode)
+                logger.error("[{} {}] Attempt {} of {} {}".format(
+                    name, key, attempt + 1, retries + 1, msg))
+                if kind != 'error' and attempt < retries:
+                    pending.appendleft((i, attempt + 1))
+                else:
+                    done[i] = None
+            while nextout in done:
+                yield tasks[nextout][0], done.pop(nextout)
+                nextout += 1
+    finally:
+        for reader, (i, attempt, proc, deadline) in running.items():
+            proc.terminate()
+            proc.join()
+            reader.close()
@@ -1,13 +1,9 @@
 """ Fit synthetic data """
 
-import os
-import sys
+import shutil
 import logging
 import configparser
 import numpy
-import scipy
-# import matplotlib
-import matplotlib.pyplot as plt
 
 import models
 
@@ -17,32 +13,12 @@ logging.captureWarnings(True)
 logger = logging.getLogger(__name__)
 print = logger.info
 
-# Find out terminal size
-py_vers = sys.version_info
-if py_vers.major >= 3 and py_vers.minor >= 3:
-    import shutil
-    # on Python 3.3+ use os.get_terminal_size
-    TERM_COLS = shutil.get_terminal_size().columns
-elif os.name is "posix":
-    # if that's not available ...
-    # ... on Linux/Unix use stty to get terminal size
-    import subprocess
-    result = subprocess.getoutput("stty size")
-    _, TERM_COLS = map(int, result.split())
-else:
-    # ... on Windows assume default of 80 columns
-    TERM_COLS = 80
-
-TERM_COLS -= 25  # length of timestamp
-
-# Used by cmd line parser
-AVAIL_MODELS = [v.__name__ for v in models.__dict__.values()
-                if isinstance(v, type) and issubclass(v, models.ODEModel)]
-# The base class -- cannot be chosen
-AVAIL_MODELS.remove('ODEModel')
+# Used by cmd line parser (models are imported only when chosen)
+AVAIL_MODELS = list(models.MODELS)
 
 
 def plot(fig, model, times, data=None, **kwargs):
+    import matplotlib.pyplot as plt
     fig = plt.gcf()
     axs = fig.axes
     y = model.simulate(times)
@@ -67,6 +43,7 @@ def gendata(model, tmax=168, sigma=50, p_outliers=0.1, outlier_mult=10):
 
     # Generate data by simulating the ODE and applying Gaussian noise with
     # given sigma.
+    import scipy.stats
     y = model.simulate(t)
     yerr = scipy.stats.norm.rvs(scale=sigma, size=y.shape)
 
@@ -82,7 +59,7 @@ def gendata(model, tmax=168, sigma=50, p_outliers=0.1, outlier_mult=10):
     return t, data
 
 
-def main(config_path, modelcls='HoaxModel', seed=None):
+def main(config_path, modelcls='HoaxModel', seed=None, design=None):
     # For reproducibility. Change seed to get different random numbers.
     numpy.random.seed(seed)
     parser = configparser.ConfigParser()
@@ -116,16 +93,19 @@ def main(config_path, modelcls='HoaxModel', seed=None):
     # data.
     hows = ["all", "non-obs", "none"]
     _models = [m]
+    # terminal width, minus the length of the timestamp
+    term_cols = shutil.get_terminal_size().columns - 25
     for i, how in enumerate(hows):
-        print("=" * TERM_COLS)
+        print("=" * term_cols)
         print("{}) Fitting: {}".format(i + 1, how))
         _m = M()
-        _m.fit(data, nrep=3)
+        _m.fit(data, nrep=3, design=design)
         _m.inity0(how, data[0, 0], data[0, 1])
         _m.summary()
         _models.append(_m)
 
     # Plot true model, data, and fitted models.
+    import matplotlib.pyplot as plt
     fig, axs = plt.subplots(1, 2)
     plot(fig, m, t, data, label='True', ls='-', lw=2)
     linestyles = ["--", "-.", ":"]
@@ -148,5 +128,7 @@ if __name__ == '__main__':
                         help='Model to choose [default: %(default)s]',
                         choices=AVAIL_MODELS, dest='modelcls')
     parser.add_argument('-S', '--seed', type=int, help='PRNG seed')
+    parser.add_argument('-d', '--design', choices=sorted(models.DESIGNS),
+                        help='Design of the initial guesses of the fit')
     args = parser.parse_args()
     main(**vars(args))
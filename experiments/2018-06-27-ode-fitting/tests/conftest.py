@@ -0,0 +1,94 @@
+""" Fixtures of the tests of the O.D.E. fitting code. """
+
+import os
+import sys
+import logging
+
+import numpy
+import pytest
+
+# The modules of the experiment (models, fit, ...) are imported from its
+# folder, as the scripts do.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import models  # noqa: E402
+
+# Reference values of the built-in models. Compartments that are not listed
+# are set to zero.
+REFERENCE = {
+    'HoaxModel': {'pv': 0.01, 'tauinv': 0.1, 'alpha': 0.5, 'BA': 1000,
+                  'S': 9000},
+    'SegHoaxModel': {'pvsk': 0.1, 'pvgu': 0.001, 'seg': 0.75, 'gamma': 0.5,
+                     'tauinv': 0.01, 'alpha': 0.5, 'S_sk': 4500,
+                     'S_gu': 4500, 'BA_sk': 500, 'BA_gu': 500},
+    'SIR': {'beta': 1.0, 'mu': 0.5, 'S': 9000, 'I': 1000},
+    'DoubleSIR': {'beta1': 1.0, 'mu1': 2.0, 'beta2': 1.0, 'mu2': 0.5,
+                  'S1': 9000, 'I1': 1000, 'S2': 9000, 'I2': 1000},
+    'SEIZ': {'rho': 1.0, 'l': 0.1, 'b': 1.0, 'beta': 2.0, 'p': 0.2,
+             'epsilon': 2.0, 'S': 9000, 'I': 1000},
+}
+
+ODE_MODELS = sorted(REFERENCE)
+
+
+def makemodel(modelcls):
+    """ An instance of modelcls with the reference values. """
+    m = getattr(models, modelcls)()
+    m.y0 = numpy.zeros(len(m._y0))
+    for k, val in REFERENCE[modelcls].items():
+        setattr(m, k, val)
+    return m
+
+
+def perturb(model, nrep, seed=0):
+    """
+    nrep parameter vectors within +/- 50% of those of model, clipped to
+    bounds.
+    """
+    rng = numpy.random.RandomState(seed)
+    theta = model.theta * rng.uniform(0.5, 1.5, (nrep, len(model._theta)))
+    for k, name in enumerate(model._theta):
+        v = getattr(type(model), name)
+        lower = v.lower if v.lower is not None else -numpy.inf
+        upper = v.upper if v.upper is not None else numpy.inf
+        theta[:, k] = numpy.clip(theta[:, k], lower, upper)
+    return theta
+
+
+@pytest.fixture(params=ODE_MODELS)
+def refmodel(request):
+    return makemodel(request.param)
+
+
+@pytest.fixture
+def datapath(tmp_path):
+    """ A CSV file with two stories simulated by HoaxModel. """
+    import pandas
+    m = makemodel('HoaxModel')
+    frames = []
+    for story, pv in [(3, 0.01), (7, 0.05)]:
+        m.pv = pv
+        y = m.simulate(numpy.arange(24))
+        frames.append(pandas.DataFrame({
+            'story': story,
+            'timestamp': pandas.date_range('2018-01-01', periods=24,
+                                           freq='h'),
+            'fake': y[:, 0],
+            'fact': y[:, 1],
+        }))
+    path = str(tmp_path / 'stories.csv')
+    pandas.concat(frames).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def rundir(tmp_path, monkeypatch):
+    """ Run in a temporary folder, and drop the handlers added by fit.main. """
+    monkeypatch.chdir(tmp_path)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    yield tmp_path
+    for handler in root.handlers[:]:
+        if handler not in handlers:
+            root.removeHandler(handler)
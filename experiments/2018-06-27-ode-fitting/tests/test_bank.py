@@ -0,0 +1,96 @@
+""" Tests of the bank of fitted parameters (see `bank`). """
+
+import numpy
+import pytest
+
+from bank import ParameterBank, hit
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+
+
+@pytest.fixture
+def bank():
+    bank = ParameterBank()
+    m = makemodel('HoaxModel')
+    for story, pv in enumerate([0.01, 0.05, 0.2]):
+        m.pv = pv
+        m.cost_ = 1.0
+        assert bank.add('HoaxModel', 'non-obs', story, m)
+    return bank
+
+
+def test_add():
+    bank = ParameterBank()
+    m = makemodel('HoaxModel')
+    # not fitted
+    assert not bank.add('HoaxModel', 'non-obs', 1, m)
+    m.cost_ = 2.0
+    assert bank.add('HoaxModel', 'non-obs', 1, m)
+    # only a better solution replaces the stored one
+    m.cost_ = 3.0
+    assert not bank.add('HoaxModel', 'non-obs', 1, m)
+    m.cost_ = 1.0
+    assert bank.add('HoaxModel', 'non-obs', 1, m)
+    assert len(bank) == 1
+
+
+def test_roundtrip(bank, tmp_path):
+    path = str(tmp_path / 'bank.pickle')
+    assert len(ParameterBank.load(path)) == 0
+    bank.save(path)
+    loaded = ParameterBank.load(path)
+    assert sorted(loaded.entries) == sorted(bank.entries)
+    # the data of story 1, at 10 times the scale of the stored solution
+    m = makemodel('HoaxModel')
+    m.pv = 0.05
+    data = 10 * m.simulate(TIMES)
+    for b in [bank, loaded]:
+        (dist, key, theta, y0), = b.nearest(m, data, k=1)
+        assert key == ('HoaxModel', 'non-obs', 1)
+        assert dist < 1e-6
+        numpy.testing.assert_allclose(theta, m.theta)
+        numpy.testing.assert_allclose(y0, 10 * m.y0)
+
+
+def test_nearest(bank):
+    m = makemodel('HoaxModel')
+    data = m.simulate(TIMES)
+    nearest = bank.nearest(m, data, k=3)
+    assert [key[2] for _, key, _, _ in nearest] == [0, 1, 2]
+    assert [d for d, _, _, _ in nearest] == sorted(
+        d for d, _, _, _ in nearest)
+    assert [key[2] for _, key, _, _ in bank.nearest(m, data, k=2,
+                                                     exclude=[0])] == [1, 2]
+
+
+def test_other_model(bank):
+    m = makemodel('SEIZ')
+    data = m.simulate(TIMES)[:, :2]
+    assert bank.nearest(m, data) == []
+    assert bank.candidates(m, data).shape == (0, len(m._unknowns()))
+
+
+def test_candidates(bank):
+    m = makemodel('HoaxModel')
+    data = m.simulate(TIMES)
+    del m.pv
+    del m.S
+    cand = bank.candidates(m, data, k=2)
+    assert cand.shape == (2, 2)
+    numpy.testing.assert_allclose(cand[0], [0.01, 9000])
+    # the candidates are tried before the random initial guesses
+    numpy.random.seed(0)
+    m.fit(data, nrep=2, candidates=cand)
+    assert len(m.trace_) == 4
+    assert m.trace_[0][-1] < 1e-6
+    numpy.testing.assert_allclose(m.pv, 0.01, rtol=1e-4)
+
+
+def test_hit():
+    m = makemodel('HoaxModel')
+    assert not hit(m, 2)
+    m.trace_ = [[5.0], [1.0], [3.0]]
+    assert hit(m, 2)
+    assert not hit(m, 1)
+    assert not hit(m, 0)
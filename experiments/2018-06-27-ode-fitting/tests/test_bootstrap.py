@@ -0,0 +1,59 @@
+""" Tests of the bootstrap of the fitted variables. """
+
+import numpy
+import pytest
+
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+
+
+@pytest.fixture
+def fitted():
+    """ A fit of pv and tauinv to noisy data. """
+    rng = numpy.random.RandomState(0)
+    data = makemodel('HoaxModel').simulate(TIMES)
+    data = data * (1 + 0.05 * rng.randn(*data.shape))
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    numpy.random.seed(0)
+    m.fit(data, nrep=2)
+    return m, data
+
+
+@pytest.mark.parametrize('method', ['residual', 'parametric'])
+def test_bootstrap(fitted, method):
+    m, data = fitted
+    pv, tauinv = m.pv, m.tauinv
+    ci = m.bootstrap(data, nboot=20, method=method, seed=1, check=10)
+    for name, value in [('pv', pv), ('tauinv', tauinv)]:
+        lo, hi = ci[name]
+        assert lo < value < hi
+    assert (m.pv, m.tauinv) == (pv, tauinv)
+    boot = m.bootstrap_
+    assert boot['x'].shape == (20, 2)
+    assert boot['curves'].shape == (20, len(TIMES), 2)
+    lo, hi = boot['band']
+    assert (lo <= hi).all()
+
+
+def test_bootstrap_parallel(fitted):
+    m, data = fitted
+    serial = m.bootstrap(data, nboot=12, seed=1, check=6)
+    x = m.bootstrap_['x']
+    parallel = m.bootstrap(data, nboot=12, seed=1, check=6, n_jobs=2)
+    assert parallel == serial
+    numpy.testing.assert_array_equal(m.bootstrap_['x'], x)
+
+
+def test_early_stop(fitted):
+    m, data = fitted
+    m.bootstrap(data, nboot=200, seed=1, check=10, tol=1.0)
+    assert len(m.bootstrap_['x']) < 200
+
+
+def test_not_fitted():
+    m = makemodel('HoaxModel')
+    with pytest.raises(ValueError, match="not fitted"):
+        m.bootstrap(m.simulate(TIMES))
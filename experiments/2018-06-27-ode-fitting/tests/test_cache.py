@@ -0,0 +1,57 @@
+""" Tests of the simulation cache of the models (see `models.cache`). """
+
+import numpy
+
+from conftest import makemodel
+from models.cache import SimulationCache
+
+TIMES = numpy.arange(24)
+
+
+def test_lru():
+    cache = SimulationCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    # b is the least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.info() == (3, 1, 2, 2)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.info().hits == 3
+
+
+def test_disabled():
+    cache = SimulationCache(maxsize=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_simulate():
+    m = makemodel('HoaxModel')
+    y = m.simulate(TIMES)
+    again = m.simulate(TIMES)
+    numpy.testing.assert_array_equal(y, again)
+    assert m.cache_info()[:2] == (1, 1)
+    # the cached array is not handed out
+    again[:] = 0
+    numpy.testing.assert_array_equal(m.simulate(TIMES), y)
+    # other times, options or no cache are not hits
+    m.simulate(TIMES[:10])
+    m.simulate(TIMES, rtol=1e-10)
+    m.simulate(TIMES, cache=False)
+    assert m.cache_info()[:2] == (2, 3)
+
+
+def test_invalidated():
+    m = makemodel('HoaxModel')
+    y = m.simulate(TIMES)
+    m.pv = 0.05
+    assert len(m._cache) == 0
+    changed = m.simulate(TIMES)
+    assert not numpy.allclose(y, changed)
+    numpy.testing.assert_array_equal(changed,
+                                     m.simulate(TIMES, cache=False))
@@ -0,0 +1,107 @@
+""" Tests of the compiler of compartment models (see `models.compiler`). """
+
+import pickle
+
+import numpy
+import pytest
+
+import models
+from conftest import ODE_MODELS, makemodel, perturb
+from models.compiler import compile_model, conserved_groups
+from models.specs import COMPILED, SPECS
+
+SIR_SPEC = {
+    'compartments': ['S', 'I', 'R'],
+    'parameters': {'beta': (0, None), 'mu': (0, None)},
+    'let': {'N': 'S + I + R'},
+    'transitions': [('S', 'I', 'beta * I / N * S'), ('I', 'R', 'mu * I')],
+}
+
+
+def state(model, R, seed=0):
+    rng = numpy.random.RandomState(seed)
+    return rng.uniform(100, 1000, (len(model._y0), R))
+
+
+def rhs(model, y, theta):
+    return numpy.array(numpy.broadcast_arrays(*model.rhs(y, 0.0, theta)))
+
+
+def test_specs():
+    assert sorted(SPECS) == sorted(COMPILED) == ODE_MODELS
+
+
+# The specifications and the hand-written models are maintained side by side:
+# they must describe the same systems.
+@pytest.mark.parametrize('modelcls', ODE_MODELS)
+def test_agrees_with_hand_written(modelcls):
+    hand = makemodel(modelcls)
+    comp = COMPILED[modelcls]
+    R = 4
+    y = state(hand, R)
+    theta = perturb(hand, R).T
+    pairs = [(rhs(comp, y, theta), rhs(hand, y, theta))]
+    for name in ['rhs_jac', 'rhs_dtheta']:
+        pairs.append((getattr(comp, name)(y, 0.0, theta),
+                      getattr(hand, name)(y, 0.0, theta)))
+    for a, b in pairs:
+        numpy.testing.assert_allclose(a, b, rtol=1e-10,
+                                      atol=1e-12 * numpy.abs(b).max())
+    if hand._do_agg:
+        Y = y.T[:, None, :]
+        numpy.testing.assert_array_equal(comp.obs(Y), hand.obs(Y))
+    assert sorted(map(sorted, comp._conserved)) == \
+        sorted(map(sorted, type(hand)._conserved))
+    assert comp._mxstep == type(hand)._mxstep
+
+
+@pytest.mark.parametrize('modelcls', ODE_MODELS)
+def test_simulate(modelcls):
+    hand = makemodel(modelcls)
+    comp = COMPILED[modelcls]()
+    comp.theta = hand.theta
+    comp.y0 = hand.y0
+    times = numpy.arange(48)
+    ref = hand.simulate(times)
+    numpy.testing.assert_allclose(comp.simulate(times), ref, rtol=1e-6,
+                                  atol=1e-6 * numpy.abs(ref).max())
+
+
+def test_standalone():
+    SIR = compile_model(SIR_SPEC, 'SIR')
+    assert issubclass(SIR, models.ODEModel)
+    assert SIR._theta == ['beta', 'mu']
+    assert SIR._y0 == ['S', 'I', 'R']
+    assert SIR._conserved == [[0, 1, 2]]
+    y = numpy.array([900.0, 100.0, 0.0])
+    theta = numpy.array([1.0, 0.5])
+    numpy.testing.assert_allclose(rhs(SIR, y, theta),
+                                  rhs(models.SIR, y, theta))
+
+
+def test_conserved_groups():
+    spec = dict(SIR_SPEC, compartments=['S', 'I', 'R', 'X'])
+    assert sorted(map(sorted, conserved_groups(spec))) == [[0, 1, 2], [3]]
+    spec = dict(SIR_SPEC, transitions=SIR_SPEC['transitions'] +
+                [('R', None, 'mu * R')])
+    assert conserved_groups(spec) == []
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        compile_model(dict(SIR_SPEC, compartments=['S', 'I', 'y']), 'Bad')
+    with pytest.raises(ValueError):
+        compile_model(dict(SIR_SPEC, transitions=[('S', 'X', 'beta * S')]),
+                      'Bad')
+    with pytest.raises(ValueError):
+        compile_model(SIR_SPEC, 'Bad', base=models.HoaxModel)
+    with pytest.raises(TypeError):
+        compile_model(SIR_SPEC, 'Bad', base=object)
+
+
+def test_pickle():
+    m = COMPILED['SIR']()
+    m.beta = 1.0
+    m2 = pickle.loads(pickle.dumps(m))
+    assert type(m2) is type(m)
+    assert m2.beta == 1.0
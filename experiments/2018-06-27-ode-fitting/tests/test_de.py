@@ -0,0 +1,28 @@
+""" Tests of the global search of a fit by differential evolution. """
+
+import numpy
+
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+
+
+def test_de():
+    ref = makemodel('HoaxModel')
+    data = ref.simulate(TIMES)
+    m = makemodel('HoaxModel')
+    names = ['pv', 'tauinv', 'alpha', 'BI']
+    for name in names:
+        delattr(m, name)
+    idx = m._unknowns()
+    lower, upper = m._lower[idx], m._upper[idx]
+    numpy.random.seed(0)
+    m.fit(data, method='de', de_options={'maxiter': 20, 'popsize': 8})
+    # the population stays in the unit hypercube, mapped to the bounds
+    assert ((m.de_.x >= 0) & (m.de_.x <= 1)).all()
+    x = numpy.array([getattr(m, name) for name in names])
+    assert ((x >= lower) & (x <= upper)).all()
+    assert len(m.trace_) == 1
+    numpy.testing.assert_allclose([m.pv, m.tauinv, m.alpha],
+                                  [ref.pv, ref.tauinv, ref.alpha], rtol=1e-2)
+
@@ -0,0 +1,39 @@
+""" Tests of the designs of the initial guesses (see `models.designs`). """
+
+import numpy
+import pytest
+
+from models.designs import DESIGNS, sample, tobox
+
+
+@pytest.mark.parametrize('design', sorted(DESIGNS))
+def test_sample(design):
+    numpy.random.seed(0)
+    lower = [0.0, 1.0, 0.0]
+    upper = [1.0, 3.0, numpy.inf]
+    x = sample(design, 16, lower, upper, scale=[1.0, 1.0, 100.0])
+    assert x.shape == (16, 3)
+    assert ((x >= lower) & (x <= upper)).all()
+    # unbounded coordinates are within two decades of the scale
+    assert ((x[:, 2] >= 1.0) & (x[:, 2] <= 1e4)).all()
+    numpy.random.seed(0)
+    numpy.testing.assert_array_equal(
+        x, sample(design, 16, lower, upper, scale=[1.0, 1.0, 100.0]))
+
+
+def test_lhs_strata():
+    numpy.random.seed(0)
+    u = DESIGNS['lhs'](10, 2)
+    for j in range(2):
+        assert sorted(numpy.floor(u[:, j] * 10)) == list(range(10))
+
+
+def test_tobox():
+    u = numpy.array([[0.0, 0.5], [1.0, 1.0]])
+    x = tobox(u, [2.0, 0.0], [4.0, numpy.inf], scale=10.0, decades=1)
+    numpy.testing.assert_allclose(x, [[2.0, 10.0], [4.0, 100.0]])
+
+
+def test_unknown():
+    with pytest.raises(ValueError, match="No such design"):
+        sample('grid', 4, [0.0], [1.0])
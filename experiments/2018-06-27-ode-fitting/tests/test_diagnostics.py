@@ -0,0 +1,79 @@
+""" Tests of the invariant monitor (see `models.diagnostics`). """
+
+import numpy
+
+from conftest import makemodel, perturb
+from models.diagnostics import Diagnostics
+
+TIMES = numpy.arange(48)
+
+
+def stacked(dys):
+    """ A derivative returning the (R, N) rows of dys, stored contiguously. """
+    def func(y, t):
+        return numpy.asarray(dys, dtype=float).ravel()
+    return func
+
+
+def test_rhs_single():
+    d = Diagnostics()
+    func = d.wrap(lambda y, t: [1.0, -1.0, 0.0], 'full')
+    func(None, 0.0)
+    assert (d.rhs_checks, d.rhs_mass) == (1, 0)
+    func = d.wrap(lambda y, t: [1.0, 1.0, 0.0], 'full')
+    func(None, 0.0)
+    assert (d.rhs_checks, d.rhs_mass) == (2, 1)
+
+
+def test_rhs_batch_errors_do_not_cancel():
+    # the errors of the two systems sum to zero over the whole stack
+    d = Diagnostics()
+    d.wrap(stacked([[1.0, 0.0, 0.0], [-1.0, 0.0, 0.0]]), 'full',
+           nblock=3)(None, 0.0)
+    assert d.rhs_mass == 1
+
+
+def test_rhs_batch_error_not_diluted():
+    # one bad system among many large, conserving ones
+    dys = [[1e6, -1e6, 0.0]] * 99 + [[1.0, 0.0, 0.0]]
+    d = Diagnostics()
+    d.wrap(stacked(dys), 'full', nblock=3)(None, 0.0)
+    assert d.rhs_mass == 1
+    d = Diagnostics()
+    d.wrap(stacked(dys[:-1]), 'full', nblock=3)(None, 0.0)
+    assert d.rhs_mass == 0
+
+
+def test_sampled():
+    d = Diagnostics(every=10)
+    func = d.wrap(lambda y, t: [1.0, 0.0], 'sampled')
+    for i in range(25):
+        func(None, 0.0)
+    assert (d.rhs_calls, d.rhs_checks, d.rhs_mass) == (25, 2, 2)
+
+
+def test_trajectory():
+    d = Diagnostics()
+    y = numpy.ones((3, 5, 2))
+    y[1, -1] = [2.0, 1.0]
+    y[2, 2] = [-1.0, 3.0]
+    d.check_trajectory(y)
+    assert (d.trajectories, d.traj_mass, d.traj_negative) == (3, 1, 1)
+
+
+def test_simulate_many(refmodel):
+    refmodel.diagnostics = 'full'
+    refmodel.simulate_many(perturb(refmodel, 4), refmodel.y0, TIMES)
+    d = refmodel.diagnostics_
+    assert d.rhs_checks == d.rhs_calls > 0
+    assert d.trajectories == 4
+    assert d.rhs_mass == d.traj_mass == d.traj_negative == 0
+
+
+def test_simulate():
+    m = makemodel('HoaxModel')
+    m.diagnostics = 'full'
+    m.simulate(TIMES)
+    d = m.diagnostics_
+    assert d.rhs_checks == d.rhs_calls > 0
+    assert d.rhs_mass == d.traj_mass == 0
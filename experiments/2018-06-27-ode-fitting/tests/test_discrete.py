@@ -0,0 +1,68 @@
+""" Tests of the discrete-time models (see `models.discrete`). """
+
+import numpy
+import pytest
+
+import models
+from conftest import makemodel, perturb
+from models.discrete import iterate
+
+DISCRETE_MODELS = ['ProbHoaxModel', 'ProbSegHoaxModel']
+
+TIMES = numpy.arange(48)
+
+
+def discrete(modelcls):
+    """ A discrete-time model with the values of its O.D.E. counterpart. """
+    m = getattr(models, modelcls)()
+    ref = makemodel(modelcls[len('Prob'):])
+    m.theta = ref.theta
+    m.y0 = ref.y0
+    return m
+
+
+def test_iterate():
+    y = iterate(lambda y, t: 2 * y, [1.0, 3.0], [0, 3, 1])
+    numpy.testing.assert_array_equal(y, [[1, 3], [8, 24], [2, 6]])
+
+
+def test_iterate_threshold():
+    y = iterate(lambda y, t: y - 1, [2.5, 10.0], [0, 1, 2, 3], threshold=1.0)
+    numpy.testing.assert_array_equal(y, [[2.5, 10], [1.5, 9], [0, 8],
+                                         [0, 7]])
+
+
+def test_iterate_times():
+    with pytest.raises(ValueError):
+        iterate(lambda y, t: y, [1.0], [0, 0.5])
+    with pytest.raises(ValueError):
+        iterate(lambda y, t: y, [1.0], [-1, 0])
+
+
+@pytest.mark.parametrize('modelcls', DISCRETE_MODELS)
+def test_batch_equals_loop(modelcls):
+    m = discrete(modelcls)
+    thetas = perturb(m, 5)
+    y = m.simulate_many(thetas, m.y0, TIMES, full=True)
+    for theta, yr in zip(thetas, y):
+        m.theta = theta
+        numpy.testing.assert_allclose(yr, m.simulate(TIMES, full=True),
+                                      rtol=1e-12)
+
+
+@pytest.mark.parametrize('modelcls', DISCRETE_MODELS)
+def test_mass(modelcls):
+    m = discrete(modelcls)
+    y = m.simulate(TIMES, full=True)
+    total = y.sum(axis=1)
+    numpy.testing.assert_allclose(total, total[0], rtol=1e-9)
+    assert (y >= 0).all()
+
+
+def test_registry():
+    for name in models.MODELS:
+        M = getattr(models, name)
+        assert issubclass(M, models.ODEModel)
+    # it has no observables and no inity0, so it cannot be fit
+    assert 'UnifiedModel' not in models.MODELS
+    assert issubclass(models.UnifiedModel, models.DiscreteModel)
@@ -0,0 +1,85 @@
+""" Tests of the on-disk cache of the fits of fit.py (see `fitcache`). """
+
+import os
+
+import numpy
+import pandas
+import pytest
+
+from conftest import makemodel
+from fitcache import FitCache, filedigest, fitkey
+
+OPTIONS = {'solver': 'lsoda', 'design': None, 'bank': None}
+
+
+@pytest.fixture
+def df():
+    index = pandas.date_range('2018-01-01', periods=5, freq='h',
+                              name='timestamp')
+    return pandas.DataFrame({'fake': [1.0, 2, 3, 4, 5],
+                             'fact': [0.0, 1, 1, 2, 3]}, index=index)
+
+
+def key(df, **kwargs):
+    args = dict(story=1, modelcls='HoaxModel', fity0='non-obs', seed=42,
+                options=OPTIONS)
+    args.update(kwargs)
+    return fitkey(df, **args)
+
+
+def test_key_stable(df):
+    assert key(df) == key(df.copy())
+    # the order of the options does not matter
+    assert key(df) == key(df, options=dict(reversed(list(OPTIONS.items()))))
+
+
+def test_key_changes(df):
+    keys = {key(df)}
+    changed = df.copy()
+    changed.iloc[2, 0] += 1
+    keys.add(key(changed))
+    keys.add(key(df.rename(columns={'fact': 'other'})))
+    keys.add(key(df, story=2))
+    keys.add(key(df, modelcls='SEIZ'))
+    keys.add(key(df, fity0='all'))
+    keys.add(key(df, seed=None))
+    keys.add(key(df, options=dict(OPTIONS, solver='bdf')))
+    keys.add(key(df, options=dict(OPTIONS, bank='0' * 64)))
+    assert len(keys) == 9
+
+
+def test_hit_and_miss(tmp_path):
+    cache = FitCache(str(tmp_path))
+    m = makemodel('HoaxModel')
+    assert cache.get('ab' * 32) is None
+    path = cache.put('ab' * 32, m, story=1)
+    assert os.path.exists(path)
+    hit = cache.get('ab' * 32)
+    assert type(hit) is type(m)
+    numpy.testing.assert_array_equal(hit.theta, m.theta)
+    assert cache.get('cd' * 32) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.hitrate() == pytest.approx(1 / 3)
+    # no temporary files are left
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+def test_unreadable(tmp_path):
+    cache = FitCache(str(tmp_path))
+    path = cache.put('ef' * 32, None)
+    with open(path, 'wb') as f:
+        f.write(b'truncated')
+    assert cache.get('ef' * 32) is None
+    assert cache.misses == 1
+
+
+def test_filedigest(tmp_path):
+    path = str(tmp_path / 'bank.pickle')
+    assert filedigest(path) is None
+    with open(path, 'wb') as f:
+        f.write(b'one')
+    one = filedigest(path)
+    assert one == filedigest(path)
+    with open(path, 'wb') as f:
+        f.write(b'two')
+    assert filedigest(path) != one
@@ -0,0 +1,95 @@
+""" Tests of the grid runs of fit.py (several models and ways to fit y0). """
+
+import glob
+import json
+
+import numpy
+import pandas
+import pytest
+
+import fit
+
+GRID_MODELS = ['HoaxModel', 'ProbHoaxModel']
+GRID_FITY0 = ['non-obs', 'none']
+
+
+def test_checkgrid():
+    assert fit.checkgrid([(m, f) for m in fit.AVAIL_MODELS if m != 'SIR'
+                          for f in ['all', 'none', 'non-obs']]) == []
+    problems = fit.checkgrid([('HoaxModel', 'none'), ('SIR', 'non-obs'),
+                              ('SIR', 'all')])
+    assert len(problems) == 2
+    assert problems[0].startswith("SIR has 3 observables")
+    assert problems[1].startswith("SIR cannot fit y0 with non-obs")
+
+
+def test_main_rejects_grid(rundir, datapath):
+    with pytest.raises(ValueError, match="SIR cannot fit y0"):
+        fit.main(datapath, modelcls=['HoaxModel', 'SIR'],
+                 fity0=['non-obs'], no_plots=True)
+    # nothing was fit
+    assert glob.glob(str(rundir / 'models-*')) == []
+
+
+def test_resultstable(tmp_path):
+    scores = {}
+    for story, aics in [(1, [3.0, 1.0, 2.0]), (2, [5.0, 5.0, 4.0])]:
+        for modelcls, aic in zip(['A', 'B', 'C'], aics):
+            values = dict.fromkeys(fit.SCORES, 0.0)
+            values['aic'] = aic
+            scores[fit.Cell(story, modelcls, 'all')] = values
+    path = str(tmp_path / 'results.csv')
+    fit.resultstable(scores, {fit.Cell(2, 'C', 'all')}, path)
+    table = pandas.read_csv(path)
+    assert list(table['story']) == [1, 1, 1, 2, 2, 2]
+    assert list(table['modelcls']) == ['B', 'C', 'A', 'C', 'A', 'B']
+    assert list(table['rank']) == [1, 2, 3, 1, 2, 2]
+    assert list(table['cached']) == [False] * 3 + [True, False, False]
+
+
+def test_grid(rundir, datapath):
+    kwargs = dict(modelcls=GRID_MODELS, fity0=GRID_FITY0, seed=1,
+                  no_plots=True, cache_dir=str(rundir / 'cache'))
+    fit.main(datapath, **kwargs)
+    table = pandas.read_csv(glob.glob(str(rundir / 'results-grid-*.csv'))[0])
+    assert len(table) == 2 * len(GRID_MODELS) * len(GRID_FITY0)
+    assert not table['cached'].any()
+    assert numpy.isfinite(table[fit.SCORES]).all().all()
+    for story, rows in table.groupby('story'):
+        assert (numpy.diff(rows['aic']) >= 0).all()
+        assert rows['rank'].iloc[0] == 1
+    # one pickle per model and fity0, in the format of a single run
+    for m in GRID_MODELS:
+        for f in GRID_FITY0:
+            path, = glob.glob(str(rundir / 'models-{}-{}-*.pickle'.format(
+                m, f)))
+            obj = pandas.read_pickle(path)
+            assert (obj['modelcls'], obj['fity0']) == (m, f)
+            assert sorted(obj['models']) == [3, 7]
+    records = [json.loads(line) for line in
+               open(glob.glob(str(rundir / 'grid-*.jsonl'))[0])]
+    assert len(records) == len(table)
+    # a second run finds all the fits in the cache, with the same scores
+    fit.main(datapath, **kwargs)
+    again = pandas.read_csv(glob.glob(str(rundir / 'results-grid-*.csv'))[0])
+    assert again['cached'].all()
+    numpy.testing.assert_allclose(again['aic'], table['aic'])
+
+
+def test_grid_jobs(rundir, datapath):
+    # fits on workers give the same results as in this process
+    results = []
+    for jobs in [None, 2]:
+        fit.main(datapath, modelcls=['HoaxModel'], fity0=GRID_FITY0, seed=1,
+                 no_plots=True, jobs=jobs)
+        path, = glob.glob(str(rundir / 'results-grid-*.csv'))
+        results.append(pandas.read_csv(path))
+    pandas.testing.assert_frame_equal(results[0], results[1])
+
+
+def test_makegrid():
+    # a name is a list of one name, as on the command line by default
+    assert fit.makegrid('HoaxModel', 'none') == (
+        ['HoaxModel'], ['none'], [('HoaxModel', 'none')])
+    assert fit.makegrid(['SIR', 'SEIZ'], 'all')[2] == [('SIR', 'all'),
+                                                       ('SEIZ', 'all')]
@@ -0,0 +1,95 @@
+""" Tests of the counters of the work of a fit (see `models.instrument`). """
+
+import numpy
+import pytest
+
+from conftest import makemodel
+from models.instrument import FitStats
+
+TIMES = numpy.arange(48)
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    ref = makemodel('HoaxModel')
+    data = ref.simulate(TIMES)
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.alpha
+    numpy.random.seed(0)
+    m.fit(data, nrep=2)
+    return m, data
+
+
+def test_snapshot():
+    stats = FitStats()
+    stats.record(10, 2)
+    stats.restarts.append({'nfev': 3})
+    copy = stats.snapshot()
+    stats.record(5, 1, failed=True)
+    stats.restarts[0]['nfev'] = 4
+    assert copy.counts() == {'integrations': 1, 'rhs_calls': 10,
+                             'jac_calls': 2, 'failures': 0}
+    assert copy.restarts == [{'nfev': 3}]
+
+
+def test_fit(fitted):
+    m, data = fitted
+    stats = m.fitstats_
+    assert len(stats.restarts) == 2
+    assert stats.integrations > 0
+    assert stats.rhs_calls > 0
+    assert stats.fit_time > 0
+    assert sum(rec['nfev'] for rec in stats.restarts) == m.nfev_
+    assert sum(rec['integrations'] for rec in stats.restarts) == \
+        stats.integrations
+
+
+def test_scoring_not_counted(fitted):
+    m, data = fitted
+    before = m.fitstats_.counts()
+    m.error(data, metric=['aic', 'rmse'])
+    m.simulate(TIMES, cache=False)
+    assert m.fitstats_.counts() == before
+    assert m.stats_.integrations >= before['integrations'] + 1
+
+
+def test_workers_counted():
+    data = makemodel('HoaxModel').simulate(TIMES)
+    fits = []
+    for n_jobs in [None, 2]:
+        m = makemodel('HoaxModel')
+        del m.pv
+        del m.tauinv
+        numpy.random.seed(0)
+        fits.append(m.fit(data, nrep=3, n_jobs=n_jobs))
+    serial, parallel = fits
+    assert parallel.fitstats_.counts() == serial.fitstats_.counts()
+    assert [r['nfev'] for r in parallel.fitstats_.restarts] == \
+        [r['nfev'] for r in serial.fitstats_.restarts]
+
+
+def test_race_budget():
+    data = makemodel('HoaxModel').simulate(TIMES)
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    numpy.random.seed(1)
+    m.fit(data, nrep=9, race=(3, 6))
+    # one record per run of least squares: 9 + 3 in the rounds, then the
+    # polish of the winner
+    restarts = m.fitstats_.restarts
+    assert len(restarts) == 13
+    assert all(r['nfev'] <= 6 for r in restarts[:-1])
+
+
+def test_de_batches():
+    # each generation is integrated as one batch
+    data = makemodel('HoaxModel').simulate(TIMES)
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    numpy.random.seed(0)
+    m.fit(data, method='de', de_options={'maxiter': 5, 'popsize': 10})
+    polish = sum(r['integrations'] for r in m.fitstats_.restarts)
+    assert m.fitstats_.integrations - polish <= m.de_.nit + 1
@@ -0,0 +1,89 @@
+""" Tests of the analytic Jacobians of the built-in models. """
+
+import numpy
+
+from conftest import perturb
+
+# Relative step of the central differences
+EPS = 1e-6
+
+
+def state(model, R=None, seed=0):
+    """ A random state with all compartments positive. """
+    rng = numpy.random.RandomState(seed)
+    N = len(model._y0)
+    shape = (N,) if R is None else (N, R)
+    return rng.uniform(100, 1000, shape)
+
+
+def rhs(model, y, theta):
+    return numpy.array(numpy.broadcast_arrays(*model.rhs(y, 0.0, theta)))
+
+
+def numjac(model, y, theta):
+    """ Central differences of rhs with respect to y, an (N, N, ...) array. """
+    J = numpy.empty((len(y), ) + y.shape)
+    for j in range(len(y)):
+        h = EPS * numpy.abs(y[j])
+        yp = y.copy()
+        ym = y.copy()
+        yp[j] += h
+        ym[j] -= h
+        J[:, j] = (rhs(model, yp, theta) - rhs(model, ym, theta)) / (2 * h)
+    return J
+
+
+def numdtheta(model, y, theta):
+    """ Central differences of rhs with respect to theta, (N, P, ...). """
+    D = numpy.empty((len(y), len(theta)) + y.shape[1:])
+    for p in range(len(theta)):
+        h = EPS * numpy.abs(theta[p])
+        tp = theta.copy()
+        tm = theta.copy()
+        tp[p] += h
+        tm[p] -= h
+        D[:, p] = (rhs(model, y, tp) - rhs(model, y, tm)) / (2 * h)
+    return D
+
+
+def assert_close(analytic, numeric):
+    scale = numpy.abs(numeric).max()
+    numpy.testing.assert_allclose(analytic, numeric, rtol=1e-5,
+                                  atol=1e-6 * scale)
+
+
+def test_rhs_jac(refmodel):
+    y = state(refmodel)
+    theta = refmodel.theta
+    J = refmodel.rhs_jac(y, 0.0, theta)
+    assert J.shape == (len(y), len(y))
+    assert_close(J, numjac(refmodel, y, theta))
+
+
+def test_rhs_jac_batch(refmodel):
+    R = 4
+    y = state(refmodel, R)
+    theta = perturb(refmodel, R).T
+    J = refmodel.rhs_jac(y, 0.0, theta)
+    assert J.shape == (len(y), len(y), R)
+    assert_close(J, numjac(refmodel, y, theta))
+    # each block is the Jacobian of its system
+    for r in range(R):
+        assert_close(J[..., r], refmodel.rhs_jac(y[:, r], 0.0, theta[:, r]))
+
+
+def test_rhs_dtheta(refmodel):
+    y = state(refmodel)
+    theta = refmodel.theta
+    D = refmodel.rhs_dtheta(y, 0.0, theta)
+    assert D.shape == (len(y), len(theta))
+    assert_close(D, numdtheta(refmodel, y, theta))
+
+
+def test_rhs_dtheta_batch(refmodel):
+    R = 4
+    y = state(refmodel, R)
+    theta = perturb(refmodel, R).T
+    D = refmodel.rhs_dtheta(y, 0.0, theta)
+    assert D.shape == (len(y), len(theta), R)
+    assert_close(D, numdtheta(refmodel, y, theta))
@@ -0,0 +1,40 @@
+""" Tests of the restarts of a fit on worker processes. """
+
+import numpy
+
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+UNKNOWNS = ['pv', 'tauinv', 'BI']
+
+
+def fit(**kwargs):
+    data = makemodel('HoaxModel').simulate(TIMES)
+    m = makemodel('HoaxModel')
+    for name in UNKNOWNS:
+        delattr(m, name)
+    numpy.random.seed(0)
+    return m.fit(data, nrep=4, **kwargs)
+
+
+def test_parallel_equals_serial():
+    serial = fit()
+    parallel = fit(n_jobs=2)
+    numpy.testing.assert_array_equal(parallel.theta, serial.theta)
+    numpy.testing.assert_array_equal(parallel.y0, serial.y0)
+    assert parallel.cost_ == serial.cost_
+    assert parallel.trace_ == serial.trace_
+    assert parallel.nfev_ == serial.nfev_
+
+
+def test_executor():
+    calls = []
+
+    def executor(**kwargs):
+        import concurrent.futures
+        calls.append(sorted(kwargs))
+        return concurrent.futures.ProcessPoolExecutor(**kwargs)
+
+    m = fit(n_jobs=2, executor=executor)
+    assert calls == [['initargs', 'initializer', 'max_workers']]
+    assert numpy.isfinite(m.cost_)
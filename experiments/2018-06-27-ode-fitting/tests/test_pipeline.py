@@ -0,0 +1,129 @@
+""" Tests of the stages of a pipelined run of fit.py (see `pipeline`). """
+
+import os
+import glob
+import time
+import logging
+
+import pytest
+
+import fit
+import pipeline
+
+
+def slow(key):
+    time.sleep(0.2)
+
+
+def say(key, text):
+    logging.getLogger().info(text)
+
+
+def fail(key):
+    raise ValueError("cannot render {}".format(key))
+
+
+def die(key):
+    os._exit(3)
+
+
+def items():
+    yield 1
+    yield 2
+    raise ValueError("bad item")
+
+
+def test_prefetch():
+    reader = pipeline.Prefetch(range(5), size=2)
+    assert list(reader) == list(range(5))
+    assert reader.count == 5
+    with pytest.raises(ValueError, match="bad item"):
+        list(pipeline.Prefetch(items()))
+
+
+def test_backpressure():
+    consumer = pipeline.Consumer(slow, size=1)
+    for k in range(4):
+        consumer.put(k)
+    consumer.close()
+    assert consumer.count == 4
+    # the queue holds one item: the producer waited for the consumer
+    assert consumer.waited > 0.2
+    assert consumer.busy >= 0.8
+
+
+def test_logs(caplog):
+    caplog.set_level(logging.INFO)
+    consumer = pipeline.Consumer(say, name='story')
+    consumer.put(3, "hello")
+    consumer.put(7, "world")
+    consumer.close()
+    assert "[story 3] hello" in caplog.messages
+    assert "[story 7] world" in caplog.messages
+
+
+def test_error(caplog):
+    caplog.set_level(logging.INFO)
+    consumer = pipeline.Consumer(fail, name='story')
+    consumer.put(3)
+    consumer.put(7)
+    consumer.close()
+    # the process goes on with the next items
+    assert consumer.count == 2
+    errors = [r for r in caplog.records if r.getMessage().startswith(
+        "[story 3] Exception:")]
+    assert len(errors) == 1
+    assert "cannot render 3" in caplog.text
+
+
+def test_died():
+    consumer = pipeline.Consumer(die)
+    consumer.put(1)
+    tic = time.monotonic()
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        for k in range(10):
+            consumer.put(k)
+    assert time.monotonic() - tic < 30
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        consumer.close()
+
+
+def test_render(rundir, datapath, caplog):
+    caplog.set_level(logging.INFO)
+    fit.main(datapath, stories=[3], seed=1, headless=True)
+    path, = glob.glob(str(rundir / 'fig-HoaxModel-*-03.pdf'))
+    assert os.path.getsize(path) > 0
+    # the report and plot of the render process are in the log
+    prefix = "[story 3 (HoaxModel, non-obs)] "
+    messages = [m[len(prefix):] for m in caplog.messages
+                if m.startswith(prefix)]
+    assert any("MAPE:" in m for m in messages)
+    assert "Written: {}".format(os.path.basename(path)) in messages
+    assert any("render: 1 in" in m for m in caplog.messages)
+
+
+def test_render_error(rundir, datapath, caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    # the figure cannot be written by the render process
+    monkeypatch.setattr(fit, 'OPATH_FIG', os.path.join('missing', 'fig.pdf'))
+    fit.main(datapath, stories=[3], seed=1, headless=True)
+    # with the traceback, as formatted by the render process
+    assert any(m.startswith("[story 3 (HoaxModel, non-obs)] Exception:")
+               for m in caplog.messages)
+    assert "No such file or directory" in caplog.text
+    assert glob.glob(str(rundir / 'models-HoaxModel-*.pickle'))
+
+
+def test_interactive(rundir, datapath, caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    # figures are plotted in this process, and shown at the end
+    monkeypatch.setattr(fit, 'interactive', lambda: True)
+    shown = []
+    plt = fit.pyplot()
+    monkeypatch.setattr(plt, 'show', lambda: shown.append(plt.get_fignums()))
+    fit.main(datapath, stories=[3], seed=1, headless=True)
+    assert len(shown) == 1 and len(shown[0]) == 1
+    assert glob.glob(str(rundir / 'fig-HoaxModel-*-03.pdf'))
+    assert any("MAPE:" in m for m in caplog.messages)
+    assert not any("render:" in m for m in caplog.messages)
+    plt.close("all")
@@ -0,0 +1,74 @@
+""" Tests of the ensemble sampler of the posterior of a model. """
+
+import numpy
+import pytest
+
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    """ A fit of pv and tauinv to noisy data. """
+    rng = numpy.random.RandomState(0)
+    data = makemodel('HoaxModel').simulate(TIMES)
+    data = data * (1 + 0.05 * rng.randn(*data.shape))
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    numpy.random.seed(0)
+    m.fit(data, nrep=2)
+    return m, data
+
+
+@pytest.mark.parametrize('nwalkers', [10, 13])
+def test_nwalkers(nwalkers):
+    # six unknowns: at least twelve walkers, in two halves
+    m = makemodel('HoaxModel')
+    for name in ['pv', 'tauinv', 'alpha', 'BI', 'FI', 'S']:
+        delattr(m, name)
+    data = makemodel('HoaxModel').simulate(TIMES)
+    with pytest.raises(ValueError, match="nwalkers"):
+        m.sample_posterior(data, nwalkers=nwalkers, nsteps=1)
+
+
+def test_mean(fitted):
+    m, data = fitted
+    x_hat = numpy.array([m.pv, m.tauinv])
+    del m.pv
+    del m.tauinv
+    try:
+        numpy.random.seed(1)
+        m.sample_posterior(data, nwalkers=16, nsteps=400, x0=x_hat,
+                           burn=100)
+    finally:
+        m.pv, m.tauinv = x_hat
+    assert m.sampled_ == ['pv', 'tauinv']
+    assert m.chain_.shape == (400, 16, 2)
+    assert ((m.acceptance_ > 0.1) & (m.acceptance_ < 0.9)).all()
+    samples = m.chain_[100:].reshape(-1, 2)
+    mean = samples.mean(axis=0)
+    std = samples.std(axis=0)
+    # the posterior is close to Gaussian around the least squares estimate
+    assert (numpy.abs(mean - x_hat) < 0.5 * std).all()
+    assert (std < 0.1 * x_hat).all()
+    # the walkers stay within bounds
+    assert (samples >= 0).all() and (samples <= 1).all()
+
+
+def test_path(fitted, tmp_path):
+    m, data = fitted
+    x_hat = numpy.array([m.pv, m.tauinv])
+    del m.pv
+    del m.tauinv
+    path = str(tmp_path / 'chain.npy')
+    try:
+        numpy.random.seed(2)
+        m.sample_posterior(data, nwalkers=8, nsteps=5, x0=x_hat, path=path)
+    finally:
+        m.pv, m.tauinv = x_hat
+    chain = numpy.load(path)
+    assert chain.shape == (5, 8, 3)
+    numpy.testing.assert_array_equal(chain[:, :, :2], m.chain_)
+    numpy.testing.assert_array_equal(chain[:, :, 2], m.lnprob_)
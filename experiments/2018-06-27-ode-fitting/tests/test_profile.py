@@ -0,0 +1,54 @@
+""" Tests of the profile likelihood of the fitted variables. """
+
+import numpy
+import pytest
+
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+
+
+@pytest.fixture
+def fitted():
+    """ A fit of pv and tauinv to noisy data. """
+    rng = numpy.random.RandomState(0)
+    data = makemodel('HoaxModel').simulate(TIMES)
+    data = data * (1 + 0.05 * rng.randn(*data.shape))
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    numpy.random.seed(0)
+    m.fit(data, nrep=2)
+    return m, data
+
+
+def test_profile(fitted):
+    m, data = fitted
+    pv, tauinv = m.pv, m.tauinv
+    ci = m.profile(data, npoints=11)
+    assert sorted(ci) == ['pv', 'tauinv']
+    for name, value in [('pv', pv), ('tauinv', tauinv)]:
+        lo, hi = ci[name]
+        assert lo < value < hi
+        # the data identify both parameters
+        assert numpy.isfinite([lo, hi]).all()
+    # the values of the fit are not changed
+    assert (m.pv, m.tauinv) == (pv, tauinv)
+    assert len(m.profiles_['pv']['grid']) == 11
+
+
+@pytest.mark.parametrize('nseg', [1, 2])
+def test_profile_parallel(fitted, nseg):
+    m, data = fitted
+    serial = m.profile(data, name='pv', npoints=9, nseg=nseg)
+    grid = m.profiles_['pv']
+    parallel = m.profile(data, name='pv', npoints=9, nseg=nseg, n_jobs=2)
+    assert parallel == serial
+    for key in grid:
+        numpy.testing.assert_array_equal(m.profiles_['pv'][key], grid[key])
+
+
+def test_not_fitted():
+    m = makemodel('HoaxModel')
+    with pytest.raises(ValueError, match="not fitted"):
+        m.profile(m.simulate(TIMES))
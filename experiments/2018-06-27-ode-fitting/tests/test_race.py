@@ -0,0 +1,44 @@
+""" Tests of the successive-halving race of the restarts of a fit. """
+
+import numpy
+
+from conftest import makemodel
+
+TIMES = numpy.arange(48)
+
+
+def test_race_keeps_best():
+    data = makemodel('HoaxModel').simulate(TIMES)
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    del m.BI
+    numpy.random.seed(1)
+    m.fit(data, nrep=9, race=(3, 6), eta=3)
+    # 9 runs, then 3, then the winner is polished
+    lengths = sorted(len(t) for t in m.trace_)
+    assert lengths == [1] * 6 + [2] * 2 + [3]
+    winner, = [t for t in m.trace_ if len(t) == 3]
+    # the best run of each round goes on
+    for r in range(2):
+        costs = [t[r] for t in m.trace_ if len(t) > r]
+        assert winner[r] == numpy.nanmin(costs)
+    # the survivors of the first round are its best third
+    first = sorted(t[0] for t in m.trace_)
+    assert sorted(t[0] for t in m.trace_ if len(t) > 1) == first[:3]
+    assert m.cost_ <= winner[1]
+    assert m.cost_ == winner[2]
+
+
+def test_race_parallel():
+    data = makemodel('HoaxModel').simulate(TIMES)
+    fits = []
+    for n_jobs in [None, 2]:
+        m = makemodel('HoaxModel')
+        del m.pv
+        del m.tauinv
+        numpy.random.seed(0)
+        fits.append(m.fit(data, nrep=4, race=(5, 15), n_jobs=n_jobs))
+    serial, parallel = fits
+    numpy.testing.assert_array_equal(parallel.theta, serial.theta)
+    assert parallel.trace_ == serial.trace_
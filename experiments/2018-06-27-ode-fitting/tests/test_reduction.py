@@ -0,0 +1,65 @@
+"""
+Tests of the reduction of the state by conservation laws (see
+`models.conservation`).
+"""
+
+import numpy
+import pytest
+
+from conftest import perturb
+from models.conservation import Reduction
+
+TIMES = numpy.arange(48)
+
+
+def test_roundtrip():
+    rng = numpy.random.RandomState(0)
+    y0 = rng.uniform(1, 10, 2 * 6)
+    red = Reduction([[0, 1, 2], [3, 5]], y0, 6)
+    assert red.size == 4
+    z = red.reduce(y0)
+    assert z.shape == (2 * 4, )
+    numpy.testing.assert_allclose(red.expand(z), y0)
+    # several states at once
+    Y = numpy.stack([y0, y0])
+    numpy.testing.assert_allclose(red.expand(red.reduce(Y)), Y)
+
+
+def test_jac():
+    rng = numpy.random.RandomState(0)
+    A = rng.normal(size=(3, 3))
+    # a linear system y' = A y conserving y0 + y1 + y2: columns sum to zero
+    A -= A.mean(axis=0)
+    y0 = rng.uniform(1, 10, 3)
+    red = Reduction([[0, 1, 2]], y0, 3)
+    func = red.func(lambda y, t: A.dot(y))
+    jac = red.jac(lambda y, t: A)
+    z = red.reduce(y0)
+    h = 1e-6
+    numjac = numpy.array([(func(z + h * e, 0.0) - func(z - h * e, 0.0)) /
+                          (2 * h) for e in numpy.eye(2)]).T
+    numpy.testing.assert_allclose(jac(z, 0.0), numjac, rtol=1e-6)
+
+
+def test_simulate(refmodel):
+    ref = refmodel.simulate(TIMES, full=True, cache=False)
+    refmodel.reduced = True
+    y = refmodel.simulate(TIMES, full=True, cache=False)
+    numpy.testing.assert_allclose(y, ref, rtol=1e-4,
+                                  atol=1e-6 * numpy.abs(ref).max())
+    # the totals are conserved exactly, up to rounding
+    for group in refmodel._conserved:
+        total = y[:, group].sum(axis=1)
+        numpy.testing.assert_allclose(total, total[0], rtol=1e-12)
+
+
+@pytest.mark.parametrize('solver', ['lsoda', 'bdf'])
+def test_simulate_many(refmodel, solver):
+    thetas = perturb(refmodel, 4)
+    ref = refmodel.simulate_many(thetas, refmodel.y0, TIMES, full=True,
+                                 solver=solver)
+    refmodel.reduced = True
+    y = refmodel.simulate_many(thetas, refmodel.y0, TIMES, full=True,
+                               solver=solver)
+    numpy.testing.assert_allclose(y, ref, rtol=1e-3,
+                                  atol=1e-5 * numpy.abs(ref).max())
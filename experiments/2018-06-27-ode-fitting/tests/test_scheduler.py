@@ -0,0 +1,139 @@
+""" Tests of the worker processes of fit.py (see `scheduler`). """
+
+import os
+import time
+import logging
+import threading
+
+import numpy
+import pytest
+
+import scheduler
+
+
+def square(x):
+    logging.getLogger().info("squaring {}".format(x))
+    return x * x
+
+
+def draw():
+    return numpy.random.randint(2 ** 31)
+
+
+def fail():
+    raise TypeError("not retried")
+
+
+def crash(path):
+    """ Die without a result the first time, return "ok" the second. """
+    if not os.path.exists(path):
+        open(path, 'w').close()
+        os._exit(1)
+    return "ok"
+
+
+# Workers are not forked from the process of the tests, so they do not
+# inherit this lock in the state it has there (see `test_threads`)
+LOCK = threading.Lock()
+
+
+def locked():
+    with LOCK:
+        return "ok"
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def attempts(caplog, key):
+    prefix = "[task {}] Attempt ".format(key)
+    return [r.getMessage() for r in caplog.records
+            if r.getMessage().startswith(prefix) and ', seed ' in
+            r.getMessage()]
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_order(jobs):
+    tasks = [(k, (k, )) for k in range(6)]
+    assert list(scheduler.run(square, tasks, jobs=jobs)) == \
+        [(k, k * k) for k in range(6)]
+
+
+def test_logs(caplog):
+    caplog.set_level(logging.INFO)
+    list(scheduler.run(square, [('a', (3, ))], name='story'))
+    assert "[story a] squaring 3" in caplog.messages
+
+
+def test_seeds():
+    tasks = [(k, ()) for k in range(4)]
+    one = list(scheduler.run(draw, tasks, jobs=1, seed=42))
+    many = list(scheduler.run(draw, tasks[::-1], jobs=3, seed=42))
+    assert dict(one) == dict(many)
+    assert len(set(dict(one).values())) == 4
+    assert dict(one)[0] == dict(scheduler.run(draw, [(0, ())], seed=42))[0]
+
+
+def test_seedkey():
+    tasks = [((k, m), ()) for k in range(2) for m in 'ab']
+    res = dict(scheduler.run(draw, tasks, seed=1, seedkey=lambda key: key[0]))
+    assert res[0, 'a'] == res[0, 'b'] != res[1, 'a'] == res[1, 'b']
+
+
+def test_error_not_retried(caplog):
+    caplog.set_level(logging.INFO)
+    res = list(scheduler.run(fail, [('f', ())], retries=3, name='task'))
+    assert res == [('f', None)]
+    assert len(attempts(caplog, 'f')) == 1
+    assert any("TypeError: not retried" in m for m in caplog.messages)
+
+
+def test_crash_retried(caplog, tmp_path):
+    caplog.set_level(logging.INFO)
+    path = str(tmp_path / 'crashed')
+    res = list(scheduler.run(crash, [('c', (path, ))], retries=1,
+                             name='task'))
+    assert res == [('c', "ok")]
+    assert len(attempts(caplog, 'c')) == 2
+    assert any("died" in m for m in caplog.messages)
+
+
+def test_timeout_retried(caplog):
+    caplog.set_level(logging.INFO)
+    tic = time.monotonic()
+    res = list(scheduler.run(sleep, [('s', (60, )), ('t', (0, ))], jobs=2,
+                             timeout=1.0, retries=1, name='task'))
+    assert time.monotonic() - tic < 30
+    assert res == [('s', None), ('t', 0)]
+    assert len(attempts(caplog, 's')) == 2
+    assert any("timed out" in m for m in caplog.messages)
+
+
+def test_threads():
+    # a lock held by another thread of this process while the workers start
+    held = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        with LOCK:
+            held.set()
+            done.wait(60)
+
+    thread = threading.Thread(target=hold, daemon=True)
+    thread.start()
+    held.wait()
+    try:
+        res = list(scheduler.run(locked, [(0, ())], timeout=20, retries=0))
+    finally:
+        done.set()
+        thread.join()
+    assert res == [(0, "ok")]
+
+
+def test_timeout_needs_jobs():
+    import fit
+    # fits in this process cannot be stopped
+    with pytest.raises(ValueError, match="timeout"):
+        fit.main('stories.csv', timeout=5.0)
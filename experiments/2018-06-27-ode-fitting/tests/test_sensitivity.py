@@ -0,0 +1,59 @@
+""" Tests of the residual Jacobians by forward sensitivities. """
+
+import numpy
+import pytest
+
+from conftest import ODE_MODELS, makemodel
+
+TIMES = numpy.arange(24)
+
+# The rates of infection of SegHoaxModel grow with the size of the
+# population: with the reference values, all the dynamics happen within
+# the first time step and finite differences are meaningless.
+FRACTIONS = {'SegHoaxModel': {'S_sk': 0.45, 'S_gu': 0.45, 'BA_sk': 0.05,
+                              'BA_gu': 0.05}}
+
+
+def setup(modelcls):
+    """ A model set up as by fit, with all parameters and y0[0] unknown. """
+    m = makemodel(modelcls)
+    for k, val in FRACTIONS.get(modelcls, {}).items():
+        setattr(m, k, val)
+    m.data = m.simulate(TIMES) * 1.1
+    m.times = TIMES
+    x = m.theta.tolist() + [m.y0[0]]
+    for name in m._theta + m._y0[:1]:
+        delattr(m, name)
+    m._fitidx = m._unknowns()
+    return m, numpy.array(x)
+
+
+@pytest.mark.parametrize('modelcls', ODE_MODELS)
+def test_residuals_jac(modelcls):
+    m, x = setup(modelcls)
+    J = m._residuals_jac(x)
+    assert J.shape == (m._residuals(x).size, len(x))
+    # central differences with steps relative to each unknown
+    Jfd = numpy.empty_like(J)
+    for i in range(len(x)):
+        h = 1e-4 * max(abs(x[i]), 1.0)
+        xp, xm = x.copy(), x.copy()
+        xp[i] += h
+        xm[i] -= h
+        Jfd[:, i] = (m._residuals(xp) - m._residuals(xm)) / (2 * h)
+    scale = numpy.abs(Jfd).max(axis=0) + 1e-8
+    numpy.testing.assert_allclose(J / scale, Jfd / scale, atol=1e-4)
+    # the unknowns are reset
+    assert not m._known[m._fitidx].any()
+
+
+def test_fit_sensitivity():
+    ref = makemodel('HoaxModel')
+    data = ref.simulate(TIMES)
+    m = makemodel('HoaxModel')
+    del m.pv
+    del m.tauinv
+    numpy.random.seed(0)
+    m.fit(data, nrep=2, jac='sensitivity')
+    numpy.testing.assert_allclose([m.pv, m.tauinv], [ref.pv, ref.tauinv],
+                                  rtol=1e-3)
@@ -0,0 +1,46 @@
+""" Tests of the batched integration of `ODEModel.simulate_many`. """
+
+import numpy
+import pytest
+
+from conftest import makemodel, perturb
+
+TIMES = numpy.arange(48)
+
+
+def loop(model, thetas, full=False):
+    ys = []
+    for theta in thetas:
+        model.theta = theta
+        ys.append(model.simulate(TIMES, full=full))
+    return numpy.array(ys)
+
+
+@pytest.mark.parametrize('full', [False, True])
+def test_batch_equals_loop(refmodel, full):
+    thetas = perturb(refmodel, 5)
+    y = refmodel.simulate_many(thetas, refmodel.y0, TIMES, full=full)
+    ref = loop(refmodel, thetas, full=full)
+    assert y.shape == ref.shape
+    # LSODA controls the error of the stack with a max-norm, so each system
+    # is integrated at least as accurately as on its own.
+    numpy.testing.assert_allclose(y, ref, rtol=1e-4,
+                                  atol=1e-6 * numpy.abs(ref).max())
+
+
+def test_broadcast():
+    m = makemodel('HoaxModel')
+    thetas = perturb(m, 3)
+    y0s = numpy.tile(m.y0, (3, 1))
+    numpy.testing.assert_array_equal(m.simulate_many(thetas, m.y0, TIMES),
+                                     m.simulate_many(thetas, y0s, TIMES))
+    y = m.simulate_many(m.theta, y0s, TIMES)
+    assert y.shape == (3, len(TIMES), 2)
+    numpy.testing.assert_allclose(y[0], y[2])
+
+
+def test_single_system():
+    m = makemodel('DoubleSIR')
+    y = m.simulate_many(m.theta, m.y0, TIMES)
+    numpy.testing.assert_allclose(y[0], m.simulate(TIMES),
+                                  rtol=1e-6, atol=1e-6)
@@ -0,0 +1,96 @@
+""" Tests of the solver backends (see `models.solvers`). """
+
+import warnings
+
+import numpy
+import pytest
+
+from conftest import makemodel
+from models.instrument import FitStats
+from models.solvers import SOLVERS, SolverWarning, solve
+
+
+def blowup():
+    """ y' = y ** 2, y(0) = 1, whose solution 1 / (1 - t) blows up at 1. """
+    calls = []
+
+    def func(y, t):
+        calls.append(t)
+        return y ** 2
+
+    return func, calls
+
+
+def quiet(*args, **kwargs):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return solve(*args, **kwargs)
+
+
+def test_lsoda_success():
+    func, calls = blowup()
+    times = numpy.linspace(0, 0.5, 6)
+    stats = FitStats()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', SolverWarning)
+        y = solve(func, [1.0], times, stats=stats)
+    numpy.testing.assert_allclose(y[:, 0], 1 / (1 - times), rtol=1e-6)
+    assert stats.integrations == 1
+    assert stats.failures == 0
+    assert 0 < stats.rhs_calls <= len(calls)
+
+
+# the second fails on the last interval
+@pytest.mark.filterwarnings('ignore::scipy.integrate.ODEintWarning')
+@pytest.mark.parametrize('times', [[0, 0.25, 0.5, 1.125, 1.5],
+                                   [0, 0.5, 1.5]])
+def test_lsoda_failure(times):
+    func, calls = blowup()
+    stats = FitStats()
+    with pytest.warns(SolverWarning):
+        y = solve(func, [1.0], times, mxstep=500, stats=stats)
+    assert stats.failures == 1
+    # the counts are those at the point of failure, not garbage
+    assert 0 < stats.rhs_calls <= len(calls)
+    # rows past the failure hold the state at the point of failure
+    k = 1 + numpy.argmax(numpy.asarray(times) >= 1)
+    numpy.testing.assert_array_equal(y[k:], y[k - 1:k].repeat(len(y) - k, 0))
+
+
+def test_lsoda_reproducible():
+    func, _ = blowup()
+    times = [0, 0.25, 0.5, 1.125, 1.5]
+    y1 = quiet(func, [1.0], times, mxstep=500)
+    # leave other values in the work arrays of odeint
+    quiet(func, [2.0], numpy.linspace(0, 0.4, 5))
+    y2 = quiet(func, [1.0], times, mxstep=500)
+    numpy.testing.assert_array_equal(y1, y2)
+
+
+@pytest.mark.parametrize('solver', sorted(SOLVERS))
+def test_backends_agree(solver):
+    m = makemodel('HoaxModel')
+    times = numpy.arange(48)
+    ref = m.simulate(times)
+    m.stats_ = FitStats()
+    y = m.simulate(times, solver=solver, tol='accurate')
+    assert m.stats_.integrations == 1
+    assert m.stats_.rhs_calls > 0
+    assert m.stats_.failures == 0
+    numpy.testing.assert_allclose(y, ref, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize('solver', sorted(SOLVERS))
+def test_same_options(solver):
+    # all backends take a Jacobian and tolerances
+    m = makemodel('HoaxModel')
+    times = numpy.arange(48)
+    y = m.simulate(times, solver=solver, rtol=1e-8, atol=1e-8)
+    numpy.testing.assert_allclose(y, m.simulate(times), rtol=1e-3, atol=1e-3)
+
+
+def test_unknown_solver():
+    with pytest.raises(ValueError):
+        solve(lambda y, t: y, [1.0], [0, 1], solver='euler')
+    with pytest.raises(ValueError):
+        solve(lambda y, t: y, [1.0], [0, 1], tol='exact')
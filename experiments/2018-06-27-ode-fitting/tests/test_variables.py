@@ -0,0 +1,109 @@
+""" Tests of the variables of the models (see `models.base.Variable`). """
+
+import copy
+import pickle
+
+import numpy
+import pytest
+
+import models
+from conftest import makemodel
+
+
+def test_get_set():
+    m = models.HoaxModel()
+    assert numpy.isnan(m.theta).all()
+    with pytest.raises(AttributeError):
+        m.pv
+    m.pv = 0.2
+    m.BA = 10
+    assert m.pv == 0.2
+    assert m.BA == 10
+    assert m.theta[0] == 0.2
+    assert numpy.isnan(m.theta[1:]).all()
+    assert m.y0[m._y0.index('BA')] == 10
+    # stored in the array of variables, not in the instance dictionary
+    assert 'pv' not in m.__dict__
+    assert m._x[m._index['pv']] == 0.2
+
+
+def test_bounds():
+    m = models.HoaxModel()
+    with pytest.raises(ValueError):
+        m.pv = 1.5
+    with pytest.raises(ValueError):
+        m.BA = -1
+    assert not m._known.any()
+
+
+def test_known_unknown():
+    m = makemodel('HoaxModel')
+    assert m._unknowns().size == 0
+    del m.pv
+    del m.S
+    assert list(m._unknowns()) == [m._index['pv'], m._index['S']]
+    with pytest.raises(AttributeError):
+        m.pv
+    with pytest.raises(AttributeError):
+        del m.pv
+    m.pv = 0.01
+    assert list(m._unknowns()) == [m._index['S']]
+
+
+def test_vectors():
+    m = models.SIR()
+    m.theta = [1.0, 0.5]
+    m.y0 = [9000, 1000, 0]
+    assert (m.beta, m.mu) == (1.0, 0.5)
+    assert (m.S, m.I, m.R) == (9000, 1000, 0)
+    numpy.testing.assert_array_equal(m._x, [1.0, 0.5, 9000, 1000, 0])
+
+
+def test_instances_independent():
+    a = makemodel('HoaxModel')
+    b = makemodel('HoaxModel')
+    b.pv = 0.5
+    assert a.pv == 0.01
+    assert a._x is not b._x
+
+
+def test_setting_clears_cache():
+    m = makemodel('HoaxModel')
+    m.simulate(numpy.arange(10))
+    assert len(m._cache) == 1
+    m.alpha = 0.4
+    assert len(m._cache) == 0
+
+
+@pytest.mark.parametrize('dup', [copy.copy, copy.deepcopy,
+                                 lambda m: pickle.loads(pickle.dumps(m))])
+def test_copy(dup):
+    m = makemodel('HoaxModel')
+    del m.pv
+    m.simulate(numpy.arange(10))
+    other = dup(m)
+    assert type(other) is type(m)
+    numpy.testing.assert_array_equal(other._x, m._x)
+    numpy.testing.assert_array_equal(other._known, m._known)
+    with pytest.raises(AttributeError):
+        other.pv
+    # the copy has its own variables and cache
+    other.alpha = 0.1
+    assert m.alpha == 0.5
+    assert len(other._cache) == 0
+    assert len(m._cache) == 1
+
+
+def test_pickle_fitted():
+    ref = makemodel('HoaxModel')
+    data = ref.simulate(numpy.arange(24))
+    m = makemodel('HoaxModel')
+    del m.pv
+    numpy.random.seed(0)
+    m.fit(data, nrep=1)
+    other = pickle.loads(pickle.dumps(m))
+    assert other.pv == m.pv
+    assert other.pv_ == m.pv_
+    numpy.testing.assert_array_equal(other.err_, m.err_)
+    numpy.testing.assert_array_equal(other.simulate(numpy.arange(24)),
+                                     m.simulate(numpy.arange(24)))
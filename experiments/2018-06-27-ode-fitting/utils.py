@@ -1,5 +1,4 @@
 import numpy
-import scipy.linalg
 import warnings
 
 
@@ -7,6 +6,7 @@ def pstderr(res):
     """
     Compute standard error of the fitted parameters
     """
+    import scipy.linalg
     # Code adapted from: scipy.optimize.curve_fit
     # Do Moore-Penrose inverse discarding zero singular values.
     _, s, VT = scipy.linalg.svd(res.jac, full_matrices=False)
@@ -125,3 +125,49 @@ def logaccratio(x, y, frac=False):
         return err
     else:
         return 100 * err
+
+
+def autocorr_time(chain, c=5.0):
+    """
+    Integrated autocorrelation time of each parameter of an ensemble MCMC
+    chain.
+
+    Parameters
+    ==========
+    chain : ndarray
+        An (S, W, M) array of S steps of W walkers in M dimensions.
+
+    c : float
+        Window factor, see notes. (Default: 5.)
+
+    Returns
+    =======
+    tau : ndarray
+        An (M,) array with the autocorrelation times, in steps.
+
+    Notes
+    =====
+    The autocorrelation function is computed with FFT and averaged over
+    walkers; it is summed up to the smallest window w such that w >= c * tau,
+    as in [1]. If the chain is too short for that, the estimate is biased
+    low.
+
+    References
+    ==========
+    [1] Sokal, 1997. Monte Carlo Methods in Statistical Mechanics:
+    Foundations and New Algorithms. In: Functional Integration, pp. 131--192.
+    """
+    chain = numpy.asarray(chain, dtype=float)
+    S = chain.shape[0]
+    x = chain - chain.mean(axis=0)
+    n = 2 ** int(numpy.ceil(numpy.log2(2 * S)))
+    f = numpy.fft.rfft(x, n=n, axis=0)
+    acf = numpy.fft.irfft(f * numpy.conj(f), n=n, axis=0)[:S].mean(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        acf = acf / acf[0]
+    # tau for each window size
+    taus = 2.0 * numpy.cumsum(acf, axis=0) - 1.0
+    window = numpy.arange(S)[:, None] >= c * taus
+    idx = numpy.where(window.any(axis=0), window.argmax(axis=0), S - 1)
+    return taus[idx, numpy.arange(taus.shape[1])]